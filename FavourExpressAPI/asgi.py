@@ -3,6 +3,14 @@ ASGI config for FavourExpressAPI project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served by uvicorn workers under gunicorn (the ``web`` process in Procfile):
+
+    gunicorn FavourExpressAPI.asgi:application -k uvicorn.workers.UvicornWorker
+
+Each request's sync code runs on its own thread, so persistent connections
+would pile up instead of being reused. Run it with DB_POOL_SIZE set (the
+Procfile defaults it to 10) or with DB_CONN_MAX_AGE=0.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
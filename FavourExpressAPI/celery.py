@@ -0,0 +1,22 @@
+"""
+Celery application.
+
+Configuration comes from the ``CELERY_*`` Django settings and tasks from the
+``tasks`` modules of the installed apps and of ``utils``. Without
+``CELERY_URL`` the broker is in-memory and tasks run eagerly in the web
+process (see utils.tasks.enqueue), so nothing else needs to run locally.
+
+    celery -A FavourExpressAPI worker -Q default,notifications,payments,reports,images
+    celery -A FavourExpressAPI beat
+"""
+import os
+
+from celery import Celery
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FavourExpressAPI.settings')
+
+app = Celery('FavourExpressAPI')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+app.autodiscover_tasks(['utils'])
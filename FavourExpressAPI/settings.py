@@ -15,6 +15,7 @@ from decouple import config
 import os
 import dj_database_url
 from datetime import timedelta
+from celery.schedules import crontab
 from django.utils.translation import gettext_lazy as _
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,6 +33,9 @@ SECRET_KEY = config('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG')
 
+# Expose per-request query count, DB time and duplicate queries as X-DB-* headers
+QUERY_STATS_HEADERS = config('DEBUG', default=False, cast=bool)
+
 ALLOWED_HOSTS = ['*', 'localhost:3000', FRONTEND_URL]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -64,6 +68,10 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'core.user'
 CORS_ALLOW_ALL_ORIGINS = True
 MIDDLEWARE = [
+    'utils.middleware.MetricsMiddleware',
+    'utils.middleware.QueryCountMiddleware',
+    'utils.middleware.TrafficRecorderMiddleware',
+    'utils.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -72,6 +80,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'FavourExpressAPI.urls'
@@ -136,10 +145,154 @@ AUTHENTICATION_BACKENDS = [
 #             }
 #         }
 # else:
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse.
+DATABASE_CONNECTION = {
+    'conn_max_age': config('DB_CONN_MAX_AGE', default=600, cast=int),
+    'conn_health_checks': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+}
+
 DATABASES = {
-    'default': dj_database_url.parse(config('DATABASE_URL'))
+    'default': dj_database_url.parse(config('DATABASE_URL'), **DATABASE_CONNECTION)
+}
+
+# Read replicas, as a comma separated list of database URLs. Search and listing
+# reads are spread over them; writes and anything after a write in the same
+# request stay on the primary. Pointing a replica at the primary's own URL is
+# enough to exercise the routing locally.
+DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+for index, replica_url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f'replica{index}'] = dj_database_url.parse(replica_url, **DATABASE_CONNECTION)
+    DATABASES[f'replica{index}']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['utils.routers.ReplicaRouter']
+
+# Optional in-process connection pool (see utils/db_pool/base.py), shared by the
+# threads of a worker. Connections go back to the pool after every request.
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+if DB_POOL_SIZE:
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.postgresql':
+            database.update(ENGINE='utils.db_pool', CONN_MAX_AGE=0, POOL={
+                'MAX_SIZE': DB_POOL_SIZE,
+                'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+                'LEAK_SECONDS': config('DB_POOL_LEAK_SECONDS', default=60, cast=float),
+            })
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# A shared cache is needed for the reference data versions to agree across workers.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds clients and CDNs may reuse towns/routes/bus-types/payment-methods before revalidating
+REFERENCE_DATA_MAX_AGE = config('REFERENCE_DATA_MAX_AGE', default=60, cast=int)
+
+# Seconds a worker trusts its in-process reference tables before re-checking the shared versions
+REFERENCE_CACHE_CHECK_INTERVAL = config('REFERENCE_CACHE_CHECK_INTERVAL', default=1.0, cast=float)
+
+
+# Bearer token required to scrape /metrics (staff sessions only when empty)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Per-request profiling: staff send "X-Profile: 1" or "?profile=1", and a share
+# of all requests can be sampled. Profiles are kept as a bounded ring buffer.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=50, cast=int)
+
+
+# Slow-query log: statements over the threshold (0 disables) go to a rotating NDJSON file
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'logs', 'slow_queries.ndjson'))
+SLOW_QUERY_LOG_MAX_BYTES = config('SLOW_QUERY_LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+SLOW_QUERY_LOG_BACKUPS = config('SLOW_QUERY_LOG_BACKUPS', default=5, cast=int)
+
+
+# Turn off to keep load tests and local runs from messaging real phone numbers
+SMS_ENABLED = config('SMS_ENABLED', default=True, cast=bool)
+
+
+# Traffic recorder: share of API requests appended to a rotating JSONL file for replay
+TRAFFIC_SAMPLE_RATE = config('TRAFFIC_SAMPLE_RATE', default=0.0, cast=float)
+TRAFFIC_PATH_PREFIX = '/api/'
+TRAFFIC_LOG = config('TRAFFIC_LOG', default=os.path.join(BASE_DIR, 'traffic', 'requests.jsonl'))
+TRAFFIC_LOG_MAX_BYTES = config('TRAFFIC_LOG_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+TRAFFIC_LOG_BACKUPS = config('TRAFFIC_LOG_BACKUPS', default=5, cast=int)
+
+
+# Live seat availability (bookingApp/availability.py)
+SEAT_SNAPSHOT_TTL = config('SEAT_SNAPSHOT_TTL', default=3600, cast=int)
+SEAT_PUSH_COALESCE_MS = config('SEAT_PUSH_COALESCE_MS', default=250, cast=int)
+SEAT_PUSH_KEEPALIVE = config('SEAT_PUSH_KEEPALIVE', default=15, cast=int)
+SEAT_STREAM_MAX_SECONDS = config('SEAT_STREAM_MAX_SECONDS', default=300, cast=int)
+
+# Departure boards (bookingApp/departures.py)
+DEPARTURE_BOARD_DAYS = config('DEPARTURE_BOARD_DAYS', default=2, cast=int)
+DEPARTURE_BOARD_TTL = config('DEPARTURE_BOARD_TTL', default=15 * 60, cast=int)
+DEPARTURE_BOARD_MAX_ROWS = 50
+
+# Bulk trip writes (bookingApp/timetable.py)
+TRIP_BULK_MAX_ITEMS = 500
+
+# Signed boarding tickets (bookingApp/tickets.py); the key is a PEM Ed25519
+# private key, newlines may be written as \n
+TICKET_SIGNING_KEY = config('TICKET_SIGNING_KEY', default='').replace('\\n', '\n')
+TICKET_VALID_HOURS_AFTER_DEPARTURE = config('TICKET_VALID_HOURS_AFTER_DEPARTURE', default=12, cast=int)
+
+# Avatar variants (core/avatars.py); AVATAR_PROCESSES is the resizing pool used
+# when tasks run in the web process, 0 resizes in place
+AVATAR_SIZES = [96, 256, 512]
+AVATAR_MAX_UPLOAD_BYTES = config('AVATAR_MAX_UPLOAD_BYTES', default=5 * 1024 * 1024, cast=int)
+AVATAR_MAX_PIXELS = config('AVATAR_MAX_PIXELS', default=40_000_000, cast=int)
+AVATAR_PROCESSES = config('AVATAR_PROCESSES', default=2, cast=int)
+AVATAR_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+# Celery (FavourExpressAPI/celery.py). Without CELERY_URL the broker is
+# in-memory and tasks run eagerly in the web process, on CELERY_LOCAL_THREADS
+# background threads (0 runs them inline), so no worker or Redis is needed.
+CELERY_URL = config('CELERY_URL', default='')
+CELERY_BROKER_URL = CELERY_URL or 'memory://'
+CELERY_TASK_ALWAYS_EAGER = not CELERY_URL
+CELERY_LOCAL_THREADS = config('CELERY_LOCAL_THREADS', default=2, cast=int)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_SOFT_TIME_LIMIT = 5 * 60
+CELERY_TASK_TIME_LIMIT = 6 * 60
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'utils.tasks.deliver_sms': {'queue': 'notifications'},
+    'bookingApp.tasks.notify_passengers': {'queue': 'notifications'},
+    'bookingApp.tasks.flag_overdue_refunds': {'queue': 'payments'},
+    'bookingApp.tasks.rebuild_recent_rollups': {'queue': 'reports'},
+    'bookingApp.tasks.audit_bus_schedule': {'queue': 'reports'},
+    'core.avatars.process_avatar': {'queue': 'images'},
+}
+# Beat times are local station times, see CELERY_TIMEZONE below
+CELERY_BEAT_SCHEDULE = {
+    'rebuild-recent-rollups': {'task': 'bookingApp.tasks.rebuild_recent_rollups', 'schedule': crontab(hour=2, minute=30)},
+    'audit-bus-schedule': {'task': 'bookingApp.tasks.audit_bus_schedule', 'schedule': crontab(hour=4, minute=0)},
+    'flag-overdue-refunds': {'task': 'bookingApp.tasks.flag_overdue_refunds', 'schedule': crontab(minute=15)},
 }
 
+# Refunds still not made this many hours after being requested are reported
+REFUND_OVERDUE_HOURS = config('REFUND_OVERDUE_HOURS', default=48, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -171,6 +324,10 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Trip dates and times are entered in local time at the stations.
+TRIP_TIME_ZONE = config('TRIP_TIME_ZONE', default='Africa/Douala')
+CELERY_TIMEZONE = TRIP_TIME_ZONE
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
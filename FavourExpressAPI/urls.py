@@ -32,6 +32,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/auth/', include('core.urls')),
     path('api/v1/', include('bookingApp.urls')),
+    path('metrics', metrics, name='metrics'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:name>/', ProfileDownloadView.as_view(), name='profile-download'),
 
 
 
@@ -8,6 +8,13 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.utils.translation import gettext_lazy as _
 from rest_framework import permissions
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.utils.crypto import constant_time_compare
+from utils.metrics import render as render_metrics
+from utils.profiling import list_profiles, profile_path
 
 
 
@@ -15,4 +22,36 @@ def not_found(request, exception):
     return render(request, '404.html', status=404)
 
 def index(request):
-    return render(request, 'index.html')
\ No newline at end of file
+    return render(request, 'index.html')
+
+def metrics(request):
+    """
+    Prometheus metrics for scrapers sending ``Bearer METRICS_TOKEN``. Without
+    a token configured only logged-in staff may read them; anyone else gets
+    a 404, as if the endpoint did not exist.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not request.user.is_staff:
+        raise Http404
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+class ProfileListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(list_profiles())
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name):
+        path = profile_path(name)
+        if path is None:
+            raise Http404("Profile not found.")
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -0,0 +1,126 @@
+"""
+Per-request database connection overhead.
+
+Simulates requests the way Django's handlers run them (request_started, one
+query, request_finished) against the database in DATABASE_URL, once for each
+connection mode:
+
+    close      CONN_MAX_AGE=0, a new connection per request (the old default)
+    persistent CONN_MAX_AGE=600 with health checks, one connection per thread
+    pooled     utils.db_pool, connections shared by all threads of the process
+
+    python benchmarks/connections.py --requests 2000 --threads 8
+    python benchmarks/connections.py --thread-per-request
+
+--thread-per-request runs every request on a fresh thread, like the thread
+pools that serve async views, where per-thread persistent connections cannot
+be reused. Each mode runs in its own process and reports the request latency
+and how many connections it had to open.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loadtest import percentile
+
+MODES = {
+    'close': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_SIZE': '0'},
+    'persistent': {'DB_CONN_MAX_AGE': '600', 'DB_CONN_HEALTH_CHECKS': 'True', 'DB_POOL_SIZE': '0'},
+    'pooled': {'DB_CONN_MAX_AGE': '0', 'DB_CONN_HEALTH_CHECKS': 'True'},
+}
+
+
+def run_child(options):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FavourExpressAPI.settings')
+    import django
+    django.setup()
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+    from prometheus_client import REGISTRY
+
+    def simulate_request():
+        started = time.perf_counter()
+        request_started.send(sender=None)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        finally:
+            request_finished.send(sender=None)
+        return time.perf_counter() - started
+
+    def on_fresh_thread():
+        result = []
+        thread = threading.Thread(target=lambda: result.append(simulate_request()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    task = on_fresh_thread if options.thread_per_request else simulate_request
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.threads) as executor:
+        durations = sorted(executor.map(lambda _: task(), range(options.requests)))
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'requests': options.requests,
+        'elapsed': elapsed,
+        'mean_ms': sum(durations) / len(durations) * 1000,
+        'p50_ms': percentile(durations, 0.5) * 1000,
+        'p95_ms': percentile(durations, 0.95) * 1000,
+        'connections_opened': REGISTRY.get_sample_value('db_connections_opened_total', {'alias': 'default'}) or 0,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=None, help='DB_POOL_SIZE for the pooled mode (defaults to --threads)')
+    parser.add_argument('--thread-per-request', action='store_true')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return 0
+
+    results = {}
+    for mode in options.modes:
+        env = {**os.environ, **MODES[mode]}
+        env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        if mode == 'pooled':
+            env['DB_POOL_SIZE'] = str(options.pool_size or options.threads)
+        command = [
+            sys.executable, __file__, '--child', '--requests', str(options.requests), '--threads', str(options.threads),
+        ]
+        if options.thread_per_request:
+            command.append('--thread-per-request')
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'mode':<12}{'req/s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'opened':>10}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<12}{result['requests'] / result['elapsed']:>10.0f}{result['mean_ms']:>10.2f}"
+            f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['connections_opened']:>10.0f}"
+        )
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Load test for the search, booking and payment flows.
+
+Start the API against a database filled by ``manage.py generate_load_data``,
+either with the development server or with gunicorn, and with SMS_ENABLED=False
+so bookings do not message real phone numbers:
+
+    python manage.py runserver --noreload
+    gunicorn FavourExpressAPI.wsgi --workers 4
+
+then drive it with a weighted traffic mix (see mix.json):
+
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:8000/api/v1 \\
+        --concurrency 32 --duration 60 --output results.json \\
+        --baseline benchmarks/baseline.json
+
+The JSON summary holds throughput, p50/p95/p99 latency and error rates per
+endpoint. With --baseline the run is compared against a stored summary and the
+script exits with status 1 when an endpoint regressed; --save-baseline stores
+the current run instead.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    """
+    Build the per-endpoint summary from ``(endpoint, status, seconds, ok)`` samples.
+    """
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample[0]].append(sample)
+
+    endpoints = {}
+    for endpoint, items in sorted(by_endpoint.items()):
+        latencies = sorted(seconds * 1000 for _, _, seconds, _ in items)
+        errors = sum(1 for _, _, _, ok in items if not ok)
+        statuses = defaultdict(int)
+        for _, status, _, _ in items:
+            statuses[str(status)] += 1
+        endpoints[endpoint] = {
+            'requests': len(items),
+            'errors': errors,
+            'error_rate': round(errors / len(items), 4),
+            'throughput_rps': round(len(items) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'max_ms': round(latencies[-1], 2),
+            'statuses': dict(statuses),
+        }
+
+    total = len(samples)
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'error_rate': round(sum(1 for *_, ok in samples if not ok) / total, 4) if total else None,
+        'endpoints': endpoints,
+    }
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Return human readable regressions of ``summary`` against ``baseline``.
+    """
+    regressions = []
+    for endpoint, base in baseline.get('endpoints', {}).items():
+        current = summary['endpoints'].get(endpoint)
+        if current is None:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if base.get(key) and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{endpoint} {key} {current[key]} > {base[key]} (+{tolerance:.0%})")
+        if base.get('throughput_rps') and current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{endpoint} throughput {current['throughput_rps']} < {base['throughput_rps']} (-{tolerance:.0%})")
+        if current['error_rate'] > base.get('error_rate', 0) + 0.01:
+            regressions.append(f"{endpoint} error rate {current['error_rate']} > {base.get('error_rate', 0)}")
+    return regressions
+
+
+class TrafficMix:
+    """
+    Builds requests for each scenario from ids discovered through the API and
+    from bookings and payments created during the run.
+    """
+
+    def __init__(self, base_url, weights, seed):
+        self.base_url = base_url.rstrip('/')
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.bookings = []
+        self.transactions = []
+        self.pool_lock = threading.Lock()
+        self.trips = []
+        self.providers = []
+
+    def discover(self, session):
+        today = date.today().isoformat()
+        response = session.get(f'{self.base_url}/trips/filter/partial/', params={'date__gte': today, 'is_active': 'true'})
+        response.raise_for_status()
+        for trip in response.json().get('results', []):
+            self.trips.append({
+                'id': trip['id'],
+                'bus': trip['bus']['id'],
+                'origin': trip['route']['origin']['id'],
+                'destination': trip['route']['destination']['id'],
+                'date': trip['date'],
+            })
+
+        response = session.get(f'{self.base_url}/payment-methods/')
+        response.raise_for_status()
+        self.providers = [method['name'] for method in response.json().get('results', [])]
+
+        if not self.trips:
+            raise SystemExit('No upcoming trips found, load data with manage.py generate_load_data first')
+
+    def choose(self):
+        with self.rng_lock:
+            name = self.rng.choices(self.names, weights=self.weights)[0]
+            trip = self.rng.choice(self.trips)
+            provider = self.rng.choice(self.providers) if self.providers else 'mtn'
+
+        with self.pool_lock:
+            if name in ('initiate_payment', 'booking_with_payment') and not self.providers:
+                name = 'booking'
+            if name == 'initiate_payment' and not self.bookings:
+                name = 'booking'
+            if name == 'confirm_payment' and not self.transactions:
+                name = 'search'
+            booking_id = self.bookings.pop() if name == 'initiate_payment' else None
+            transaction_id = self.transactions.pop() if name == 'confirm_payment' else None
+
+        customer = {
+            'identification': f'LOAD-{uuid.uuid4().hex[:12]}',
+            'phone_number': '+237600000000',
+            'username': 'Load Test',
+        }
+
+        if name == 'search':
+            return name, 'get', '/trips/filter/', {'params': {'origin': trip['origin'], 'destination': trip['destination'], 'date': trip['date']}}
+        if name == 'available_seats':
+            return name, 'get', '/available-seats/', {'params': {'bus_id': trip['bus'], 'trip_id': trip['id']}}
+        if name == 'booking':
+            return name, 'post', '/bookings/', {'json': {'customer_info': customer, 'trip': trip['id'], 'seats': 1}}
+        if name == 'booking_with_payment':
+            return name, 'post', '/booking-with-payment/', {'json': {
+                'customer_info': customer,
+                'booking': {'trip': trip['id'], 'seats': 1, 'is_round_trip': False},
+                'payment': {'amount': '0', 'provider': provider, 'payer_name': 'Load Test', 'payer_phone': '+237600000000'},
+            }}
+        if name == 'initiate_payment':
+            return name, 'post', '/payments/initiate/', {'json': {
+                'booking_id': booking_id, 'provider': provider, 'payer_name': 'Load Test', 'payer_phone': '+237600000000',
+            }}
+        return name, 'post', '/payments/confirm/', {'json': {'transaction_id': transaction_id}}
+
+    def record(self, name, response):
+        if not response.ok:
+            return
+        body = response.json()
+        with self.pool_lock:
+            if name == 'booking' and 'booking_id' in body:
+                self.bookings.append(body['booking_id'])
+            elif name == 'initiate_payment' and 'transaction_id' in body:
+                self.transactions.append(body['transaction_id'])
+
+
+def worker(mix, deadline, samples, samples_lock, timeout):
+    session = requests.Session()
+    local = []
+    while time.monotonic() < deadline:
+        name, method, path, kwargs = mix.choose()
+        start = time.perf_counter()
+        try:
+            response = session.request(method, f'{mix.base_url}{path}', timeout=timeout, **kwargs)
+            elapsed = time.perf_counter() - start
+            local.append((name, response.status_code, elapsed, response.status_code < 400))
+            mix.record(name, response)
+        except requests.RequestException:
+            local.append((name, 'error', time.perf_counter() - start, False))
+    with samples_lock:
+        samples.extend(local)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/v1')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--mix', default='benchmarks/mix.json', help='JSON file of scenario weights')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='Write the JSON summary to this file')
+    parser.add_argument('--baseline', help='Compare against this stored summary')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against the baseline')
+    parser.add_argument('--save-baseline', help='Store this run as the baseline at the given path')
+    args = parser.parse_args(argv)
+
+    with open(args.mix) as file:
+        mix = TrafficMix(args.base_url, json.load(file), args.seed)
+    mix.discover(requests.Session())
+
+    samples = []
+    samples_lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker, mix, deadline, samples, samples_lock, args.timeout)
+
+    summary = summarize(samples, time.monotonic() - started)
+    summary['config'] = {'base_url': args.base_url, 'concurrency': args.concurrency, 'duration': args.duration, 'mix': args.mix}
+    output = json.dumps(summary, indent=2)
+    print(output)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            file.write(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(summary, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
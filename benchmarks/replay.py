@@ -0,0 +1,132 @@
+"""
+Replay traffic captured by the traffic recorder against a local instance.
+
+    python benchmarks/replay.py traffic/requests.jsonl \\
+        --base-url http://127.0.0.1:8000 --speed 2 --output replay.json
+
+Requests are re-issued in their original order and spacing, scaled by
+--speed (2 = twice as fast, 0 = as fast as possible). Redacted values are
+replaced with fresh placeholders so writes still validate. The summary
+compares the recorded and replayed latency distributions per endpoint.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from loadtest import summarize
+
+REDACTED = '<redacted>'
+PHONE_KEYS = {'phone', 'phone_number', 'payer_phone'}
+
+
+def fill_redacted(value, key=None):
+    if isinstance(value, dict):
+        return {item_key: fill_redacted(item, item_key) for item_key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_redacted(item, key) for item in value]
+    if value == REDACTED:
+        return '+237600000000' if key in PHONE_KEYS else f'r{uuid.uuid4().hex[:12]}'
+    return value
+
+
+def load(paths):
+    entries = []
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return sorted(entries, key=lambda entry: entry['time'])
+
+
+def endpoint(entry):
+    return f"{entry['method']} {entry.get('view') or entry['path']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='Captured JSONL files (rotated files included)')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed factor, 0 for no pacing')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='Write the JSON comparison to this file')
+    args = parser.parse_args(argv)
+
+    entries = load(args.files)
+    if not entries:
+        print('No requests to replay', file=sys.stderr)
+        return 1
+
+    local = threading.local()
+    samples = []
+    lock = threading.Lock()
+
+    def replay(entry):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        kwargs = {'params': entry.get('query') or None, 'timeout': args.timeout}
+        if entry.get('body') is not None:
+            kwargs['json'] = fill_redacted(entry['body'])
+        start = time.perf_counter()
+        try:
+            response = session.request(entry['method'], f"{args.base_url.rstrip('/')}{entry['path']}", **kwargs)
+            sample = (endpoint(entry), response.status_code, time.perf_counter() - start, response.status_code == entry['status'])
+        except requests.RequestException:
+            sample = (endpoint(entry), 'error', time.perf_counter() - start, False)
+        with lock:
+            samples.append(sample)
+
+    first = entries[0]['time']
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for entry in entries:
+            if args.speed > 0:
+                delay = (entry['time'] - first) / args.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(replay, entry)
+    replay_elapsed = time.monotonic() - started
+
+    recorded = [
+        (endpoint(entry), entry['status'], entry['duration_ms'] / 1000, entry['status'] < 400)
+        for entry in entries
+    ]
+    recorded_summary = summarize(recorded, max(entries[-1]['time'] - first, 1e-9))
+    replayed_summary = summarize(samples, replay_elapsed)
+
+    comparison = {}
+    for name, replayed in replayed_summary['endpoints'].items():
+        original = recorded_summary['endpoints'].get(name, {})
+        comparison[name] = {
+            'recorded': {key: original.get(key) for key in ('requests', 'p50_ms', 'p95_ms', 'p99_ms')},
+            'replayed': {key: replayed[key] for key in ('requests', 'p50_ms', 'p95_ms', 'p99_ms')},
+            'p95_ratio': round(replayed['p95_ms'] / original['p95_ms'], 2) if original.get('p95_ms') else None,
+            'status_mismatches': replayed['errors'],
+        }
+
+    output = json.dumps({
+        'requests': len(entries),
+        'speed': args.speed,
+        'recorded': recorded_summary,
+        'replayed': replayed_summary,
+        'comparison': comparison,
+    }, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BookingappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookingApp'
+
+    def ready(self):
+        from . import signals, reference_cache  # noqa: F401
@@ -0,0 +1,385 @@
+"""
+Async read endpoints.
+
+Trip search, seat availability and the reference listings are served by
+native async views so a worker under ASGI can hold thousands of slow clients
+while their queries run. The ORM is used through its async API; serializers
+only read rows that were already loaded, so they never touch the database.
+
+DRF has no async request handling, so ``AsyncAPIView`` subclasses APIView
+only for drf_yasg, which documents DRF views and reads the
+``swagger_auto_schema`` of their handlers; requests are dispatched the plain
+Django way and return the same JSON. Requests with other methods on the same
+URLs are handed to the DRF view that used to serve them (``sync_view``) in a
+worker thread.
+"""
+import json
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import exceptions, serializers, status
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .availability import broker, get_snapshot
+from .departures import next_departures
+from .mixins import ConditionalListMixin
+from .reference_cache import reference_cache
+from .models import Trip, Route, City, BusType, PaymentMethod, trip_time_zone
+from .serializers import TripsSerializer, RouteFetchSerializer, RouteSerializer, CitySerializer, BusTypeSerializer, PaymentMethodSerializer
+from .views import RouteListCreateView, CityListCreateView, BusTypeListCreateView
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder, json_dumps_params={'ensure_ascii': False})
+
+
+class AsyncAPIView(APIView):
+    http_method_names = ['get', 'head', 'options']
+    sync_view = None
+    authentication_required = False
+    query_budget = None
+
+    # Django's async-aware versions; DRF's are sync and raise DRF exceptions.
+    options = View.options
+    http_method_not_allowed = View.http_method_not_allowed
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and self.authentication_required:
+            try:
+                authenticated = await self.is_authenticated(request)
+            except exceptions.AuthenticationFailed as error:
+                return json_response({'detail': error.detail}, status=status.HTTP_401_UNAUTHORIZED)
+            if not authenticated:
+                return json_response(
+                    {'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED
+                )
+        return await View.dispatch(self, request, *args, **kwargs)
+
+    @sync_to_async
+    def is_authenticated(self, request):
+        if JWTAuthentication().authenticate(request) is not None:
+            return True
+        return request.user.is_authenticated
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view.as_view())(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+
+class AsyncTripFilterView(AsyncAPIView):
+    query_budget = 1
+    replica_reads = True
+
+    @swagger_auto_schema(
+        operation_description="Get filtered trips based on origin, destination, and date or departure window",
+        manual_parameters=[
+            openapi.Parameter('origin', openapi.IN_QUERY, description="Origin ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('destination', openapi.IN_QUERY, description="Destination ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('date', openapi.IN_QUERY, description="Local departure date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('departure_after', openapi.IN_QUERY, description="Earliest departure (ISO 8601, local time if naive)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter('departure_before', openapi.IN_QUERY, description="Latest departure (ISO 8601, local time if naive)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        ],
+        responses={200: TripsSerializer(many=True)}
+    )
+    async def get(self, request):
+        trips = Trip.objects.with_details().filter(
+            route__origin__id=request.GET.get('origin'),
+            route__destination__id=request.GET.get('destination'),
+        )
+        try:
+            day = parse_date(request.GET.get('date') or '')
+            after = self.parse_moment(request.GET.get('departure_after'))
+            before = self.parse_moment(request.GET.get('departure_before'))
+        except ValueError:
+            return json_response(
+                {"error": "date must be YYYY-MM-DD and departure_after/departure_before ISO 8601 datetimes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if day is not None:
+            trips = trips.departing_on(day)
+        if after is not None or before is not None:
+            trips = trips.departing_between(after, before)
+        elif day is None:
+            trips = trips.departing_between(timezone.now(), None)
+        return json_response(TripsSerializer([trip async for trip in trips], many=True).data)
+
+    def parse_moment(self, value):
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+        if timezone.is_naive(moment):
+            moment = moment.replace(tzinfo=trip_time_zone())
+        return moment
+
+
+class AsyncAvailableSeatsView(AsyncAPIView):
+    query_budget = 2
+
+    @swagger_auto_schema(
+        operation_description="Seats left on a trip, from the live availability snapshot",
+        manual_parameters=[
+            openapi.Parameter('bus_id', openapi.IN_QUERY, description="Bus ID", type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter('trip_id', openapi.IN_QUERY, description="Trip ID", type=openapi.TYPE_INTEGER, required=True),
+        ],
+        responses={200: openapi.Response("The bus, the trip and its total, booked and available seats")}
+    )
+    async def get(self, request):
+        bus_id = request.GET.get('bus_id')
+        trip_id = request.GET.get('trip_id')
+
+        if not bus_id or not trip_id:
+            return json_response({"error": "Both bus_id and trip_id are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        trip = await Trip.objects.select_related('bus__bus_type', 'route__origin', 'route__destination').filter(
+            id=trip_id, bus_id=bus_id
+        ).afirst()
+        if trip is None:
+            return json_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        bus = trip.bus
+
+        seats = await sync_to_async(get_snapshot)(trip.id)
+        total_seats = seats['total_seats']
+        booked_seats = seats['booked_seats']
+        available_seats = seats['available_seats']
+
+        return json_response({
+            "bus": {
+                "id": bus.id,
+                "registration_number": bus.registration_number,
+                "bus_type": bus.bus_type.name,
+                "capacity": bus.bus_type.capacity
+            },
+            "trip": {
+                "id": trip.id,
+                "route": str(trip.route),
+                "departure_time": trip.departure_time.strftime('%H:%M'),
+                "arrival_time": trip.arrival_time.strftime('%H:%M'),
+                "time_of_day": trip.time_of_day
+            },
+            "total_seats": total_seats,
+            "booked_seats": booked_seats,
+            "available_seats": available_seats
+        })
+
+
+class AsyncSeatStreamView(AsyncAPIView):
+    """
+    Server-Sent Events stream of a trip's seat availability. The current
+    snapshot is sent first, then one ``seats`` event per change with the
+    ``delta`` in available seats. Streams end after ``SEAT_STREAM_MAX_SECONDS``
+    and EventSource clients reconnect on their own, which also bounds
+    subscriptions left behind by clients that vanished without closing.
+    """
+
+    @swagger_auto_schema(
+        operation_description="Server-Sent Events stream of the trip's seat availability (ASGI only)",
+        responses={200: openapi.Response("text/event-stream of seats events"), 404: 'Not Found', 501: 'Not served under WSGI'}
+    )
+    async def get(self, request, pk):
+        if not isinstance(request, ASGIRequest):
+            return json_response(
+                {"detail": "Seat streams are only served by the ASGI application."}, status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        if await sync_to_async(get_snapshot)(pk) is None:
+            return json_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(self.events(pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, trip_id):
+        # Subscribe before reading the snapshot so no change slips in between.
+        subscription = broker.subscribe(trip_id)
+        try:
+            snapshot = await sync_to_async(get_snapshot)(trip_id)
+            yield f"retry: 3000\n{self.event(snapshot, 0)}"
+
+            deadline = time.monotonic() + settings.SEAT_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                update = await subscription.next(settings.SEAT_PUSH_KEEPALIVE)
+                if update is None:
+                    yield ": keepalive\n\n"
+                elif update['available_seats'] != snapshot['available_seats'] or update['total_seats'] != snapshot['total_seats']:
+                    yield self.event(update, update['available_seats'] - snapshot['available_seats'])
+                    snapshot = update
+        finally:
+            broker.unsubscribe(subscription)
+
+    def event(self, snapshot, delta):
+        data = json.dumps({**snapshot, 'delta': delta})
+        return f"id: {snapshot['updated_at']}\nevent: seats\ndata: {data}\n\n"
+
+
+class AsyncDeparturesView(AsyncAPIView):
+    """
+    Next departures from a town for station kiosks and the home page.
+    """
+    query_budget = 2
+
+    @swagger_auto_schema(
+        operation_description="Next departures from a town",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Number of departures (default 10)", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: openapi.Response("The town and its next departures"), 404: 'Not Found'}
+    )
+    async def get(self, request, pk):
+        city = await sync_to_async(reference_cache.city)(pk)
+        if city is None:
+            return json_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), settings.DEPARTURE_BOARD_MAX_ROWS)
+        except ValueError:
+            return json_response({"error": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        departures = await sync_to_async(next_departures)(city.id, limit)
+        return json_response({"town": {"id": city.id, "name": city.name, "abbr": city.abbr}, "departures": departures})
+
+
+PAGE = openapi.Parameter('page', openapi.IN_QUERY, description="Page number, or last", type=openapi.TYPE_STRING)
+
+
+def page_of(serializer_class):
+    """
+    Serializer describing a page of ``serializer_class`` rows, for the docs.
+    """
+    name = serializer_class.__name__.replace('Serializer', '')
+    return type(f'{name}PageSerializer', (serializers.Serializer,), {
+        'count': serializers.IntegerField(),
+        'next': serializers.URLField(allow_null=True),
+        'previous': serializers.URLField(allow_null=True),
+        'results': serializer_class(many=True),
+    })
+
+
+class AsyncReferenceListView(ConditionalListMixin, AsyncAPIView):
+    """
+    Conditional listing of a reference table; a 304 is answered from the
+    version counters without querying the table. Pages are numbered like
+    DRF's PageNumberPagination, in the same ``count``/``next``/``previous``/
+    ``results`` envelope.
+    """
+    queryset = None
+    serializer_class = None
+    query_budget = 2
+
+    async def get(self, request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(self.get_validators)(request)
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                page = await self.paginate(request, self.queryset.all())
+            except Http404 as error:
+                return json_response({"detail": str(error)}, status=status.HTTP_404_NOT_FOUND)
+            response = json_response(page)
+
+        self.set_cache_headers(response, etag, last_modified)
+        return response
+
+    async def paginate(self, request, queryset):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        count = await queryset.acount()
+        last = max(1, math.ceil(count / page_size))
+        number = request.GET.get('page') or 1
+        try:
+            number = last if number == 'last' else int(number)
+        except ValueError:
+            number = 0
+        if not 1 <= number <= last:
+            raise Http404("Invalid page.")
+
+        start = (number - 1) * page_size
+        objects = [obj async for obj in queryset[start:start + page_size]]
+        url = request.build_absolute_uri()
+        if number == 1:
+            previous = None
+        elif number == 2:
+            previous = remove_query_param(url, 'page')
+        else:
+            previous = replace_query_param(url, 'page', number - 1)
+        return {
+            'count': count,
+            'next': replace_query_param(url, 'page', number + 1) if number < last else None,
+            'previous': previous,
+            'results': self.serializer_class(objects, many=True).data,
+        }
+
+
+class AsyncRouteListView(AsyncReferenceListView):
+    http_method_names = ['get', 'head', 'options', 'post']
+    queryset = Route.objects.select_related('origin', 'destination')
+    serializer_class = RouteFetchSerializer
+    cache_models = (Route, City)
+    sync_view = RouteListCreateView
+
+    @swagger_auto_schema(operation_description="Get all routes", manual_parameters=[PAGE], responses={200: page_of(RouteFetchSerializer)})
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_description="Create a new route", request_body=RouteSerializer, responses={201: RouteSerializer})
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+
+class AsyncCityListView(AsyncReferenceListView):
+    http_method_names = ['get', 'head', 'options', 'post']
+    queryset = City.objects.all()
+    serializer_class = CitySerializer
+    cache_models = (City,)
+    sync_view = CityListCreateView
+
+    @swagger_auto_schema(operation_description="Get all towns", manual_parameters=[PAGE], responses={200: page_of(CitySerializer)})
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_description="Create a new town", request_body=CitySerializer, responses={201: CitySerializer})
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+
+class AsyncBusTypeListView(AsyncReferenceListView):
+    http_method_names = ['get', 'head', 'options', 'post']
+    queryset = BusType.objects.all()
+    serializer_class = BusTypeSerializer
+    cache_models = (BusType,)
+    cache_public = False
+    authentication_required = True
+    sync_view = BusTypeListCreateView
+
+    @swagger_auto_schema(operation_description="Get all bus types", manual_parameters=[PAGE], responses={200: page_of(BusTypeSerializer)})
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_description="Create a new bus type", request_body=BusTypeSerializer, responses={201: BusTypeSerializer})
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+
+class AsyncPaymentMethodListView(AsyncReferenceListView):
+    queryset = PaymentMethod.objects.filter(is_active=True)
+    serializer_class = PaymentMethodSerializer
+    cache_models = (PaymentMethod,)
+
+    @swagger_auto_schema(operation_description="Get the active payment methods", manual_parameters=[PAGE], responses={200: page_of(PaymentMethodSerializer)})
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
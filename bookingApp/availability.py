@@ -0,0 +1,227 @@
+"""
+Live seat availability.
+
+Whenever bookings of a trip change, the trip's seat snapshot is recomputed
+once (after the transaction commits), stored in the cache and published to
+every client streaming that trip. Clients on the seat-selection screen
+subscribe through ``trips/<pk>/seats/stream/`` instead of polling
+``available-seats/``, and both read the cached snapshot, so the SUM over the
+bookings runs once per change instead of once per poll.
+
+Publishing goes through Redis pub/sub when ``REDIS_URL`` is set so every node
+sees every change; otherwise it stays in process. Subscribers keep only the
+latest snapshot, so a burst of changes reaches a slow client as one message.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Trip
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'seats:'
+
+
+def snapshot_key(trip_id):
+    return f'seats:snapshot:{trip_id}'
+
+
+def compute_snapshots(trip_ids):
+    """
+    Seat counts of ``trip_ids`` in one query, keyed by trip id. Cancelled and
+    deleted bookings do not hold seats.
+    """
+    live = Q(booking__is_deleted=False) & ~Q(booking__status=Booking.CANCELLED)
+    rows = (
+        Trip.objects.filter(pk__in=trip_ids)
+        .annotate(booked=Coalesce(Sum('booking__seats', filter=live), 0))
+        .values_list('pk', 'available_seats', 'bus__bus_type__capacity', 'booked')
+    )
+    snapshots = {}
+    for trip_id, available_seats, capacity, booked in rows:
+        total_seats = available_seats if available_seats is not None else capacity
+        snapshots[trip_id] = {
+            'trip': trip_id,
+            'total_seats': total_seats,
+            'booked_seats': booked,
+            'available_seats': max(0, total_seats - booked),
+            'updated_at': time.time(),
+        }
+    return snapshots
+
+
+def get_snapshot(trip_id):
+    """
+    The cached snapshot of a trip, computed and cached on a miss. Returns
+    None for unknown trips.
+    """
+    snapshot = cache.get(snapshot_key(trip_id))
+    if snapshot is None:
+        snapshot = compute_snapshots([trip_id]).get(trip_id)
+        if snapshot is not None:
+            cache.set(snapshot_key(trip_id), snapshot, settings.SEAT_SNAPSHOT_TTL)
+    return snapshot
+
+
+def publish_snapshots(trip_ids):
+    snapshots = compute_snapshots(trip_ids)
+    cache.set_many({snapshot_key(trip_id): snapshot for trip_id, snapshot in snapshots.items()}, settings.SEAT_SNAPSHOT_TTL)
+    # Deleted trips have no snapshot left; drop the cached one.
+    cache.delete_many([snapshot_key(trip_id) for trip_id in trip_ids if trip_id not in snapshots])
+    for trip_id, snapshot in snapshots.items():
+        broker.publish(trip_id, snapshot)
+
+
+_pending = threading.local()
+
+
+def seats_changed(*trip_ids):
+    """
+    Publish fresh snapshots of ``trip_ids`` once the current transaction
+    commits. Trips changed several times in one transaction are published
+    once.
+    """
+    pending = getattr(_pending, 'trip_ids', None)
+    if pending is None:
+        pending = _pending.trip_ids = set()
+    pending.update(trip_ids)
+    transaction.on_commit(flush_pending)
+
+
+def flush_pending():
+    trip_ids = getattr(_pending, 'trip_ids', None)
+    if not trip_ids:
+        return
+    _pending.trip_ids = set()
+    try:
+        publish_snapshots(trip_ids)
+    except Exception:
+        # Streams catch up on the next change; the booking itself went through.
+        logger.exception(f"Could not publish seat availability for trips {sorted(trip_ids)}")
+
+
+class Subscription:
+    """
+    One streaming client. Holds only the latest snapshot, so updates that
+    arrive faster than the client reads are coalesced.
+    """
+
+    def __init__(self, trip_id):
+        self.trip_id = trip_id
+        self.loop = asyncio.get_running_loop()
+        self.latest = None
+        self.ready = asyncio.Event()
+
+    def push(self, snapshot):
+        self.latest = snapshot
+        self.ready.set()
+
+    async def next(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for an update and return the newest
+        snapshot, or None when nothing changed.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # Let the rest of a burst land before sending.
+        await asyncio.sleep(settings.SEAT_PUSH_COALESCE_MS / 1000)
+        self.ready.clear()
+        snapshot, self.latest = self.latest, None
+        return snapshot
+
+
+class LocalBroker:
+    """
+    Fans snapshots out to the subscriptions of this process. Publishing is
+    safe from any thread; delivery happens on each subscriber's event loop.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, trip_id):
+        subscription = Subscription(trip_id)
+        with self._lock:
+            self._subscriptions[trip_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.trip_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.trip_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def deliver(self, trip_id, snapshot):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(trip_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, snapshot)
+            except RuntimeError:
+                # The client's loop is gone; its stream is being torn down.
+                self.unsubscribe(subscription)
+
+    def publish(self, trip_id, snapshot):
+        self.deliver(trip_id, snapshot)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis so subscribers on every node receive updates. A
+    daemon thread per process listens and delivers to the local subscribers.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, trip_id):
+        self.start_listener()
+        return super().subscribe(trip_id)
+
+    def publish(self, trip_id, snapshot):
+        self.client.publish(f'{CHANNEL_PREFIX}{trip_id}', json.dumps(snapshot))
+
+    def start_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self.listen, name='seat-availability-listener', daemon=True)
+                self._listener.start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                for message in pubsub.listen():
+                    trip_id = int(message['channel'].decode()[len(CHANNEL_PREFIX):])
+                    self.deliver(trip_id, json.loads(message['data']))
+            except Exception:
+                logger.exception("Seat availability listener lost its Redis connection, reconnecting")
+                time.sleep(1)
+
+
+broker = RedisBroker(settings.REDIS_URL) if settings.REDIS_URL else LocalBroker()
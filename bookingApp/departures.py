@@ -0,0 +1,178 @@
+"""
+Per-city departure boards.
+
+Each origin city's upcoming trips (from the start of the local day to
+``DEPARTURE_BOARD_DAYS`` days ahead, by ``departure_at``) are kept in the shared cache as one list sorted
+by departure, with a parallel list of sort keys. Showing the next ``k``
+departures is a bisect on the keys followed by a slice, and the seat counts
+come from the per-trip snapshots kept by bookingApp.availability, so a board
+refresh reads two cache entries and no table.
+
+Trip saves and deletes patch the boards of the cities involved after their
+transaction commits; bookings only change seat snapshots, which the boards
+read live. Boards are rebuilt with one query when missing, when the day rolls
+over, or after a concurrent update gave up on its lock.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import compute_snapshots, snapshot_key
+from .models import Trip, local_day_bounds, trip_time_zone
+
+
+logger = logging.getLogger(__name__)
+
+
+def board_key(city_id):
+    return f'departures:{city_id}'
+
+
+def sort_key(trip):
+    return (trip.departure_at.timestamp(), trip.pk)
+
+
+def board_entry(trip):
+    destination = trip.route.destination
+    return {
+        'trip': trip.pk,
+        'route': trip.route_id,
+        'date': trip.date.isoformat(),
+        'departure_at': trip.departure_at.isoformat(),
+        'departure_time': trip.departure_time.strftime('%H:%M'),
+        'arrival_time': trip.arrival_time.strftime('%H:%M'),
+        'time_of_day': trip.time_of_day,
+        'destination': {'id': destination.id, 'name': destination.name, 'abbr': destination.abbr},
+    }
+
+
+def local_today():
+    return timezone.localdate(timezone=trip_time_zone())
+
+
+def upcoming_trips(today):
+    start, _ = local_day_bounds(today)
+    _, end = local_day_bounds(today + timedelta(days=settings.DEPARTURE_BOARD_DAYS))
+    return Trip.objects.filter(is_active=True).departing_between(start, end).select_related('route__destination')
+
+
+def build_board(city_id, today):
+    trips = upcoming_trips(today).filter(route__origin_id=city_id).order_by('departure_at', 'pk')
+    board = {
+        'day': today.isoformat(),
+        'keys': [sort_key(trip) for trip in trips],
+        'entries': [board_entry(trip) for trip in trips],
+    }
+    cache.set(board_key(city_id), board, settings.DEPARTURE_BOARD_TTL)
+    return board
+
+
+def get_board(city_id, today):
+    board = cache.get(board_key(city_id))
+    if board is None or board['day'] != today.isoformat():
+        board = build_board(city_id, today)
+    return board
+
+
+def next_departures(city_id, limit):
+    """
+    The next ``limit`` departures from ``city_id`` with their seat counts.
+    """
+    board = get_board(city_id, local_today())
+    start = bisect_left(board['keys'], (timezone.now().timestamp(), 0))
+    entries = board['entries'][start:start + limit]
+
+    keys = {snapshot_key(entry['trip']): entry['trip'] for entry in entries}
+    snapshots = {keys[key]: snapshot for key, snapshot in cache.get_many(keys).items()}
+    missing = [trip_id for trip_id in keys.values() if trip_id not in snapshots]
+    if missing:
+        computed = compute_snapshots(missing)
+        cache.set_many({snapshot_key(trip_id): snapshot for trip_id, snapshot in computed.items()}, settings.SEAT_SNAPSHOT_TTL)
+        snapshots.update(computed)
+
+    return [
+        {**entry, 'available_seats': snapshots[entry['trip']]['available_seats'] if entry['trip'] in snapshots else None}
+        for entry in entries
+    ]
+
+
+def patch_board(city_id, trips, removed_ids, today):
+    """
+    Drop ``removed_ids`` from a cached board and (re)insert ``trips``. Boards
+    that are not cached are left to be built on the next read.
+    """
+    key = board_key(city_id)
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, timeout=10):
+        # Someone else is patching this board; rebuilding later is always safe.
+        cache.delete(key)
+        return
+    try:
+        board = cache.get(key)
+        if board is None or board['day'] != today.isoformat():
+            return
+        stale = set(removed_ids) | {trip.pk for trip in trips}
+        kept = [(sort, entry) for sort, entry in zip(board['keys'], board['entries']) if entry['trip'] not in stale]
+        board['keys'] = [sort for sort, _ in kept]
+        board['entries'] = [entry for _, entry in kept]
+        for trip in trips:
+            sort = sort_key(trip)
+            position = bisect_left(board['keys'], sort)
+            board['keys'].insert(position, sort)
+            board['entries'].insert(position, board_entry(trip))
+        cache.set(key, board, settings.DEPARTURE_BOARD_TTL)
+    finally:
+        cache.delete(lock)
+
+
+def apply_changes(changes):
+    """
+    Patch the boards for ``changes``, a set of ``(trip_id, origin_city_id)``.
+    """
+    today = local_today()
+    trip_ids = {trip_id for trip_id, _ in changes}
+    trips = {trip.pk: trip for trip in upcoming_trips(today).filter(pk__in=trip_ids)}
+
+    cities = {}
+    for trip_id, origin_id in changes:
+        if origin_id is not None:
+            cities.setdefault(origin_id, set()).add(trip_id)
+    for trip in trips.values():
+        cities.setdefault(trip.route.origin_id, set()).add(trip.pk)
+
+    for city_id, city_trip_ids in cities.items():
+        shown = [trips[trip_id] for trip_id in city_trip_ids if trip_id in trips and trips[trip_id].route.origin_id == city_id]
+        patch_board(city_id, shown, city_trip_ids, today)
+
+
+_pending = threading.local()
+
+
+def trip_changed(trip_id, origin_id):
+    """
+    Update the departure boards for a saved or deleted trip once the current
+    transaction commits. ``origin_id`` is the origin city whose board may
+    already list the trip.
+    """
+    if not hasattr(_pending, 'changes'):
+        _pending.changes = set()
+    _pending.changes.add((trip_id, origin_id))
+    transaction.on_commit(flush_pending)
+
+
+def flush_pending():
+    changes = getattr(_pending, 'changes', None)
+    if not changes:
+        return
+    _pending.changes = set()
+    try:
+        apply_changes(changes)
+    except Exception:
+        # Boards are rebuilt daily and expire after DEPARTURE_BOARD_TTL.
+        logger.exception("Could not update departure boards")
@@ -0,0 +1,213 @@
+"""
+Mass trip cancellation and rescheduling.
+
+When a road closes, every trip on a route for a day is cancelled or moved at
+once. The trips themselves are few and are loaded, but their bookings and
+payments can run into the thousands, so those are only ever touched through
+aggregates and set-based UPDATEs. The ids of the live bookings are streamed
+before the UPDATEs and handed, ``NOTIFY_CHUNK_SIZE`` at a time, to
+notify_passengers tasks (bookingApp.tasks) that text the passengers after
+the commit.
+
+``disrupt_trips`` with ``dry_run`` reports the same impact without writing
+anything.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from utils.tasks import enqueue
+from .availability import seats_changed
+from .departures import trip_changed
+from .models import Trip, Booking, Payment, trip_datetimes, trip_time_zone
+from .reference_cache import reference_cache
+from .rollups import trips_changed
+from .tasks import NOTIFY_CHUNK_SIZE, notify_passengers
+from .timetable import check_schedule
+
+
+CANCEL = 'cancel'
+
+MOVE = 'move'
+
+LIVE_BOOKINGS = Q(is_deleted=False) & ~Q(status=Booking.CANCELLED)
+
+
+class DisruptionError(Exception):
+    """
+    Raised when trips cannot be moved. ``errors`` maps trip ids to messages.
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def select_trips(route_id=None, day=None, trip_ids=None):
+    """
+    Active trips of ``route_id`` leaving on the local ``day``, and/or the
+    trips in ``trip_ids``.
+    """
+    trips = Trip.objects.filter(is_active=True)
+    if trip_ids:
+        trips = trips.filter(pk__in=trip_ids)
+    if route_id is not None:
+        trips = trips.filter(route_id=route_id)
+    if day is not None:
+        trips = trips.departing_on(day)
+    return trips.select_related('bus', 'route__origin', 'route__destination').order_by('departure_at', 'pk')
+
+
+def booking_impact(trip_ids):
+    """
+    Live bookings, seats and unrefunded payments of each trip, in one query.
+    """
+    rows = (
+        Booking.objects.filter(LIVE_BOOKINGS, trip_id__in=trip_ids)
+        .values('trip_id')
+        .annotate(
+            bookings=Count('id'),
+            seats=Coalesce(Sum('seats'), 0),
+            payments=Count('payment', filter=Q(payment__is_refunded=False)),
+            refund_amount=Sum('payment__amount', filter=Q(payment__is_refunded=False)),
+        )
+        .order_by()
+    )
+    return {row['trip_id']: row for row in rows}
+
+
+def recipient_chunks(trip_ids):
+    """
+    Ids of the live bookings of ``trip_ids`` that have a customer to notify,
+    streamed as ``(trip_id, booking_ids)`` chunks of at most
+    ``NOTIFY_CHUNK_SIZE`` ids of one trip. Read before the bookings' status
+    changes so that passengers who had already cancelled are left out.
+    """
+    bookings = (
+        Booking.objects.filter(LIVE_BOOKINGS, trip_id__in=trip_ids, customer_info__isnull=False)
+        .values_list('trip_id', 'pk')
+        .order_by('trip_id', 'pk')
+    )
+    chunk_trip_id, chunk = None, []
+    for trip_id, booking_id in bookings.iterator(chunk_size=NOTIFY_CHUNK_SIZE):
+        if chunk and (trip_id != chunk_trip_id or len(chunk) == NOTIFY_CHUNK_SIZE):
+            yield chunk_trip_id, chunk
+            chunk = []
+        chunk_trip_id = trip_id
+        chunk.append(booking_id)
+    if chunk:
+        yield chunk_trip_id, chunk
+
+
+def reschedule(trip, day=None, delay=timedelta()):
+    """
+    Move ``trip`` to the local ``day`` and/or ``delay`` it, in memory.
+    """
+    departure_at, arrival_at = trip_datetimes(day or trip.date, trip.departure_time, trip.arrival_time)
+    departure_at = (departure_at + delay).astimezone(trip_time_zone())
+    trip.date, trip.departure_time = departure_at.date(), departure_at.time()
+    if arrival_at is not None:
+        trip.arrival_time = (arrival_at + delay).astimezone(trip_time_zone()).time()
+    trip.time_of_day = Trip.MORNING if trip.departure_time.hour < 12 else Trip.EVENING
+    trip.set_datetimes()
+
+
+def describe(trip):
+    route = reference_cache.route(trip.route_id) or trip.route
+    origin = reference_cache.city(route.origin_id) or route.origin
+    destination = reference_cache.city(route.destination_id) or route.destination
+    return f"{origin.abbr}-{destination.abbr} du {trip.date} {trip.departure_time.strftime('%H:%M')}"
+
+
+def disrupt_trips(trips, action, day=None, delay=timedelta(), reason='', dry_run=False):
+    """
+    Cancel (``action`` CANCEL) or move to ``day`` and/or by ``delay`` (MOVE)
+    the ``trips`` queryset, update their bookings and payments and notify
+    the passengers. Returns a report of the trips and bookings affected.
+    """
+    with transaction.atomic():
+        trips = list(trips.select_for_update(of=('self',)))
+        trip_ids = [trip.pk for trip in trips]
+        old_keys = {trip.pk: (trip.route_id, trip.date) for trip in trips}
+        old_descriptions = {trip.pk: describe(trip) for trip in trips}
+        old_departures = {trip.pk: trip.departure_at for trip in trips}
+        impact = booking_impact(trip_ids)
+
+        if action == MOVE:
+            for trip in trips:
+                reschedule(trip, day, delay)
+            errors = [{} for trip in trips]
+            check_schedule(trips, {trip.bus_id: trip.bus for trip in trips}, {trip.pk: trip.bus_id for trip in trips}, errors)
+            conflicts = {trip.pk: error['bus'][0] for trip, error in zip(trips, errors) if error}
+            if conflicts and not dry_run:
+                raise DisruptionError(conflicts)
+        else:
+            conflicts = {}
+
+        report = build_report(action, trips, old_departures, impact, conflicts, dry_run)
+        if dry_run:
+            return report
+
+        messages = {}
+        for trip in trips:
+            if action == CANCEL:
+                message = f"Favour Express: votre voyage {old_descriptions[trip.pk]} est annule. {reason} Votre paiement sera rembourse. Merci"
+            else:
+                message = f"Favour Express: votre voyage {old_descriptions[trip.pk]} est deplace au {trip.date} {trip.departure_time.strftime('%H:%M')}. {reason} Merci"
+            messages[trip.pk] = ' '.join(message.split())
+        for trip_id, booking_ids in recipient_chunks(trip_ids):
+            enqueue(notify_passengers, booking_ids, messages[trip_id])
+
+        if action == CANCEL:
+            Trip.objects.filter(pk__in=trip_ids).update(is_active=False)
+            # Payments first, while their bookings still read as live.
+            report['totals']['payments_marked'] = Payment.objects.filter(
+                booking__in=Booking.objects.filter(LIVE_BOOKINGS, trip_id__in=trip_ids),
+                is_refunded=False, refund_requested_at__isnull=True,
+            ).update(refund_requested_at=timezone.now())
+            report['totals']['bookings_updated'] = Booking.objects.filter(LIVE_BOOKINGS, trip_id__in=trip_ids).update(
+                status=Booking.CANCELLED
+            )
+        else:
+            Trip.objects.bulk_update(trips, ['date', 'departure_time', 'arrival_time', 'time_of_day', 'departure_at', 'arrival_at'])
+
+        for trip in trips:
+            trip_changed(trip.pk, (reference_cache.route(trip.route_id) or trip.route).origin_id)
+
+        seats_changed(*trip_ids)
+        trips_changed(*trip_ids, keys=old_keys.values())
+    return report
+
+
+def build_report(action, trips, old_departures, impact, conflicts, dry_run):
+    rows = []
+    for trip in trips:
+        counts = impact.get(trip.pk, {})
+        rows.append({
+            'trip': trip.pk,
+            'route': trip.route_id,
+            'bus': trip.bus_id,
+            'departure_at': old_departures[trip.pk],
+            'new_departure_at': trip.departure_at if action == MOVE else None,
+            'bookings': counts.get('bookings', 0),
+            'seats': counts.get('seats', 0),
+            'payments_to_refund': counts.get('payments', 0) if action == CANCEL else 0,
+            'refund_amount': (counts.get('refund_amount') or 0) if action == CANCEL else 0,
+            'conflict': conflicts.get(trip.pk),
+        })
+    return {
+        'action': action,
+        'dry_run': dry_run,
+        'trips': rows,
+        'totals': {
+            'trips': len(rows),
+            'bookings': sum(row['bookings'] for row in rows),
+            'seats': sum(row['seats'] for row in rows),
+            'payments_to_refund': sum(row['payments_to_refund'] for row in rows),
+            'refund_amount': sum(row['refund_amount'] for row in rows),
+            'conflicts': len(conflicts),
+        },
+    }
@@ -0,0 +1,169 @@
+"""
+Bulk loading of reference data (regions, cities and bus types).
+
+Input is read from CSV, JSON lines or JSON files, diffed in memory against
+the existing rows by natural key, and written with bulk_create and
+bulk_update in batches, so a national dataset costs a handful of queries
+instead of one get_or_create per row. CSV and JSON lines are streamed row by
+row; a plain JSON document is parsed whole, so large datasets should be
+given as JSON lines.
+"""
+import csv
+import json
+from pathlib import Path
+
+from django.utils.text import slugify
+
+from .models import Region, City, BusType
+from .versioning import mark_changed
+
+
+class LoadResult:
+
+    def __init__(self, model):
+        self.model = model
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def __str__(self):
+        return f"{self.model._meta.verbose_name_plural}: {self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged"
+
+
+class BulkLoader:
+    """
+    Diffs incoming rows against the existing rows of ``model`` by
+    ``key_fields`` and applies the difference in batches.
+
+    Rows are dicts of field name to value. Only ``update_fields`` are compared
+    and written for rows that already exist.
+    """
+
+    def __init__(self, model, key_fields, update_fields, batch_size=1000):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.update_fields = tuple(update_fields)
+        self.batch_size = batch_size
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def load(self, rows):
+        result = LoadResult(self.model)
+        fields = set(self.key_fields + self.update_fields + ('pk',))
+        existing = {
+            self.key(values): values
+            for values in self.model.objects.values(*fields)
+        }
+        seen = set()
+        to_create = []
+        to_update = []
+
+        for row in rows:
+            key = self.key(row)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            current = existing.get(key)
+            if current is None:
+                to_create.append(self.model(**row))
+            elif any(current[field] != row[field] for field in self.update_fields):
+                instance = self.model(pk=current['pk'], **row)
+                to_update.append(instance)
+            else:
+                result.unchanged += 1
+
+            if len(to_create) >= self.batch_size:
+                result.inserted += self.flush_create(to_create)
+            if len(to_update) >= self.batch_size:
+                result.updated += self.flush_update(to_update)
+
+        result.inserted += self.flush_create(to_create)
+        result.updated += self.flush_update(to_update)
+
+        if result.inserted or result.updated:
+            mark_changed(self.model)
+        return result
+
+    def flush_create(self, objects):
+        count = len(objects)
+        if count:
+            self.model.objects.bulk_create(objects, batch_size=self.batch_size)
+            objects.clear()
+        return count
+
+    def flush_update(self, objects):
+        count = len(objects)
+        if count:
+            self.model.objects.bulk_update(objects, self.update_fields, batch_size=self.batch_size)
+            objects.clear()
+        return count
+
+
+def iter_records(file_path, root_key=None):
+    """
+    Yield the records of a ``.csv``, ``.jsonl``/``.ndjson`` or ``.json`` file.
+    CSV and JSON lines are streamed; a ``.json`` document is loaded into
+    memory whole and may wrap its list in ``root_key``.
+    """
+    suffix = Path(file_path).suffix.lower()
+    with open(file_path, 'r', newline='' if suffix == '.csv' else None) as file:
+        if suffix == '.csv':
+            yield from csv.DictReader(file)
+        elif suffix in ('.jsonl', '.ndjson'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(file)
+            yield from data[root_key] if root_key and isinstance(data, dict) else data
+
+
+def iter_locations(file_path):
+    """
+    Yield ``{'region', 'city', 'abbr'}`` rows from either the nested
+    ``{"regions": [{"name", "abbr", "cities": [...]}]}`` layout, where cities
+    are names or ``{"name", "abbr"}`` objects, or from flat records.
+    """
+    for record in iter_records(file_path, 'regions'):
+        if 'cities' not in record:
+            yield {'region': record['region'], 'city': record['city'], 'abbr': record.get('abbr') or None}
+            continue
+
+        for city in record['cities']:
+            if isinstance(city, str):
+                yield {'region': record['name'], 'city': city, 'abbr': record.get('abbr')}
+            else:
+                yield {'region': record['name'], 'city': city['name'], 'abbr': city.get('abbr') or record.get('abbr')}
+
+
+def load_locations(file_path, batch_size=1000):
+    """
+    Upsert the regions, then the cities, of a locations file. The file is
+    streamed twice so cities can reference regions created in the first pass.
+    """
+    regions = BulkLoader(Region, ['slug'], ['name', 'is_active'], batch_size).load(
+        {'slug': slugify(row['region']), 'name': row['region'], 'is_active': True}
+        for row in iter_locations(file_path)
+    )
+
+    region_ids = dict(Region.objects.values_list('slug', 'pk'))
+    cities = BulkLoader(City, ['slug'], ['name', 'region_id', 'abbr', 'is_active'], batch_size).load(
+        {
+            'slug': slugify(row['city']),
+            'name': row['city'],
+            'region_id': region_ids[slugify(row['region'])],
+            'abbr': row['abbr'],
+            'is_active': True,
+        }
+        for row in iter_locations(file_path)
+    )
+    return regions, cities
+
+
+def load_bus_types(file_path, batch_size=1000):
+    return BulkLoader(BusType, ['name'], ['capacity'], batch_size).load(
+        {'name': record['name'], 'capacity': int(record['capacity'])}
+        for record in iter_records(file_path, 'bus_types')
+    )
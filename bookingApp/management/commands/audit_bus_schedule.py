@@ -0,0 +1,58 @@
+import json
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from ...models import Trip, local_day_bounds
+from ...scheduling import find_conflicts, non_operational_buses
+
+class Command(BaseCommand):
+    help = 'Find buses assigned to overlapping trips, or to trips while out of service, in one pass over the schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='First travel date to audit (YYYY-MM-DD), defaults to the earliest trip')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None, help='Last travel date to audit (YYYY-MM-DD), defaults to the latest trip')
+        parser.add_argument('--limit', type=int, default=100, help='Number of conflicts to list')
+        parser.add_argument('--json', action='store_true', help='Print the conflicts as JSON')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        trips = Trip.objects.filter(is_active=True, departure_at__isnull=False)
+        if options['start_date']:
+            trips = trips.filter(departure_at__gte=local_day_bounds(options['start_date'])[0])
+        if options['end_date']:
+            trips = trips.filter(departure_at__lt=local_day_bounds(options['end_date'])[1])
+
+        # One streamed scan in (bus, departure_at) order, served by that index.
+        rows = trips.order_by('bus_id', 'departure_at', 'pk').values_list('pk', 'bus_id', 'departure_at', 'arrival_at')
+        overlaps = []
+        overlap_count = 0
+        for (trip_id, bus_id, departure_at, arrival_at), other_trip_id in find_conflicts(rows.iterator(chunk_size=5000)):
+            overlap_count += 1
+            if len(overlaps) < options['limit']:
+                overlaps.append({'bus': bus_id, 'trip': trip_id, 'overlaps': other_trip_id, 'departure_at': departure_at.isoformat()})
+
+        out_of_service = list(
+            trips.filter(bus__in=non_operational_buses(), departure_at__gte=local_day_bounds(date.today())[0])
+            .order_by('bus_id', 'departure_at').values('pk', 'bus_id', 'bus__maintenance_status', 'departure_at')[:options['limit']]
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'overlap_count': overlap_count,
+                'overlaps': overlaps,
+                'out_of_service': [
+                    {'bus': row['bus_id'], 'trip': row['pk'], 'status': row['bus__maintenance_status'], 'departure_at': row['departure_at'].isoformat()}
+                    for row in out_of_service
+                ],
+            }, indent=2))
+            return
+
+        for overlap in overlaps:
+            self.stdout.write(f"  bus {overlap['bus']}: trip {overlap['trip']} at {overlap['departure_at']} overlaps trip {overlap['overlaps']}")
+        for row in out_of_service:
+            self.stdout.write(f"  bus {row['bus_id']} ({row['bus__maintenance_status']}): upcoming trip {row['pk']} at {row['departure_at'].isoformat()}")
+
+        style = self.style.SUCCESS if not (overlap_count or out_of_service) else self.style.WARNING
+        self.stdout.write(style(
+            f'{overlap_count} overlapping assignments, {len(out_of_service)} upcoming trips on buses out of service, in {time.monotonic() - started:.1f}s'
+        ))
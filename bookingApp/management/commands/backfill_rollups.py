@@ -0,0 +1,34 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from ...models import Trip
+from ...rollups import date_chunks, rebuild
+
+class Command(BaseCommand):
+    help = 'Build the daily route statistics and trip occupancy rollups from the raw tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='First travel date to rebuild (YYYY-MM-DD), defaults to the earliest trip')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None, help='Last travel date to rebuild (YYYY-MM-DD), defaults to the latest trip')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Travel days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        bounds = Trip.objects.aggregate(first=Min('date'), last=Max('date'))
+        start_date = options['start_date'] or bounds['first']
+        end_date = options['end_date'] or bounds['last']
+        if start_date is None or end_date is None:
+            self.stdout.write(self.style.WARNING('No trips to build rollups from'))
+            return
+
+        started = time.monotonic()
+        total_days = total_trips = 0
+        for chunk_start, chunk_end in date_chunks(start_date, end_date, options['chunk_days']):
+            days, trips = rebuild(chunk_start, chunk_end)
+            total_days += days
+            total_trips += trips
+            self.stdout.write(f'  {chunk_start} to {chunk_end}: {days} daily rows, {trips} trips')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {total_days} daily rows and {total_trips} trip rollups from {start_date} to {end_date} in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,58 @@
+import json
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from ...disruptions import CANCEL, MOVE, DisruptionError, disrupt_trips, select_trips
+
+class Command(BaseCommand):
+    help = 'Cancel or move every trip of a route on a day (or the given trips), updating their bookings and notifying passengers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--route', type=int, default=None, help='Route whose trips are affected')
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help='Local travel date of the trips (YYYY-MM-DD)')
+        parser.add_argument('--trip', type=int, action='append', default=[], help='Trip to include; may be repeated')
+        parser.add_argument('--cancel', action='store_true', help='Cancel the trips and request refunds of their payments')
+        parser.add_argument('--move-to-date', type=date.fromisoformat, default=None, help='Move the trips to this date (YYYY-MM-DD), keeping their times')
+        parser.add_argument('--delay-minutes', type=int, default=0, help='Move the trips later by this many minutes (negative for earlier)')
+        parser.add_argument('--reason', type=str, default='', help='Reason included in the passenger SMS')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the trips, bookings and payments that would be affected')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if not (options['route'] or options['trip']):
+            raise CommandError('Give --route (usually with --date) or at least one --trip')
+        moving = options['move_to_date'] is not None or options['delay_minutes']
+        if options['cancel'] == bool(moving):
+            raise CommandError('Give either --cancel or --move-to-date/--delay-minutes')
+
+        trips = select_trips(options['route'], options['date'], options['trip'])
+        try:
+            report = disrupt_trips(
+                trips, CANCEL if options['cancel'] else MOVE,
+                day=options['move_to_date'], delay=timedelta(minutes=options['delay_minutes']),
+                reason=options['reason'], dry_run=options['dry_run'],
+            )
+        except DisruptionError as error:
+            for trip_id, message in error.errors.items():
+                self.stdout.write(self.style.ERROR(f'  trip {trip_id}: {message}'))
+            raise CommandError('Nothing was changed: the trips cannot be moved there')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
+        for row in report['trips']:
+            moved = f" -> {row['new_departure_at'].isoformat()}" if row['new_departure_at'] else ''
+            conflict = f" ({row['conflict']})" if row['conflict'] else ''
+            self.stdout.write(
+                f"  trip {row['trip']} at {row['departure_at'].isoformat()}{moved}: {row['bookings']} bookings, "
+                f"{row['seats']} seats, {row['payments_to_refund']} payments to refund{conflict}"
+            )
+        totals = report['totals']
+        summary = (
+            f"{totals['trips']} trips, {totals['bookings']} bookings, {totals['seats']} seats, "
+            f"{totals['payments_to_refund']} payments ({totals['refund_amount']}) to refund"
+        )
+        if report['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing changed: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{"Cancelled" if report["action"] == CANCEL else "Moved"} {summary}'))
@@ -0,0 +1,39 @@
+import json
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from ...departures import local_today
+from ...manifests import manifest_trips, manifests, render_csv, render_json, render_print
+
+class Command(BaseCommand):
+    help = 'Export the passenger manifests of the trips leaving on a day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help='Local departure date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--time-of-day', choices=['morning', 'evening'], default=None, help='Only morning or evening trips')
+        parser.add_argument('--origin', type=int, default=None, help='Only trips leaving from this town')
+        parser.add_argument('--trip', type=int, action='append', default=[], help='Export this trip instead; may be repeated')
+        parser.add_argument('--format', choices=['json', 'csv', 'print'], default='csv', help='Output format')
+        parser.add_argument('--output', type=str, default=None, help='File to write, defaults to standard output')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        day = None if options['trip'] else options['date'] or local_today()
+        trip_ids = manifest_trips(day, options['time_of_day'], options['origin'], options['trip'])
+        trip_manifests = manifests(trip_ids)
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else self.stdout
+        try:
+            if options['format'] == 'csv':
+                for line in render_csv(trip_manifests):
+                    output.write(line)
+            elif options['format'] == 'print':
+                output.write(render_print(trip_manifests))
+            else:
+                output.write(json.dumps(render_json(trip_manifests), cls=DjangoJSONEncoder, ensure_ascii=False))
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(f'Exported the manifests of {len(trip_ids)} trips in {time.monotonic() - started:.2f}s'))
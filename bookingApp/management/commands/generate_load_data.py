@@ -0,0 +1,276 @@
+import json
+import random
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.conf import settings
+from ...models import City, BusType, Bus, Route, Trip, CustomerInfo, Booking, Payment, local_day_bounds
+from ...loaders import load_locations
+from ...scheduling import BusSchedule, interval
+from ...versioning import bump_version
+
+DEPARTURE_TIMES = ['05:30', '06:00', '07:00', '08:00', '09:30', '11:00', '13:00', '15:00', '18:00', '20:00', '21:30', '22:00']
+
+FIRST_NAMES = ['Jean', 'Marie', 'Paul', 'Aïcha', 'Emmanuel', 'Brenda', 'Ibrahim', 'Chantal', 'Samuel', 'Grace', 'Hamadou', 'Nadège', 'Eric', 'Mireille', 'Fru', 'Ngozi']
+
+LAST_NAMES = ['Mbarga', 'Ngono', 'Fotso', 'Tchinda', 'Abega', 'Bello', 'Nkwenti', 'Eyenga', 'Kamga', 'Oumarou', 'Tabi', 'Essomba', 'Njoya', 'Atangana', 'Che', 'Manga']
+
+BOOKING_STATUSES = [(Booking.CONFIRMED, 70), (Booking.PENDING, 20), (Booking.CANCELLED, 10)]
+
+# Random buses tried per trip before giving up on it; the fleet must be large
+# enough for the timetable since a bus never runs two trips at once.
+BUS_ATTEMPTS = 8
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, production-sized dataset for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed produces the same dataset')
+        parser.add_argument('--file', type=str, help='Path to the JSON file containing the cities (defaults to cameroon_cities.json)')
+        parser.add_argument('--routes', type=int, default=1500, help='Number of routes to use')
+        parser.add_argument('--days', type=int, default=365, help='Number of days of trips')
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='First day of trips (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--trips-per-day', type=int, default=2, help='Trips per route and day')
+        parser.add_argument('--buses', type=int, default=1500, help='Number of buses in the fleet')
+        parser.add_argument('--customers', type=int, default=200000, help='Number of customers')
+        parser.add_argument('--bookings', type=int, default=1000000, help='Number of bookings')
+        parser.add_argument('--payment-ratio', type=float, default=0.8, help='Share of bookings that have a payment')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create')
+        parser.add_argument('--clear', action='store_true', help='Delete data generated earlier with the same seed first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = f"LT{options['seed']}-"
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        if options['clear']:
+            self.clear()
+        elif Trip.objects.filter(bus__registration_number__startswith=self.prefix).exists():
+            self.stdout.write(self.style.ERROR(f"Load data for seed {options['seed']} already exists, use --clear to regenerate it"))
+            return
+
+        cities = self.generate_cities(options['file'] or settings.BASE_DIR / 'bookingApp/management/commands/cameroon_cities.json')
+        if cities is None:
+            return
+        buses = self.generate_buses(options['buses'])
+        routes = self.generate_routes(cities, options['routes'])
+        trips = self.generate_trips(routes, buses, options['start_date'] or date.today(), options['days'], options['trips_per_day'])
+        customers = self.generate_customers(options['customers'])
+        self.generate_bookings(trips, routes, customers, options['bookings'], options['payment_ratio'])
+
+        for model in (BusType, Route):
+            bump_version(model)
+
+        self.stdout.write(self.style.SUCCESS(f'Generated load data in {time.monotonic() - started:.1f}s'))
+
+    def step(self, message, started, count):
+        self.stdout.write(self.style.SUCCESS(f'{message}: {count} rows in {time.monotonic() - started:.1f}s'))
+
+    def bulk_create(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def clear(self):
+        started = time.monotonic()
+        with transaction.atomic():
+            Trip.objects.filter(bus__registration_number__startswith=self.prefix).delete()
+            CustomerInfo.objects.filter(identification__startswith=self.prefix).delete()
+            Bus.objects.filter(registration_number__startswith=self.prefix).delete()
+        self.step('Cleared previous load data', started, 0)
+
+    def generate_cities(self, file_path):
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                load_locations(file_path, batch_size=self.batch_size)
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'File not found: {file_path}'))
+            return None
+        except json.JSONDecodeError:
+            self.stdout.write(self.style.ERROR(f'Invalid JSON in file: {file_path}'))
+            return None
+
+        cities = list(City.objects.order_by('id').values_list('id', flat=True))
+        self.step('Cities', started, len(cities))
+        return cities
+
+    def generate_buses(self, count):
+        started = time.monotonic()
+        bus_types = list(BusType.objects.order_by('id'))
+        if not bus_types:
+            bus_types = [BusType.objects.create_or_update(name='Standard', capacity=70), BusType.objects.create_or_update(name='VIP', capacity=60)]
+
+        existing = set(Bus.objects.filter(registration_number__startswith=self.prefix).values_list('registration_number', flat=True))
+        new_buses = []
+        for index in range(count):
+            registration_number = f'{self.prefix}{index:05d}'
+            bus_type = self.rng.choice(bus_types)
+            if registration_number not in existing:
+                new_buses.append(Bus(bus_type=bus_type, registration_number=registration_number))
+        self.bulk_create(Bus, new_buses)
+
+        buses = list(
+            Bus.objects.filter(registration_number__startswith=self.prefix)
+            .order_by('registration_number').values_list('id', 'bus_type__capacity')
+        )
+        self.step('Buses', started, len(buses))
+        return buses
+
+    def generate_routes(self, cities, count):
+        started = time.monotonic()
+        pairs = [(origin, destination) for origin in cities for destination in cities if origin != destination]
+        self.rng.shuffle(pairs)
+        pairs = pairs[:count]
+
+        existing = {
+            (route['origin_id'], route['destination_id']): route
+            for route in Route.objects.values('id', 'origin_id', 'destination_id', 'base_price', 'vip_price')
+        }
+        new_routes = []
+        for origin, destination in pairs:
+            base_price = Decimal(self.rng.randrange(2000, 15001, 500))
+            if (origin, destination) not in existing:
+                new_routes.append(Route(
+                    origin_id=origin, destination_id=destination,
+                    distance=Decimal(self.rng.randrange(40, 900)),
+                    base_price=base_price, vip_price=(base_price * Decimal('1.5')).quantize(Decimal('1')),
+                ))
+        self.bulk_create(Route, new_routes)
+
+        by_pair = {
+            (route['origin_id'], route['destination_id']): route
+            for route in Route.objects.values('id', 'origin_id', 'destination_id', 'base_price', 'vip_price')
+        }
+        routes = [by_pair[pair] for pair in pairs]
+        self.step('Routes', started, len(routes))
+        return routes
+
+    def generate_trips(self, routes, buses, start_date, days, trips_per_day):
+        """
+        Create the trips and return their ids, capacities and route positions
+        as compact arrays for the booking step.
+        """
+        started = time.monotonic()
+        trips = {'ids': array('q'), 'capacities': array('l'), 'routes': array('l')}
+        schedules = {bus_id: BusSchedule() for bus_id, _ in buses}
+        batch = []
+        batch_meta = []
+        skipped = 0
+
+        for day in range(days):
+            trip_date = start_date + timedelta(days=day)
+            for route_index, route in enumerate(routes):
+                for departure in self.rng.sample(DEPARTURE_TIMES, trips_per_day):
+                    departure_time = datetime.strptime(departure, '%H:%M')
+                    arrival_time = departure_time + timedelta(minutes=self.rng.randrange(150, 540, 15))
+                    trip = Trip(
+                        route_id=route['id'], date=trip_date,
+                        departure_time=departure_time.time(), arrival_time=arrival_time.time(),
+                        time_of_day=Trip.MORNING if departure_time.hour < 12 else Trip.EVENING,
+                        created_by=self.prefix,
+                    )
+                    trip.set_datetimes()
+                    start, end = interval(trip.departure_at, trip.arrival_at)
+
+                    for attempt in range(BUS_ATTEMPTS):
+                        bus_id, capacity = self.rng.choice(buses)
+                        if schedules[bus_id].conflict(start, end) is None:
+                            break
+                    else:
+                        skipped += 1
+                        continue
+                    schedules[bus_id].add(start, end, None)
+                    trip.bus_id, trip.available_seats = bus_id, capacity
+                    batch.append(trip)
+                    batch_meta.append((capacity, route_index))
+
+                    if len(batch) >= self.batch_size:
+                        self.flush_trips(batch, batch_meta, trips)
+
+            day_start, _ = local_day_bounds(trip_date)
+            for schedule in schedules.values():
+                schedule.prune(day_start)
+
+        self.flush_trips(batch, batch_meta, trips)
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} trips with no free bus, raise --buses for a full timetable'))
+        self.step('Trips', started, len(trips['ids']))
+        return trips
+
+    def flush_trips(self, batch, batch_meta, trips):
+        self.bulk_create(Trip, batch)
+        for trip, (capacity, route_index) in zip(batch, batch_meta):
+            trips['ids'].append(trip.pk)
+            trips['capacities'].append(capacity)
+            trips['routes'].append(route_index)
+        batch.clear()
+        batch_meta.clear()
+
+    def generate_customers(self, count):
+        started = time.monotonic()
+        existing = CustomerInfo.objects.filter(identification__startswith=self.prefix).count()
+        batch = []
+        for index in range(existing, count):
+            batch.append(CustomerInfo(
+                identification=f'{self.prefix}{index:08d}',
+                phone_number=f'+2376{self.rng.randrange(10 ** 7, 10 ** 8)}',
+                username=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+            ))
+            if len(batch) >= self.batch_size:
+                self.bulk_create(CustomerInfo, batch)
+                batch = []
+        self.bulk_create(CustomerInfo, batch)
+
+        customers = array('q', CustomerInfo.objects.filter(identification__startswith=self.prefix).order_by('id').values_list('id', flat=True))
+        self.step('Customers', started, len(customers))
+        return customers
+
+    def generate_bookings(self, trips, routes, customers, count, payment_ratio):
+        started = time.monotonic()
+        statuses = [status for status, _ in BOOKING_STATUSES]
+        weights = [weight for _, weight in BOOKING_STATUSES]
+        trip_count = len(trips['ids'])
+        created = 0
+
+        while created < count:
+            size = min(self.batch_size, count - created)
+            bookings = []
+            for offset in range(size):
+                trip_index = self.rng.randrange(trip_count)
+                bookings.append(Booking(
+                    customer_info_id=self.rng.choice(customers),
+                    trip_id=trips['ids'][trip_index],
+                    seats=self.rng.choices((1, 2, 3, 4), weights=(60, 25, 10, 5))[0],
+                    status=self.rng.choices(statuses, weights=weights)[0],
+                    service_type='vip' if self.rng.random() < 0.1 else 'standard',
+                    slug=f'{self.prefix.lower()}{created + offset}',
+                ))
+                bookings[-1].route_index = trips['routes'][trip_index]
+
+            with transaction.atomic():
+                Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+                payments = []
+                for booking in bookings:
+                    if self.rng.random() >= payment_ratio:
+                        continue
+                    route = routes[booking.route_index]
+                    price = route['vip_price'] if booking.service_type == 'vip' else route['base_price']
+                    payments.append(Payment(
+                        booking_id=booking.pk,
+                        amount=price * booking.seats,
+                        provider=self.rng.choice((Payment.MTN, Payment.ORANGE)),
+                        transaction_id=f'{self.prefix}{booking.pk:012d}',
+                        payer_name=self.rng.choice(FIRST_NAMES),
+                        payer_phone=f'+2376{self.rng.randrange(10 ** 7, 10 ** 8)}',
+                        is_refunded=booking.status == Booking.CANCELLED,
+                    ))
+                Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+
+            created += size
+            self.stdout.write(f'  {created}/{count} bookings')
+
+        self.step('Bookings', started, created)
@@ -0,0 +1,21 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Generate an Ed25519 key pair for signing boarding tickets'
+
+    def handle(self, *args, **options):
+        key = Ed25519PrivateKey.generate()
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+        self.stdout.write('Add this line to the environment (keep it secret):\n')
+        self.stdout.write('TICKET_SIGNING_KEY=' + private_pem.strip().replace('\n', '\\n') + '\n')
+        self.stdout.write('Devices verify tickets with this public key, also served at tickets/public-key/:\n')
+        self.stdout.write(public_pem)
+        self.stdout.write(self.style.WARNING('Tickets signed with the previous key stop verifying once it is replaced'))
@@ -0,0 +1,72 @@
+import glob
+import json
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log into the top fingerprints by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, help='Path to the slow-query log (defaults to SLOW_QUERY_LOG, rotated files included)')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints to show')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        base_path = options['file'] or settings.SLOW_QUERY_LOG
+        paths = sorted(glob.glob(f'{base_path}*'))
+
+        if not paths:
+            self.stdout.write(self.style.ERROR(f'File not found: {base_path}'))
+            return
+
+        summary = {}
+        skipped = 0
+        for path in paths:
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        skipped += 1
+                        continue
+
+                    item = summary.setdefault(entry['fingerprint'], {
+                        'fingerprint': entry['fingerprint'],
+                        'sql': entry['sql'],
+                        'count': 0,
+                        'total_ms': 0.0,
+                        'max_ms': 0.0,
+                        'views': Counter(),
+                        'call_sites': Counter(),
+                    })
+                    item['count'] += 1
+                    item['total_ms'] += entry['duration_ms']
+                    item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+                    item['views'][entry.get('view') or '-'] += 1
+                    item['call_sites'][f"{entry.get('function') or '-'} ({entry.get('call_site') or '-'})"] += 1
+
+        top = sorted(summary.values(), key=lambda item: item['total_ms'], reverse=True)[:options['top']]
+        for item in top:
+            item['mean_ms'] = round(item['total_ms'] / item['count'], 2)
+            item['total_ms'] = round(item['total_ms'], 2)
+            item['views'] = dict(item['views'].most_common(3))
+            item['call_sites'] = dict(item['call_sites'].most_common(3))
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} unreadable lines'))
+
+        if options['json']:
+            self.stdout.write(json.dumps(top, indent=2))
+            return
+
+        for rank, item in enumerate(top, start=1):
+            self.stdout.write(self.style.SUCCESS(
+                f"{rank}. {item['fingerprint']}  total={item['total_ms']}ms  count={item['count']}  "
+                f"mean={item['mean_ms']}ms  max={item['max_ms']}ms"
+            ))
+            self.stdout.write(f"   {item['sql'][:300]}")
+            for call_site, count in item['call_sites'].items():
+                self.stdout.write(f"   {count}x {call_site}")
+            for view, count in item['views'].items():
+                self.stdout.write(f"   {count}x view {view}")
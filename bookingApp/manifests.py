@@ -0,0 +1,135 @@
+"""
+Passenger manifests.
+
+A manifest lists the confirmed passengers of a trip with their phone,
+identification, seats, service type and payment status. Trips are read in
+batches of ``MANIFEST_BATCH_SIZE`` with one query per batch: the trips are
+LEFT JOINed to their confirmed bookings (a FilteredRelation), the bookings'
+customers and their payments, and only the needed columns are fetched with
+``values_list``, so a network-wide morning export is a handful of queries
+and no model instances.
+
+``manifests`` yields one dict per trip; ``render_json``, ``render_csv`` and
+``render_print`` turn them into the compact JSON, CSV and printable outputs.
+"""
+import csv
+
+from django.conf import settings
+from django.db.models import FilteredRelation, Q
+from django.template.loader import render_to_string
+
+from .models import Trip, Booking
+
+
+MANIFEST_BATCH_SIZE = 500
+
+PASSENGER_FIELDS = ['booking', 'name', 'phone', 'identification', 'seats', 'service_type', 'payment']
+
+CSV_HEADER = ['trip', 'route', 'departure_at', 'bus'] + PASSENGER_FIELDS
+
+COLUMNS = (
+    'pk', 'departure_at', 'route__origin__abbr', 'route__destination__abbr', 'bus__registration_number',
+    'passenger__pk', 'passenger__customer_info__username', 'passenger__customer_info__phone_number',
+    'passenger__customer_info__identification', 'passenger__seats', 'passenger__service_type',
+    'passenger__payment__pk', 'passenger__payment__is_refunded', 'passenger__payment__refund_requested_at',
+)
+
+
+def payment_status(payment_id, is_refunded, refund_requested_at):
+    if payment_id is None:
+        return 'unpaid'
+    if is_refunded:
+        return 'refunded'
+    if refund_requested_at is not None:
+        return 'refund_requested'
+    return 'paid'
+
+
+def manifest_trips(day=None, time_of_day=None, origin_id=None, trip_ids=None):
+    """
+    Ids of the trips to build manifests for, in departure order.
+    """
+    trips = Trip.objects.filter(is_active=True)
+    if trip_ids:
+        trips = trips.filter(pk__in=trip_ids)
+    if day is not None:
+        trips = trips.departing_on(day)
+    if time_of_day:
+        trips = trips.filter(time_of_day=time_of_day)
+    if origin_id is not None:
+        trips = trips.filter(route__origin_id=origin_id)
+    return list(trips.order_by('departure_at', 'pk').values_list('pk', flat=True))
+
+
+def manifests(trip_ids):
+    """
+    Yield the manifest of each trip in ``trip_ids``, in that order.
+    """
+    trip_ids = list(trip_ids)
+    for start in range(0, len(trip_ids), MANIFEST_BATCH_SIZE):
+        batch = trip_ids[start:start + MANIFEST_BATCH_SIZE]
+        rows = (
+            Trip.objects.filter(pk__in=batch)
+            .annotate(passenger=FilteredRelation(
+                'booking', condition=Q(booking__status=Booking.CONFIRMED, booking__is_deleted=False)
+            ))
+            .order_by('pk', 'passenger__customer_info__username', 'passenger__pk')
+            .values_list(*COLUMNS)
+        )
+        trips = {}
+        for row in rows:
+            trip_id, departure_at, origin, destination, bus = row[:5]
+            trip = trips.get(trip_id)
+            if trip is None:
+                trip = trips[trip_id] = {
+                    'trip': trip_id,
+                    'route': f'{origin}-{destination}',
+                    'departure_at': departure_at,
+                    'bus': bus,
+                    'seats': 0,
+                    'passengers': [],
+                }
+            booking_id, name, phone, identification, seats, service_type = row[5:11]
+            if booking_id is None:
+                continue
+            trip['seats'] += seats
+            trip['passengers'].append([booking_id, name, phone, identification, seats, service_type, payment_status(*row[11:])])
+        for trip_id in batch:
+            if trip_id in trips:
+                yield trips[trip_id]
+
+
+def render_json(trip_manifests):
+    """
+    Passengers as arrays under a single ``fields`` header, to keep large
+    exports small.
+    """
+    return {'fields': PASSENGER_FIELDS, 'trips': list(trip_manifests)}
+
+
+class Echo:
+    """
+    File-like object handing back what csv.writer writes, for streaming.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_csv(trip_manifests):
+    """
+    Yield CSV lines, one per passenger.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for trip in trip_manifests:
+        departure_at = trip['departure_at'].isoformat() if trip['departure_at'] else ''
+        for passenger in trip['passengers']:
+            yield writer.writerow([trip['trip'], trip['route'], departure_at, trip['bus']] + passenger)
+
+
+def render_print(trip_manifests):
+    """
+    An HTML page per trip, for printing.
+    """
+    return render_to_string('manifests/print.html', {'trips': list(trip_manifests), 'zone': settings.TRIP_TIME_ZONE})
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.15 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0004_city_abbr'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['trip', 'status', 'is_deleted'], include=('seats',), name='booking_trip_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerinfo',
+            index=models.Index(fields=['identification'], name='bookingApp__identif_efa310_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['route', 'date'], name='bookingApp__route_i_fc5875_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['date'], name='bookingApp__date_3b0f78_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.15 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0005_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripOccupancy',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy', serialize=False, to='bookingApp.trip')),
+                ('date', models.DateField(blank=True, null=True, verbose_name='travel date')),
+                ('capacity', models.IntegerField(verbose_name='seats on the trip')),
+                ('booked_seats', models.IntegerField(default=0, verbose_name='seats booked, cancellations excluded')),
+                ('load_factor', models.DecimalField(decimal_places=4, default=0, max_digits=5, verbose_name='share of the seats that are booked')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='payments received, refunds excluded')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='when the rollup was last refreshed')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bookingApp.route')),
+            ],
+            options={
+                'verbose_name': 'Trip Occupancy',
+                'verbose_name_plural': 'Trip Occupancy',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'route'], name='bookingApp__date_e74abc_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRouteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='travel date')),
+                ('service_type', models.CharField(choices=[('vip', 'VIP'), ('standard', 'Standard')], max_length=10, verbose_name='service type of the bookings')),
+                ('bookings', models.IntegerField(default=0, verbose_name='bookings that are not cancelled')),
+                ('cancelled_bookings', models.IntegerField(default=0, verbose_name='cancelled bookings')),
+                ('seats', models.IntegerField(default=0, verbose_name='seats booked')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='payments received, refunds excluded')),
+                ('refunded', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='payments refunded')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='when the rollup was last refreshed')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='bookingApp.route')),
+            ],
+            options={
+                'verbose_name': 'Daily Route Statistics',
+                'verbose_name_plural': 'Daily Route Statistics',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='bookingApp__date_deb700_idx')],
+                'unique_together': {('date', 'route', 'service_type')},
+            },
+        ),
+    ]
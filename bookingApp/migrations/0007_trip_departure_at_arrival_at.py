@@ -0,0 +1,67 @@
+# Generated by Django 4.2.15 on 2026-10-19 17:05
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+
+BATCH_SIZE = 5000
+
+
+def populate_datetimes(apps, schema_editor):
+    Trip = apps.get_model('bookingApp', 'Trip')
+    zone = ZoneInfo(settings.TRIP_TIME_ZONE)
+    last_id = 0
+    while True:
+        trips = list(
+            Trip.objects.filter(pk__gt=last_id, date__isnull=False).order_by('pk')
+            .only('pk', 'date', 'departure_time', 'arrival_time')[:BATCH_SIZE]
+        )
+        if not trips:
+            break
+        for trip in trips:
+            trip.departure_at = datetime.combine(trip.date, trip.departure_time, tzinfo=zone)
+            trip.arrival_at = datetime.combine(trip.date, trip.arrival_time, tzinfo=zone)
+            if trip.arrival_at < trip.departure_at:
+                trip.arrival_at += timedelta(days=1)
+        Trip.objects.bulk_update(trips, ['departure_at', 'arrival_at'])
+        last_id = trips[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0006_dailyroutestats_tripoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='departure_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='departure date and time, derived from date and departure_time'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='arrival_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='arrival date and time, derived from date and arrival_time'),
+        ),
+        migrations.RunPython(populate_datetimes, migrations.RunPython.noop, elidable=True),
+        migrations.AlterModelOptions(
+            name='trip',
+            options={'ordering': ['departure_at'], 'verbose_name': 'Trip', 'verbose_name_plural': 'Trips'},
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['route', 'departure_at'], name='bookingApp__route_i_a55bc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['departure_at'], name='bookingApp__departu_fa2794_idx'),
+        ),
+    ]
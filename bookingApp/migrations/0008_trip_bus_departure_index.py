@@ -0,0 +1,17 @@
+# Generated by Django 4.2.15 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0007_trip_departure_at_arrival_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['bus', 'departure_at'], name='bookingApp__bus_id_354b50_idx'),
+        ),
+    ]
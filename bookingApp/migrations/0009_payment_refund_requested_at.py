@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0008_trip_bus_departure_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='refund_requested_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='when a refund was requested because the trip was cancelled'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.15 on 2026-10-19 19:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0009_payment_refund_requested_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=64, verbose_name='device that scanned the ticket')),
+                ('seats', models.IntegerField(verbose_name='seats boarded with this scan')),
+                ('scanned_at', models.DateTimeField(verbose_name='when the ticket was scanned on the device')),
+                ('synced_at', models.DateTimeField(auto_now_add=True, verbose_name='when the scan reached the server')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boarding_events', to='bookingApp.booking')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boarding_events', to='bookingApp.trip')),
+            ],
+            options={
+                'verbose_name': 'Boarding Event',
+                'verbose_name_plural': 'Boarding Events',
+                'ordering': ['scanned_at'],
+                'indexes': [models.Index(fields=['trip', 'scanned_at'], name='bookingApp__trip_id_86604d_idx')],
+                'unique_together': {('booking', 'device_id', 'scanned_at')},
+            },
+        ),
+    ]
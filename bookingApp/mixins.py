@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versioning import get_versions, surrogate_key
+
+
+class ConditionalListMixin:
+    """
+    Conditional GET support for listings of slowly changing reference tables.
+
+    The ETag and Last-Modified headers are derived from the version counters
+    of ``cache_models`` only, so a 304 is answered without touching the tables.
+    """
+    cache_models = ()
+    cache_public = True
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().list(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            self.set_cache_headers(response, etag, last_modified)
+        return response
+
+    def get_validators(self, request):
+        versions = get_versions(self.cache_models)
+        return self.get_etag(request, versions), max(modified for _, modified in versions.values())
+
+    def get_etag(self, request, versions):
+        parts = [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        parts += [f"{label}:{version}" for label, (version, _) in sorted(versions.items())]
+        return '"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def set_cache_headers(self, response, etag, last_modified):
+        visibility = 'public' if self.cache_public else 'private'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = f"{visibility}, max-age={settings.REFERENCE_DATA_MAX_AGE}"
+        response['Surrogate-Key'] = ' '.join(surrogate_key(model) for model in self.cache_models)
+        patch_vary_headers(response, ['Accept'] if self.cache_public else ['Accept', 'Authorization'])
@@ -5,9 +5,16 @@ from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-import requests
-from decouple import config
 from django.utils.crypto import get_random_string
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from datetime import datetime, timedelta
+from utils.tasks import deliver_sms, enqueue
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
 
 
 def encrypt_value(value):
@@ -39,13 +46,15 @@ class CityManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(is_active=True)
 
-    def create_or_update(self, name, region):
+    def create_or_update(self, name, region, abbr=None):
 
-        city, created = self.get_or_create(name=name, region=region)
+        city, created = self.get_or_create(name=name, region=region, defaults={'abbr': abbr})
 
         if not created:
 
             city.is_active = True
+            if abbr:
+                city.abbr = abbr
             city.save()
 
         return city
@@ -201,6 +210,67 @@ class Route(models.Model):
 
 
 
+def trip_time_zone():
+    return ZoneInfo(settings.TRIP_TIME_ZONE)
+
+
+def trip_datetimes(date, departure_time, arrival_time):
+    """
+    Aware departure and arrival datetimes of a trip whose date and times are
+    local to ``TRIP_TIME_ZONE``. An arrival time earlier than the departure
+    time is on the next day.
+    """
+    if date is None or departure_time is None:
+        return None, None
+    zone = trip_time_zone()
+    departure_at = datetime.combine(date, departure_time, tzinfo=zone)
+    if arrival_time is None:
+        return departure_at, None
+    arrival_at = datetime.combine(date, arrival_time, tzinfo=zone)
+    if arrival_at < departure_at:
+        arrival_at = datetime.combine(date + timedelta(days=1), arrival_time, tzinfo=zone)
+    return departure_at, arrival_at
+
+
+def local_day_bounds(day):
+    """
+    Start and end of ``day`` in ``TRIP_TIME_ZONE``, for half-open
+    ``departure_at`` ranges.
+    """
+    zone = trip_time_zone()
+    start = datetime.combine(day, datetime.min.time(), tzinfo=zone)
+    return start, datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+
+
+class TripQuerySet(models.QuerySet):
+
+    def departing_between(self, start, end):
+        """
+        Trips leaving in ``[start, end)``; either bound may be None.
+        """
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(departure_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(departure_at__lt=end)
+        return queryset
+
+    def departing_on(self, day):
+        return self.departing_between(*local_day_bounds(day))
+
+    def with_details(self):
+        """
+        Load the route, its cities, the bus and its type in the same query and
+        annotate the seats of live bookings, which is everything
+        TripsSerializer reads. The aggregate's GROUP BY drops Meta.ordering,
+        so the departure order is restated for stable pages.
+        """
+        live = models.Q(booking__is_deleted=False) & ~models.Q(booking__status=Booking.CANCELLED)
+        return self.select_related('route__origin', 'route__destination', 'bus__bus_type').annotate(
+            booked_seats=Coalesce(models.Sum('booking__seats', filter=live), 0)
+        ).order_by('departure_at', 'pk')
+
+
 class Trip(models.Model):
     """
     Represents a single trip on a route.
@@ -238,6 +308,12 @@ class Trip(models.Model):
 
     is_active = models.BooleanField(_("indicates if the trip is currently bookable"), default=True)
 
+    departure_at = models.DateTimeField(_("departure date and time, derived from date and departure_time"), null=True, blank=True, editable=False)
+
+    arrival_at = models.DateTimeField(_("arrival date and time, derived from date and arrival_time"), null=True, blank=True, editable=False)
+
+    objects = TripQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.route} - {self.departure_time}"
 
@@ -249,21 +325,60 @@ class Trip(models.Model):
             else:
                 return 0
         
-        booked_seats = self.booking_set.aggregate(models.Sum('seats'))['seats__sum'] or 0
+        booked_seats = getattr(self, 'booked_seats', None)
+        if booked_seats is None:
+            booked_seats = self.booking_set.filter(is_deleted=False).exclude(status=Booking.CANCELLED).aggregate(models.Sum('seats'))['seats__sum'] or 0
         return max(0, self.available_seats - booked_seats)
 
     def is_fully_booked(self):
         return self.remaining_seats() == 0
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        trip = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if 'route_id' in loaded and 'date' in loaded:
+            trip.saved_route_day = (loaded['route_id'], loaded['date'])
+        return trip
+
+    def moved_from(self):
+        """
+        The ``(route_id, date)`` this trip was loaded or last saved with, if
+        it has been changed since; save signals refresh what it left.
+        """
+        saved = getattr(self, 'saved_route_day', None)
+        if saved is not None and saved != (self.route_id, self.date):
+            return saved
+        return None
+
+    def set_datetimes(self):
+        """
+        Derive ``departure_at`` and ``arrival_at``; bulk writes, which skip
+        ``save``, must call this themselves.
+        """
+        self.departure_at, self.arrival_at = trip_datetimes(self.date, self.departure_time, self.arrival_time)
+
     def save(self, *args, **kwargs):
         if self.available_seats is None and self.bus and self.bus.bus_type:
             self.available_seats = self.bus.bus_type.capacity
+        self.set_datetimes()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date', 'departure_time', 'arrival_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'departure_at', 'arrival_at'}
         super().save(*args, **kwargs)
+        self.saved_route_day = (self.route_id, self.date)
 
     class Meta:
-        ordering = ['departure_time']
+        ordering = ['departure_at']
         verbose_name = _("Trip")
         verbose_name_plural = _("Trips")
+        indexes = [
+            models.Index(fields=['route', 'departure_at']),
+            models.Index(fields=['departure_at']),
+            models.Index(fields=['bus', 'departure_at']),
+            models.Index(fields=['route', 'date']),
+            models.Index(fields=['date']),
+        ]
 
 
 
@@ -286,6 +401,7 @@ class CustomerInfo(models.Model):
     class Meta:
         verbose_name = _("Customer Information")
         verbose_name_plural = _("Customer Information")
+        indexes = [models.Index(fields=['identification'])]
         
 
 
@@ -337,9 +453,12 @@ class Booking(models.Model):
         return f"Booking {self.id} - {self.user.username} - {self.trip}"
 
     def total_price(self):
+        from .reference_cache import reference_cache
+
+        route = reference_cache.route(self.trip.route_id) or self.trip.route
         if self.service_type == 'vip':
-            return self.seats * self.trip.route.vip_price
-        return self.seats * self.trip.route.base_price
+            return self.seats * route.vip_price
+        return self.seats * route.base_price
     
     def total_seats(self):
         return self.trip.available_seats - self.seats
@@ -357,19 +476,14 @@ class Booking(models.Model):
         return (timezone.now() - self.booking_time).days < 1
     
     def send_sms_notification(self):
-        url = "https://api.nexah.net/v1/sms"
-        headers = {
-            "Content-Type": "application/json",
-        }
-        data = {
-            "user": config("SMS_API_USER"),
-            "password":config("SMS_API_PASSWORD"),
-            "mobiles": self.customer_info.phone_number,
-            "senderid": config('SMS_SENDER_ID'),
-            "sms": f"Your booking (ID: {self.id}) has been confirmed. Thank you for choosing our service!"
-        }
-        response = requests.post(url, json=data, headers=headers)
-        return response.status_code == 200
+        """
+        Queue the confirmation SMS. It goes out through the deliver_sms task
+        once the current transaction commits, never from the request itself.
+        """
+        enqueue(
+            deliver_sms, self.customer_info.phone_number,
+            f"Your booking (ID: {self.id}) has been confirmed. Thank you for choosing our service!",
+        )
     
     # def save(self, *args, **kwargs):
     #     if not self.slug:
@@ -380,6 +494,7 @@ class Booking(models.Model):
         ordering = ['-booking_time']
         verbose_name = _("Booking")
         verbose_name_plural = _("Bookings")
+        indexes = [models.Index(fields=['trip', 'status', 'is_deleted'], include=['seats'], name='booking_trip_status_idx')]
 
 
 class Payment(models.Model):
@@ -412,6 +527,8 @@ class Payment(models.Model):
 
     is_refunded = models.BooleanField(_("indicates if the payment has been refunded"), default=False)
 
+    refund_requested_at = models.DateTimeField(_("when a refund was requested because the trip was cancelled"), null=True, blank=True)
+
     def __str__(self):
         return f"Payment {self.id} - {self.booking.id} - {self.amount}"
 
@@ -583,4 +700,99 @@ class SMSNotification(models.Model):
     is_sent = models.BooleanField(_("indicates if the SMS was successfully sent"), default=False)
 
     def __str__(self):
-        return f"SMS to {self.recipient.username} - {self.sent_time}"
\ No newline at end of file
+        return f"SMS to {self.recipient.username} - {self.sent_time}"
+
+
+class DailyRouteStats(models.Model):
+    """
+    Daily rollup of bookings and revenue per route and service type, keyed by
+    the travel date. Maintained by bookingApp.rollups; never edit by hand.
+    """
+
+    date = models.DateField(_("travel date"))
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='daily_stats')
+
+    service_type = models.CharField(_("service type of the bookings"), max_length=10, choices=Booking.SERVICE_TYPES)
+
+    bookings = models.IntegerField(_("bookings that are not cancelled"), default=0)
+
+    cancelled_bookings = models.IntegerField(_("cancelled bookings"), default=0)
+
+    seats = models.IntegerField(_("seats booked"), default=0)
+
+    revenue = models.DecimalField(_("payments received, refunds excluded"), max_digits=14, decimal_places=2, default=0)
+
+    refunded = models.DecimalField(_("payments refunded"), max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(_("when the rollup was last refreshed"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.route} - {self.service_type}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = _("Daily Route Statistics")
+        verbose_name_plural = _("Daily Route Statistics")
+        unique_together = ('date', 'route', 'service_type')
+        indexes = [models.Index(fields=['date'])]
+
+
+class TripOccupancy(models.Model):
+    """
+    Seats sold and load factor of a trip. Maintained by bookingApp.rollups.
+    """
+
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name='occupancy')
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE)
+
+    date = models.DateField(_("travel date"), null=True, blank=True)
+
+    capacity = models.IntegerField(_("seats on the trip"))
+
+    booked_seats = models.IntegerField(_("seats booked, cancellations excluded"), default=0)
+
+    load_factor = models.DecimalField(_("share of the seats that are booked"), max_digits=5, decimal_places=4, default=0)
+
+    revenue = models.DecimalField(_("payments received, refunds excluded"), max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(_("when the rollup was last refreshed"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.trip} - {self.load_factor:.0%}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = _("Trip Occupancy")
+        verbose_name_plural = _("Trip Occupancy")
+        indexes = [models.Index(fields=['date', 'route'])]
+
+
+class BoardingEvent(models.Model):
+    """
+    A ticket scanned at boarding, synced in batches from a conductor's
+    device. A scan synced twice is stored once.
+    """
+
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='boarding_events')
+
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='boarding_events')
+
+    device_id = models.CharField(_("device that scanned the ticket"), max_length=64)
+
+    seats = models.IntegerField(_("seats boarded with this scan"))
+
+    scanned_at = models.DateTimeField(_("when the ticket was scanned on the device"))
+
+    synced_at = models.DateTimeField(_("when the scan reached the server"), auto_now_add=True)
+
+    def __str__(self):
+        return f"Booking {self.booking_id} boarded at {self.scanned_at}"
+
+    class Meta:
+        ordering = ['scanned_at']
+        verbose_name = _("Boarding Event")
+        verbose_name_plural = _("Boarding Events")
+        unique_together = ('booking', 'device_id', 'scanned_at')
+        indexes = [models.Index(fields=['trip', 'scanned_at'])]
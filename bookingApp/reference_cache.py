@@ -0,0 +1,126 @@
+"""
+Per-process cache of the small reference tables (regions, cities, bus types,
+routes and payment methods).
+
+Each table is loaded whole on first use and indexed by id and by its natural
+key. A table is dropped as soon as a write to it commits in this process, and
+other workers notice through the shared version counters, which are checked at
+most once every ``REFERENCE_CACHE_CHECK_INTERVAL`` seconds.
+
+Cached instances are shared between requests and must be treated as read-only.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from utils.routers import primary
+from .models import Region, City, BusType, Route, PaymentMethod
+from .versioning import get_versions, purge_requested, table_label
+
+
+NATURAL_KEYS = {
+    Region: lambda region: region.slug,
+    City: lambda city: city.slug,
+    BusType: lambda bus_type: bus_type.name,
+    Route: lambda route: (route.origin_id, route.destination_id),
+    PaymentMethod: lambda method: method.name,
+}
+
+
+class ReferenceDataCache:
+
+    def __init__(self, models):
+        self.models = tuple(models)
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def get(self, model, pk):
+        return self._table(model)['by_id'].get(pk)
+
+    def get_by_key(self, model, key):
+        return self._table(model)['by_key'].get(key)
+
+    def all(self, model):
+        return list(self._table(model)['by_id'].values())
+
+    def region(self, pk):
+        return self.get(Region, pk)
+
+    def city(self, pk):
+        return self.get(City, pk)
+
+    def bus_type(self, pk):
+        return self.get(BusType, pk)
+
+    def route(self, pk):
+        return self.get(Route, pk)
+
+    def route_between(self, origin_id, destination_id):
+        return self.get_by_key(Route, (origin_id, destination_id))
+
+    def payment_method(self, name):
+        method = self.get_by_key(PaymentMethod, name)
+        if method is None or not method.is_active:
+            return None
+        return method
+
+    def invalidate(self, model=None):
+        with self._lock:
+            if model is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(model, None)
+
+    def _table(self, model):
+        self._check_versions()
+        table = self._tables.get(model)
+        if table is None:
+            table = self._load(model)
+        return table
+
+    def _check_versions(self):
+        now = time.monotonic()
+        if now - self._checked_at < settings.REFERENCE_CACHE_CHECK_INTERVAL:
+            return
+
+        versions = get_versions(self.models)
+        with self._lock:
+            for model, table in list(self._tables.items()):
+                if table['version'] != versions[table_label(model)][0]:
+                    del self._tables[model]
+            self._checked_at = now
+
+    def _load(self, model):
+        # The version is read before the rows so a concurrent write can only
+        # cause one extra reload, never a stale table under a fresh version.
+        version = get_versions([model])[table_label(model)][0]
+        # From the primary: rows read from a lagging replica would be kept
+        # under the new version until the next write.
+        with primary():
+            rows = list(model.objects.all())
+        natural_key = NATURAL_KEYS[model]
+
+        by_key = {}
+        for row in sorted(rows, key=lambda row: not getattr(row, 'is_active', True)):
+            by_key.setdefault(natural_key(row), row)
+
+        table = {
+            'version': version,
+            'by_id': {row.pk: row for row in rows},
+            'by_key': by_key,
+        }
+        with self._lock:
+            self._tables[model] = table
+        return table
+
+
+reference_cache = ReferenceDataCache(NATURAL_KEYS)
+
+
+def drop_purged_table(sender, **kwargs):
+    reference_cache.invalidate(sender)
+
+
+purge_requested.connect(drop_purged_table, dispatch_uid='reference-cache-purge')
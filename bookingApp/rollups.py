@@ -0,0 +1,182 @@
+"""
+Revenue and occupancy rollups.
+
+``DailyRouteStats`` (travel date x route x service type) and
+``TripOccupancy`` (one row per trip) are kept current incrementally: changes
+to bookings and payments queue the affected trips, and after the transaction
+commits only the rollup rows of those trips' route-days and of the trips
+themselves are recomputed from the raw tables. Recomputing keys rather than
+applying deltas keeps the rollups exact through status changes, refunds and
+deletions.
+
+Bulk operations that bypass model signals must call ``trips_changed``
+themselves. ``rebuild`` recomputes whole date ranges and backs the
+backfill_rollups command.
+"""
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Trip, DailyRouteStats, TripOccupancy
+
+
+logger = logging.getLogger(__name__)
+
+KEY_BATCH_SIZE = 500
+
+NOT_CANCELLED = ~Q(status=Booking.CANCELLED)
+
+
+def _day_rows(bookings):
+    """
+    Aggregate ``bookings`` into DailyRouteStats rows.
+    """
+    rows = (
+        bookings.filter(is_deleted=False)
+        .values('trip__date', 'trip__route_id', 'service_type')
+        .annotate(
+            booking_count=Count('id', filter=NOT_CANCELLED),
+            cancelled_count=Count('id', filter=Q(status=Booking.CANCELLED)),
+            seat_count=Coalesce(Sum('seats', filter=NOT_CANCELLED), 0),
+            received=Sum('payment__amount', filter=Q(payment__is_refunded=False)),
+            refunds=Sum('payment__amount', filter=Q(payment__is_refunded=True)),
+        )
+        .order_by()
+    )
+    return [
+        DailyRouteStats(
+            date=row['trip__date'],
+            route_id=row['trip__route_id'],
+            service_type=row['service_type'],
+            bookings=row['booking_count'],
+            cancelled_bookings=row['cancelled_count'],
+            seats=row['seat_count'],
+            revenue=row['received'] or Decimal('0'),
+            refunded=row['refunds'] or Decimal('0'),
+        )
+        for row in rows
+        if row['trip__date'] is not None
+    ]
+
+
+def _occupancy_rows(trips):
+    rows = (
+        trips.annotate(
+            booked=Coalesce(Sum('booking__seats', filter=Q(booking__is_deleted=False) & ~Q(booking__status=Booking.CANCELLED)), 0),
+            received=Sum('booking__payment__amount', filter=Q(booking__is_deleted=False, booking__payment__is_refunded=False)),
+            capacity=Coalesce(F('available_seats'), F('bus__bus_type__capacity')),
+        )
+        .values('pk', 'route_id', 'date', 'capacity', 'booked', 'received')
+        .order_by()
+    )
+    occupancy = []
+    for row in rows:
+        capacity = row['capacity'] or 0
+        load_factor = Decimal(row['booked']) / capacity if capacity else Decimal('0')
+        occupancy.append(TripOccupancy(
+            trip_id=row['pk'],
+            route_id=row['route_id'],
+            date=row['date'],
+            capacity=capacity,
+            booked_seats=row['booked'],
+            load_factor=min(load_factor, Decimal('9.9999')).quantize(Decimal('0.0001')),
+            revenue=row['received'] or Decimal('0'),
+        ))
+    return occupancy
+
+
+def _save_occupancy(rows):
+    TripOccupancy.objects.bulk_create(
+        rows, batch_size=KEY_BATCH_SIZE, update_conflicts=True, unique_fields=['trip'],
+        update_fields=['route', 'date', 'capacity', 'booked_seats', 'load_factor', 'revenue', 'updated_at'],
+    )
+
+
+def refresh_days(keys):
+    """
+    Recompute the daily rows of the ``(route_id, date)`` pairs in ``keys``.
+    """
+    keys = [key for key in set(keys) if key[1] is not None]
+    for start in range(0, len(keys), KEY_BATCH_SIZE):
+        batch = keys[start:start + KEY_BATCH_SIZE]
+        key_filter = reduce(or_, (Q(route_id=route_id, date=date) for route_id, date in batch))
+        trip_filter = reduce(or_, (Q(trip__route_id=route_id, trip__date=date) for route_id, date in batch))
+        with transaction.atomic():
+            DailyRouteStats.objects.filter(key_filter).delete()
+            DailyRouteStats.objects.bulk_create(_day_rows(Booking.objects.filter(trip_filter)), batch_size=KEY_BATCH_SIZE)
+
+
+def refresh_trips(trip_ids, keys=()):
+    """
+    Recompute the occupancy of ``trip_ids`` and the daily rows of their
+    route-days, plus those of the extra ``(route_id, date)`` ``keys``.
+    """
+    trip_ids = list(trip_ids)
+    keys = set(keys)
+    for start in range(0, len(trip_ids), KEY_BATCH_SIZE):
+        batch = trip_ids[start:start + KEY_BATCH_SIZE]
+        keys.update(Trip.objects.filter(pk__in=batch).values_list('route_id', 'date'))
+        _save_occupancy(_occupancy_rows(Trip.objects.filter(pk__in=batch)))
+    refresh_days(keys)
+
+
+def rebuild(start_date, end_date):
+    """
+    Recompute every rollup row for travel dates between ``start_date`` and
+    ``end_date`` inclusive. Returns the number of daily rows and trips written.
+    """
+    with transaction.atomic():
+        DailyRouteStats.objects.filter(date__range=(start_date, end_date)).delete()
+        days = DailyRouteStats.objects.bulk_create(
+            _day_rows(Booking.objects.filter(trip__date__range=(start_date, end_date))), batch_size=KEY_BATCH_SIZE
+        )
+        trips = _occupancy_rows(Trip.objects.filter(date__range=(start_date, end_date)))
+        _save_occupancy(trips)
+    return len(days), len(trips)
+
+
+def date_chunks(start_date, end_date, days):
+    while start_date <= end_date:
+        chunk_end = min(end_date, start_date + timedelta(days=days - 1))
+        yield start_date, chunk_end
+        start_date = chunk_end + timedelta(days=1)
+
+
+_pending = threading.local()
+
+
+def trips_changed(*trip_ids, booking_ids=(), keys=()):
+    """
+    Refresh the rollups of ``trip_ids``, of the trips of ``booking_ids`` and
+    of the ``(route_id, date)`` ``keys`` once the current transaction commits.
+    Pass the old key of a trip that was deleted or moved to another day.
+    """
+    if not hasattr(_pending, 'trip_ids'):
+        _pending.trip_ids, _pending.booking_ids, _pending.keys = set(), set(), set()
+    _pending.trip_ids.update(trip_ids)
+    _pending.booking_ids.update(booking_ids)
+    _pending.keys.update(keys)
+    transaction.on_commit(flush_pending)
+
+
+def flush_pending():
+    if not hasattr(_pending, 'trip_ids'):
+        return
+    trip_ids, booking_ids, keys = _pending.trip_ids, _pending.booking_ids, _pending.keys
+    if not (trip_ids or booking_ids or keys):
+        return
+    _pending.trip_ids, _pending.booking_ids, _pending.keys = set(), set(), set()
+    try:
+        if booking_ids:
+            trip_ids |= set(Booking.objects.filter(pk__in=booking_ids).values_list('trip_id', flat=True))
+        refresh_trips(trip_ids, keys)
+    except Exception:
+        # backfill_rollups repairs anything missed here.
+        logger.exception(f"Could not refresh rollups for trips {sorted(trip_ids)}")
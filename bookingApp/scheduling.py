@@ -0,0 +1,204 @@
+"""
+Fleet scheduling checks.
+
+A bus can only run one trip at a time. Trips occupy ``[departure_at,
+arrival_at)``, padded to ``MINIMUM_TRIP_DURATION``. Timetables saved before
+these checks existed, or edited straight in the database, may already hold
+overlapping trips, so a candidate interval is compared with every trip it
+could overlap rather than only with its neighbours: a range query on the
+Trip(bus, departure_at) index, or a bisect bounding the scan in memory.
+
+``validate_assignment`` checks one trip against the database.
+``FleetSchedule`` loads the timetables of a time window once and checks and
+records many trips in memory, for bulk timetable generation.
+"""
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from .models import Bus, Trip
+
+
+OPERATIONAL = 'operational'
+
+# Trips without an arrival time still hold their bus for this long.
+MINIMUM_TRIP_DURATION = timedelta(minutes=1)
+
+
+class ScheduleConflict(Exception):
+    """
+    Raised when a bus cannot take a trip. ``trip_id`` is the trip it is
+    already assigned to, if that is the reason.
+    """
+
+    def __init__(self, message, trip_id=None):
+        super().__init__(message)
+        self.message = message
+        self.trip_id = trip_id
+
+
+def interval(departure_at, arrival_at):
+    return departure_at, max(arrival_at or departure_at, departure_at + MINIMUM_TRIP_DURATION)
+
+
+def check_bus(bus):
+    if not bus.is_active or bus.maintenance_status != OPERATIONAL:
+        raise ScheduleConflict(
+            _("Bus %(bus)s is not operational (%(status)s).") % {'bus': bus.registration_number, 'status': bus.get_maintenance_status_display()}
+        )
+
+
+def conflict_message(bus, trip_id):
+    return _("Bus %(bus)s is already assigned to trip %(trip)s at that time.") % {'bus': bus.registration_number, 'trip': trip_id}
+
+
+def validate_assignment(bus, departure_at, arrival_at, exclude=None):
+    """
+    Raise ScheduleConflict unless ``bus`` is operational and free between
+    ``departure_at`` and ``arrival_at``. ``exclude`` is the id of the trip
+    being updated.
+    """
+    check_bus(bus)
+    if departure_at is None:
+        return
+    start, end = interval(departure_at, arrival_at)
+
+    # A trip's padded end is past ``start`` if its arrival is, or if it
+    # departed less than MINIMUM_TRIP_DURATION before ``start``.
+    overlapping = Trip.objects.filter(
+        Q(arrival_at__gt=start) | Q(departure_at__gt=start - MINIMUM_TRIP_DURATION),
+        bus=bus, is_active=True, departure_at__lt=end,
+    )
+    if exclude is not None:
+        overlapping = overlapping.exclude(pk=exclude)
+    trip_id = overlapping.order_by('departure_at', 'pk').values_list('pk', flat=True).first()
+    if trip_id is not None:
+        raise ScheduleConflict(conflict_message(bus, trip_id), trip_id)
+
+
+class BusSchedule:
+    """
+    Intervals of one bus, sorted by start.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.trip_ids = []
+
+    def conflict(self, start, end, exclude=None):
+        """
+        Return the id of the earliest trip overlapping ``[start, end)``, or
+        None.
+        """
+        for index in range(bisect_left(self.starts, end)):
+            if self.ends[index] > start and self.trip_ids[index] != exclude:
+                return self.trip_ids[index]
+        return None
+
+    def add(self, start, end, trip_id):
+        position = bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.trip_ids.insert(position, trip_id)
+
+    def remove(self, trip_id):
+        if trip_id in self.trip_ids:
+            index = self.trip_ids.index(trip_id)
+            del self.starts[index], self.ends[index], self.trip_ids[index]
+
+    def prune(self, before):
+        """
+        Forget intervals that ended before ``before``.
+        """
+        keep = [index for index, end in enumerate(self.ends) if end > before]
+        self.starts = [self.starts[index] for index in keep]
+        self.ends = [self.ends[index] for index in keep]
+        self.trip_ids = [self.trip_ids[index] for index in keep]
+
+
+class FleetSchedule:
+    """
+    Timetables of a set of buses, loaded with one query, for checking many
+    assignments in memory.
+    """
+
+    def __init__(self, buses):
+        self.buses = {bus.pk: bus for bus in buses}
+        self.schedules = {bus_id: BusSchedule() for bus_id in self.buses}
+
+    @classmethod
+    def load(cls, buses, start, end):
+        """
+        Load the active trips of ``buses`` overlapping ``[start, end)``.
+        """
+        fleet = cls(buses)
+        trips = (
+            Trip.objects.filter(bus_id__in=fleet.buses, is_active=True, departure_at__lt=end)
+            .filter(departure_at__gte=start - timedelta(days=2))
+            .values_list('pk', 'bus_id', 'departure_at', 'arrival_at')
+        )
+        for trip_id, bus_id, departure_at, arrival_at in trips:
+            trip_start, trip_end = interval(departure_at, arrival_at)
+            if trip_end > start:
+                fleet.schedules[bus_id].add(trip_start, trip_end, trip_id)
+        return fleet
+
+    def conflict(self, bus_id, departure_at, arrival_at, exclude=None):
+        """
+        Return why ``bus_id`` cannot take the interval (a ScheduleConflict),
+        or None when it is free.
+        """
+        bus = self.buses.get(bus_id)
+        if bus is None:
+            return ScheduleConflict(_("Unknown bus %(bus)s.") % {'bus': bus_id})
+        try:
+            check_bus(bus)
+        except ScheduleConflict as error:
+            return error
+        if departure_at is None:
+            return None
+        trip_id = self.schedules[bus_id].conflict(*interval(departure_at, arrival_at), exclude=exclude)
+        if trip_id is not None:
+            return ScheduleConflict(conflict_message(bus, trip_id), trip_id)
+        return None
+
+    def assign(self, bus_id, departure_at, arrival_at, trip_id=None):
+        """
+        Record an assignment checked with ``conflict``. Unsaved trips may pass
+        any placeholder as ``trip_id``.
+        """
+        schedule = self.schedules[bus_id]
+        if trip_id is not None:
+            schedule.remove(trip_id)
+        if departure_at is not None:
+            schedule.add(*interval(departure_at, arrival_at), trip_id)
+
+    def prune(self, before):
+        for schedule in self.schedules.values():
+            schedule.prune(before)
+
+
+def find_conflicts(trips):
+    """
+    Yield ``(trip, other_trip_id)`` overlaps from ``(pk, bus_id, departure_at,
+    arrival_at)`` rows ordered by bus and departure, in one pass.
+    """
+    current_bus = None
+    latest_end = latest_trip = None
+    for trip in trips:
+        trip_id, bus_id, departure_at, arrival_at = trip
+        start, end = interval(departure_at, arrival_at)
+        if bus_id != current_bus:
+            current_bus, latest_end, latest_trip = bus_id, end, trip_id
+            continue
+        if start < latest_end:
+            yield trip, latest_trip
+        if end > latest_end:
+            latest_end, latest_trip = end, trip_id
+
+
+def non_operational_buses():
+    return Bus.objects.exclude(is_active=True, maintenance_status=OPERATIONAL)
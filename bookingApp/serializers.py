@@ -1,6 +1,6 @@
 from rest_framework.serializers import ModelSerializer
 
-from .models import Trip, Route, Booking, City, Region, Bus, CustomerInfo, BusType, Payment, PaymentMethod
+from .models import Trip, Route, Booking, City, Region, Bus, CustomerInfo, BusType, Payment, PaymentMethod, trip_datetimes
 from core.serializers import LoginSerializer
 from rest_framework.fields import IntegerField, SerializerMethodField, JSONField, CharField, DecimalField
 from rest_framework import serializers
@@ -8,7 +8,10 @@ import uuid
 from django.db import transaction
 from django.utils.text import slugify
 from django.utils.crypto import get_random_string
-from utils.helpers import send_sms
+from utils.tasks import deliver_sms, enqueue
+from .reference_cache import reference_cache
+from .scheduling import ScheduleConflict, validate_assignment
+from .disruptions import CANCEL, MOVE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -93,6 +96,72 @@ class TripWriteSerializer(ModelSerializer):
         model = Trip
         fields = '__all__'
 
+    def check_schedule(self, validated_data):
+        """
+        Reject the trip if its bus is out of service or already on another
+        trip at the same time. The bus row is locked so concurrent
+        assignments of the same bus are checked one after the other.
+        """
+        def value(field, default=None):
+            return validated_data.get(field, getattr(self.instance, field, default))
+
+        if not value('is_active', True):
+            return
+        bus = Bus.objects.select_for_update().get(pk=value('bus').pk)
+        departure_at, arrival_at = trip_datetimes(value('date'), value('departure_time'), value('arrival_time'))
+        try:
+            validate_assignment(bus, departure_at, arrival_at, exclude=getattr(self.instance, 'pk', None))
+        except ScheduleConflict as error:
+            raise serializers.ValidationError({'bus': [error.message]})
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.check_schedule(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.check_schedule(validated_data)
+            return super().update(instance, validated_data)
+
+
+class TripBatchItemSerializer(ModelSerializer):
+    """
+    One trip of a bulk write. Routes and buses are plain ids here and are
+    looked up for the whole batch at once by bookingApp.timetable.
+    """
+    id = IntegerField(required=False)
+    route = IntegerField()
+    bus = IntegerField()
+
+    class Meta:
+        model = Trip
+        fields = '__all__'
+
+
+class TripDisruptionSerializer(serializers.Serializer):
+    route = IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    trips = serializers.ListField(child=IntegerField(), required=False)
+    action = serializers.ChoiceField(choices=[CANCEL, MOVE])
+    move_to_date = serializers.DateField(required=False)
+    delay_minutes = IntegerField(required=False, default=0)
+    reason = CharField(required=False, allow_blank=True, default='', max_length=160)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if attrs.get('route') is None and not attrs.get('trips'):
+            raise serializers.ValidationError("Give a route (usually with a date) or a list of trips.")
+        if attrs['action'] == MOVE and attrs.get('move_to_date') is None and not attrs['delay_minutes']:
+            raise serializers.ValidationError("Moving trips needs a move_to_date or delay_minutes.")
+        return attrs
+
+
+class BoardingScanSerializer(serializers.Serializer):
+    booking = IntegerField()
+    seats = IntegerField(min_value=1)
+    scanned_at = serializers.DateTimeField()
+    device_id = CharField(max_length=64)
 
 
 class BookingFetchSerializer(ModelSerializer):
@@ -204,11 +273,12 @@ class BookingPaymentCreationSerializer(serializers.Serializer):
 
             payment = Payment.objects.create(booking=booking, **payment_data)
 
-            message = f"Hello { customer_info.username } reservation aller simple No: {booking.id}, { booking.trip.route.origin.abbr }-{ booking.trip.route.destination.abbr } sur { booking.trip.date } { booking.trip.departure_time }. Presentez vous 30 minutes avant le depart. Merci"
-            sms_sent = send_sms(customer_info.phone_number, message)
-            print(sms_sent)
-            if not sms_sent:
-                logger.warning(f"Failed to send confirmation SMS for booking {booking.id}")
+            route = reference_cache.route(booking.trip.route_id) or booking.trip.route
+            origin = reference_cache.city(route.origin_id) or route.origin
+            destination = reference_cache.city(route.destination_id) or route.destination
+
+            message = f"Hello { customer_info.username } reservation aller simple No: {booking.id}, { origin.abbr }-{ destination.abbr } sur { booking.trip.date } { booking.trip.departure_time }. Presentez vous 30 minutes avant le depart. Merci"
+            enqueue(deliver_sms, customer_info.phone_number, message)
 
 
         return {
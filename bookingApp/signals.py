@@ -0,0 +1,92 @@
+from django.db.models.signals import post_save, post_delete
+
+from utils.metrics import BOOKINGS, BOOKED_SEATS, PAYMENTS
+from .availability import seats_changed
+from .departures import trip_changed
+from .reference_cache import reference_cache
+from .models import Region, City, BusType, Route, PaymentMethod, Trip, Booking, Payment
+from .rollups import trips_changed
+from .versioning import mark_changed
+
+
+REFERENCE_MODELS = (Region, City, BusType, Route, PaymentMethod)
+
+
+def reference_data_changed(sender, **kwargs):
+    mark_changed(sender)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(reference_data_changed, sender=model, dispatch_uid=f'refdata-save-{model._meta.model_name}')
+    post_delete.connect(reference_data_changed, sender=model, dispatch_uid=f'refdata-delete-{model._meta.model_name}')
+
+
+def booking_created(sender, instance, created, **kwargs):
+    if created:
+        BOOKINGS.labels(instance.service_type).inc()
+        BOOKED_SEATS.labels(instance.service_type).inc(instance.seats)
+
+
+def payment_created(sender, instance, created, **kwargs):
+    if created:
+        PAYMENTS.labels(instance.provider).inc()
+
+
+post_save.connect(booking_created, sender=Booking, dispatch_uid='metrics-booking-created')
+post_save.connect(payment_created, sender=Payment, dispatch_uid='metrics-payment-created')
+
+
+def booking_seats_changed(sender, instance, **kwargs):
+    seats_changed(instance.trip_id)
+
+
+def trip_seats_changed(sender, instance, **kwargs):
+    seats_changed(instance.pk)
+
+
+post_save.connect(booking_seats_changed, sender=Booking, dispatch_uid='seats-booking-save')
+post_delete.connect(booking_seats_changed, sender=Booking, dispatch_uid='seats-booking-delete')
+post_save.connect(trip_seats_changed, sender=Trip, dispatch_uid='seats-trip-save')
+post_delete.connect(trip_seats_changed, sender=Trip, dispatch_uid='seats-trip-delete')
+
+
+def booking_rollups_changed(sender, instance, **kwargs):
+    trips_changed(instance.trip_id)
+
+
+def payment_rollups_changed(sender, instance, **kwargs):
+    if instance.booking_id:
+        trips_changed(booking_ids=[instance.booking_id])
+
+
+def trip_rollups_changed(sender, instance, **kwargs):
+    moved_from = instance.moved_from()
+    trips_changed(instance.pk, keys=[moved_from] if moved_from else ())
+
+
+def trip_rollups_deleted(sender, instance, **kwargs):
+    trips_changed(keys=[(instance.route_id, instance.date)])
+
+
+post_save.connect(booking_rollups_changed, sender=Booking, dispatch_uid='rollups-booking-save')
+post_delete.connect(booking_rollups_changed, sender=Booking, dispatch_uid='rollups-booking-delete')
+post_save.connect(payment_rollups_changed, sender=Payment, dispatch_uid='rollups-payment-save')
+post_delete.connect(payment_rollups_changed, sender=Payment, dispatch_uid='rollups-payment-delete')
+post_save.connect(trip_rollups_changed, sender=Trip, dispatch_uid='rollups-trip-save')
+post_delete.connect(trip_rollups_deleted, sender=Trip, dispatch_uid='rollups-trip-delete')
+
+
+def route_origin(route_id):
+    route = reference_cache.route(route_id) or Route.objects.filter(pk=route_id).first()
+    return route.origin_id if route else None
+
+
+def trip_departures_changed(sender, instance, **kwargs):
+    trip_changed(instance.pk, route_origin(instance.route_id))
+    moved_from = instance.moved_from()
+    if moved_from and moved_from[0] != instance.route_id:
+        trip_changed(instance.pk, route_origin(moved_from[0]))
+
+
+post_save.connect(trip_departures_changed, sender=Trip, dispatch_uid='departures-trip-save')
+post_delete.connect(trip_departures_changed, sender=Trip, dispatch_uid='departures-trip-delete')
@@ -0,0 +1,101 @@
+"""
+Background tasks of the booking app.
+
+Queues (CELERY_TASK_ROUTES): passenger SMS go to ``notifications``, refund
+follow-up to ``payments`` and the nightly rollup rebuild and bus schedule
+audit to ``reports``. The periodic ones are scheduled by CELERY_BEAT_SCHEDULE.
+"""
+import io
+import json
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from utils.tasks import deliver_sms
+from .departures import local_today
+from .models import Booking, Payment
+from .rollups import rebuild
+
+
+logger = logging.getLogger(__name__)
+
+# Recipients per SMS gateway call.
+NOTIFY_CHUNK_SIZE = 200
+
+
+@shared_task
+def notify_passengers(booking_ids, message):
+    """
+    Send ``message`` to the customers of ``booking_ids``, ``NOTIFY_CHUNK_SIZE``
+    numbers per deliver_sms task, so a failing chunk is retried on its own.
+    """
+    phones = (
+        Booking.objects.filter(pk__in=booking_ids, customer_info__isnull=False)
+        .values_list('customer_info__phone_number', flat=True)
+        .distinct()
+        .order_by()
+    )
+    chunk = []
+    chunks = 0
+    for phone in phones.iterator(chunk_size=NOTIFY_CHUNK_SIZE):
+        chunk.append(phone)
+        if len(chunk) == NOTIFY_CHUNK_SIZE:
+            deliver_sms.delay(','.join(chunk), message)
+            chunk = []
+            chunks += 1
+    if chunk:
+        deliver_sms.delay(','.join(chunk), message)
+        chunks += 1
+    return chunks
+
+
+@shared_task
+def rebuild_recent_rollups(days=2):
+    """
+    Rebuild the rollups of the last ``days`` travel days, catching anything
+    the incremental refreshes missed.
+    """
+    today = local_today()
+    return rebuild(today - timedelta(days=days - 1), today)
+
+
+@shared_task
+def audit_bus_schedule(days=14):
+    """
+    Run audit_bus_schedule over the coming ``days`` and log what it finds.
+    """
+    today = local_today()
+    output = io.StringIO()
+    call_command(
+        'audit_bus_schedule', '--json', stdout=output,
+        start_date=today, end_date=today + timedelta(days=days - 1),
+    )
+    report = json.loads(output.getvalue())
+    if report['overlap_count'] or report['out_of_service']:
+        logger.warning(
+            f"Bus schedule audit: {report['overlap_count']} overlapping assignments, "
+            f"{len(report['out_of_service'])} upcoming trips on buses out of service"
+        )
+    return {'overlap_count': report['overlap_count'], 'out_of_service': len(report['out_of_service'])}
+
+
+@shared_task
+def flag_overdue_refunds():
+    """
+    Log the refunds requested more than REFUND_OVERDUE_HOURS ago and still
+    not made, so they are followed up with the payment providers.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.REFUND_OVERDUE_HOURS)
+    overdue = Payment.objects.filter(is_refunded=False, refund_requested_at__lt=cutoff)
+    by_provider = {
+        row['provider']: {'payments': row['payments'], 'amount': str(row['amount'])}
+        for row in overdue.values('provider').annotate(payments=Count('pk'), amount=Sum('amount')).order_by()
+    }
+    if by_provider:
+        logger.warning(f"Overdue refunds: {by_provider}")
+    return by_provider
@@ -1,3 +1,732 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import jwt
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import User
+
+from FavourExpressAPI.celery import app as celery_app
+
+from utils.testing import QueryBudgetTestMixin
+from .models import Region, City, BusType, Bus, Route, Trip, CustomerInfo, Booking, Payment, PaymentMethod, BoardingEvent, DailyRouteStats, trip_time_zone
+from .disruptions import CANCEL, MOVE, DisruptionError, disrupt_trips, select_trips
+from .scheduling import FleetSchedule, ScheduleConflict, validate_assignment
+from .availability import LocalBroker, broker, get_snapshot, snapshot_key
+from .manifests import manifests
+from .tickets import signing_key, verify_ticket
+from .tasks import flag_overdue_refunds, notify_passengers
+from .rollups import rebuild
+from .departures import local_today, next_departures
+from .loaders import load_locations
+from .reference_cache import reference_cache
+from .versioning import VERSION_KEY, table_label
+
+
+class BookingFixturesMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name="Centre")
+        cls.yaounde = City.objects.create(name="Yaoundé", region=region, abbr="yde")
+        cls.douala = City.objects.create(name="Douala", region=region, abbr="dla")
+        cls.route = Route.objects.create(origin=cls.yaounde, destination=cls.douala, base_price=5000, vip_price=8000)
+        Route.objects.create(origin=cls.douala, destination=cls.yaounde, base_price=5000, vip_price=8000)
+
+        bus_type = BusType.objects.create(name="Standard", capacity=70)
+        cls.bus = Bus.objects.create(bus_type=bus_type, registration_number="CE-001-AA")
+        cls.trips = [
+            Trip.objects.create(
+                route=cls.route, bus=cls.bus, date=date(2026, 1, 15),
+                departure_time=time(hour, 0), arrival_time=time(hour + 4, 0),
+                time_of_day=Trip.MORNING if hour < 12 else Trip.EVENING,
+            )
+            for hour in (6, 10, 14, 18)
+        ]
+        for index, trip in enumerate(cls.trips):
+            customer = CustomerInfo.objects.create(identification=f"ID{index}", phone_number="+237600000000", username=f"customer{index}")
+            Booking.objects.create(customer_info=customer, trip=trip, seats=2, slug=f"booking-{index}")
+
+        PaymentMethod.objects.create(name="mtn", client_id="id", client_secret="secret")
+
+
+class QueryBudgetTests(BookingFixturesMixin, QueryBudgetTestMixin, TestCase):
+
+    def test_trip_listing(self):
+        self.assertWithinQueryBudget('get', '/api/v1/trips/')
+
+    def test_trip_filter(self):
+        self.assertWithinQueryBudget(
+            'get', f'/api/v1/trips/filter/?origin={self.yaounde.id}&destination={self.douala.id}&date=2026-01-15'
+        )
+
+    def test_trip_partial_filter(self):
+        self.assertWithinQueryBudget('get', f'/api/v1/trips/filter/partial/?route={self.route.id}')
+
+    def test_available_seats(self):
+        trip = self.trips[0]
+        response = self.assertWithinQueryBudget('get', f'/api/v1/available-seats/?bus_id={self.bus.id}&trip_id={trip.id}')
+        self.assertEqual(response.json()['available_seats'], 68)
+
+    def test_reference_listings(self):
+        for path in ('/api/v1/towns/', '/api/v1/routes/', '/api/v1/payment-methods/'):
+            with self.subTest(path=path):
+                self.assertWithinQueryBudget('get', path)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'PAGE_SIZE': 1})
+    def test_reference_listings_are_paginated(self):
+        first = self.client.get('/api/v1/towns/').json()
+        self.assertEqual((first['count'], first['previous'], len(first['results'])), (2, None, 1))
+        self.assertTrue(first['next'].endswith('/api/v1/towns/?page=2'))
+        second = self.client.get(first['next']).json()
+        self.assertEqual((second['next'], second['previous']), (None, 'http://testserver/api/v1/towns/'))
+        self.assertNotEqual(second['results'], first['results'])
+        self.assertEqual(self.client.get('/api/v1/towns/?page=3').status_code, 404)
+
+    def test_async_views_are_documented(self):
+        paths = self.client.get('/swagger/?format=openapi').json()['paths']
+        self.assertIn('origin', [parameter['name'] for parameter in paths['/api/v1/trips/filter/']['get']['parameters']])
+        self.assertIn('trip_id', [parameter['name'] for parameter in paths['/api/v1/available-seats/']['get']['parameters']])
+        self.assertIn('post', paths['/api/v1/towns/'])
+        self.assertEqual([parameter['name'] for parameter in paths['/api/v1/towns/']['get']['parameters']], ['page'])
+        self.assertIn('/api/v1/trips/{id}/seats/stream/', paths)
+
+
+class TripListingTests(BookingFixturesMixin, TestCase):
+
+    def test_ordered_with_live_seats(self):
+        Booking.objects.filter(trip=self.trips[0]).update(status=Booking.CANCELLED)
+        Booking.objects.filter(trip=self.trips[1]).update(is_deleted=True)
+        self.assertTrue(Trip.objects.with_details().ordered)
+        for url in ('/api/v1/trips/', f'/api/v1/trips/filter/partial/?route={self.route.id}'):
+            results = self.client.get(url).json()['results']
+            self.assertEqual([trip['id'] for trip in results], [trip.id for trip in self.trips], url)
+            self.assertEqual([trip['available_seats'] for trip in results], [70, 70, 68, 68], url)
+
+
+@override_settings(SEAT_PUSH_COALESCE_MS=0)
+class SeatAvailabilityTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_counts_live_bookings(self):
+        trip = self.trips[0]
+        customer = CustomerInfo.objects.create(identification="ID9", phone_number="+237600000009", username="customer9")
+        Booking.objects.create(customer_info=customer, trip=trip, seats=3, slug="cancelled", status=Booking.CANCELLED)
+        Booking.objects.create(customer_info=customer, trip=trip, seats=4, slug="deleted", is_deleted=True)
+        snapshot = get_snapshot(trip.id)
+        self.assertEqual((snapshot['booked_seats'], snapshot['available_seats']), (2, 68))
+
+    def test_changes_publish_once_after_commit(self):
+        trip = self.trips[0]
+        customer = CustomerInfo.objects.create(identification="ID9", phone_number="+237600000009", username="customer9")
+        with mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Booking.objects.create(customer_info=customer, trip=trip, seats=1, slug="extra-1")
+                Booking.objects.create(customer_info=customer, trip=trip, seats=1, slug="extra-2")
+                publish.assert_not_called()
+        published = [call.args[1] for call in publish.call_args_list if call.args[0] == trip.id]
+        self.assertEqual([snapshot['available_seats'] for snapshot in published], [66])
+        snapshot = published[0]
+        self.assertEqual(cache.get(snapshot_key(trip.id)), snapshot)
+
+    def test_deleted_trip_drops_snapshot(self):
+        trip = self.trips[0]
+        get_snapshot(trip.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.delete()
+        self.assertIsNone(cache.get(snapshot_key(trip.id)))
+        self.assertIsNone(get_snapshot(trip.id))
+
+    async def test_subscription_coalesces_bursts(self):
+        local = LocalBroker()
+        subscription = local.subscribe(7)
+        self.assertIsNone(await subscription.next(0.01))
+        for available_seats in (5, 4, 3):
+            local.deliver(7, {'available_seats': available_seats})
+        self.assertEqual(await subscription.next(1), {'available_seats': 3})
+        self.assertIsNone(await subscription.next(0.01))
+        local.unsubscribe(subscription)
+        self.assertEqual(local.subscriber_count(), 0)
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(self.client.get(f'/api/v1/trips/{self.trips[0].id}/seats/stream/').status_code, 501)
+
+    async def test_stream(self):
+        trip = self.trips[0]
+        self.assertEqual((await self.async_client.get('/api/v1/trips/0/seats/stream/')).status_code, 404)
+        response = await self.async_client.get(f'/api/v1/trips/{trip.id}/seats/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        first = (await anext(events)).decode()
+        self.assertTrue(first.startswith('retry: 3000\n'))
+        self.assertEqual(json.loads(first.rsplit('data: ', 1)[1])['available_seats'], 68)
+
+        snapshot = await sync_to_async(get_snapshot)(trip.id)
+        broker.deliver(trip.id, {**snapshot, 'available_seats': 65})
+        update = json.loads((await anext(events)).decode().rsplit('data: ', 1)[1])
+        self.assertEqual((update['available_seats'], update['delta']), (65, -3))
+        await events.aclose()
+
+
+class ConditionalListTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        response = self.client.get('/api/v1/towns/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/towns/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_etag_changes_after_committed_write(self):
+        etag = self.client.get('/api/v1/towns/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            City.objects.create(name="Kribi", region=self.yaounde.region, abbr="kbi")
+        response = self.client.get('/api/v1/towns/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_private_listing_varies_on_authorization(self):
+        self.assertEqual(self.client.get('/api/v1/bus-types/').status_code, 401)
+        self.client.force_login(User.objects.create_user(phone='+237699000007', first_name='Fleet', last_name='Desk', password='secret'))
+        response = self.client.get('/api/v1/bus-types/')
+        self.assertEqual(response.status_code, 200)
+        not_modified = self.client.get('/api/v1/bus-types/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        for response in (response, not_modified):
+            self.assertIn('private', response['Cache-Control'])
+            self.assertIn('Authorization', response['Vary'])
+
+
+@override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0, CELERY_LOCAL_THREADS=0)
+class ReferenceCacheTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        self.addCleanup(reference_cache.invalidate)
+
+    def test_invalidated_on_save_and_delete(self):
+        self.assertEqual(reference_cache.city(self.yaounde.id).abbr, "yde")
+        city = City.objects.get(pk=self.yaounde.id)
+        city.abbr = "yao"
+        with self.captureOnCommitCallbacks(execute=True):
+            city.save()
+        self.assertEqual(reference_cache.city(self.yaounde.id).abbr, "yao")
+
+        method = PaymentMethod.objects.get(name="mtn")
+        self.assertEqual(reference_cache.payment_method("mtn"), method)
+        with self.captureOnCommitCallbacks(execute=True):
+            method.delete()
+        self.assertIsNone(reference_cache.payment_method("mtn"))
+
+    def test_version_bumped_by_another_process(self):
+        self.assertEqual(reference_cache.city(self.yaounde.id).abbr, "yde")
+        # Another worker writes and bumps the shared counter; no signal reaches this process.
+        City.objects.filter(pk=self.yaounde.id).update(abbr="yao")
+        self.assertEqual(reference_cache.city(self.yaounde.id).abbr, "yde")
+        cache.incr(VERSION_KEY.format(table_label(City)))
+        self.assertEqual(reference_cache.city(self.yaounde.id).abbr, "yao")
+
+    def test_booking_on_route_missing_from_cache(self):
+        reference_cache.route(self.route.id)
+        # Not committed yet, so the cached routes table does not know it.
+        route = Route.objects.create(origin=self.douala, destination=City.objects.create(name="Kribi", region=self.yaounde.region, abbr="kbi"), base_price=3000, vip_price=6000)
+        self.assertIsNone(reference_cache.route(route.id))
+        trip = Trip.objects.create(route=route, bus=self.bus, date=date(2026, 1, 20), departure_time=time(7, 0), arrival_time=time(10, 0), time_of_day=Trip.MORNING)
+        payload = {
+            'customer_info': {'identification': 'ID-KRIBI', 'phone_number': '+237600000009', 'username': 'kribi'},
+            'booking': {'trip': trip.id, 'seats': 1, 'is_round_trip': False},
+            'payment': {'amount': '3000.00', 'provider': Payment.MTN, 'payer_name': 'Kribi', 'payer_phone': '+237600000009'},
+        }
+        with mock.patch('bookingApp.serializers.enqueue') as enqueue:
+            response = self.client.post('/api/v1/booking-with-payment/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIn("dla-kbi", enqueue.call_args.args[2])
+
+
+class LoaderTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content)
+        return path
+
+    def locations(self, count, abbr='xx'):
+        cities = [{'name': f"Ville {index}", 'abbr': abbr} for index in range(count)]
+        return self.write('locations.json', json.dumps({'regions': [{'name': "Centre", 'cities': cities}, {'name': "Littoral", 'cities': ["Douala"], 'abbr': 'dla'}]}))
+
+    def counts(self, result):
+        return (result.inserted, result.updated, result.unchanged)
+
+    def test_inserted_updated_unchanged(self):
+        regions, cities = load_locations(self.locations(3))
+        self.assertEqual((self.counts(regions), self.counts(cities)), ((2, 0, 0), (4, 0, 0)))
+
+        regions, cities = load_locations(self.locations(3))
+        self.assertEqual((self.counts(regions), self.counts(cities)), ((0, 0, 2), (0, 0, 4)))
+
+        regions, cities = load_locations(self.locations(4, abbr='yy'))
+        self.assertEqual((self.counts(regions), self.counts(cities)), ((0, 0, 2), (1, 3, 1)))
+        self.assertEqual(City.objects.get(slug='ville-0').abbr, 'yy')
+        self.assertEqual(City.objects.get(slug='douala').region.name, "Littoral")
+
+    def test_query_count_independent_of_row_count(self):
+        counts = []
+        for count in (2, 200):
+            City.objects.all().delete()
+            Region.objects.all().delete()
+            with CaptureQueriesContext(connection) as captured:
+                load_locations(self.locations(count), batch_size=1000)
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_command_file_formats(self):
+        files = [
+            self.write('locations.csv', "region,city,abbr\nCentre,Yaoundé,yde\nLittoral,Douala,\n"),
+            self.write('locations.jsonl', '{"region": "Centre", "city": "Yaoundé", "abbr": "yde"}\n\n{"region": "Littoral", "city": "Douala"}\n'),
+            self.write('locations.json', json.dumps({'regions': [{'name': "Centre", 'cities': ["Yaoundé"], 'abbr': 'yde'}, {'name': "Littoral", 'cities': [{'name': "Douala"}]}]})),
+        ]
+        for path in files:
+            City.objects.all().delete()
+            Region.objects.all().delete()
+            output = StringIO()
+            call_command('register_default_locations', file=str(path), stdout=output)
+            self.assertIn("Cities: 2 inserted, 0 updated, 0 unchanged", output.getvalue(), path.suffix)
+            self.assertEqual(
+                sorted(City.objects.values_list('name', 'region__name', 'abbr')),
+                [("Douala", "Littoral", None), ("Yaoundé", "Centre", "yde")],
+                path.suffix,
+            )
+
+    def test_command_reports_bad_files(self):
+        output = StringIO()
+        call_command('register_default_locations', file=str(self.write('broken.json', '{"regions": [')), stdout=output)
+        self.assertIn("Invalid JSON", output.getvalue())
+        call_command('register_default_locations', file=str(self.write('partial.csv', "region,abbr\nCentre,yde\n")), stdout=output)
+        self.assertIn("Missing field 'city'", output.getvalue())
+        self.assertFalse(Region.objects.exists())
+
+
+class BusScheduleTests(BookingFixturesMixin, TestCase):
+
+    def test_overlapping_assignment_rejected(self):
+        trip = self.trips[1]
+        with self.assertRaises(ScheduleConflict) as raised:
+            validate_assignment(self.bus, trip.departure_at + timedelta(hours=1), trip.arrival_at + timedelta(hours=1))
+        # The slot overlaps this trip and the next one; the earliest is reported.
+        self.assertEqual(raised.exception.trip_id, trip.id)
+        # Back-to-back trips and the trip's own slot are free.
+        validate_assignment(self.bus, self.trips[-1].arrival_at, self.trips[-1].arrival_at + timedelta(hours=4))
+        validate_assignment(self.bus, trip.departure_at, trip.arrival_at, exclude=trip.id)
+
+    def test_bus_out_of_service_rejected(self):
+        bus = Bus.objects.create(bus_type=self.bus.bus_type, registration_number="CE-002-AA", maintenance_status='repair')
+        with self.assertRaises(ScheduleConflict):
+            validate_assignment(bus, self.trips[0].departure_at, self.trips[0].arrival_at)
+        fleet = FleetSchedule.load([bus, self.bus], self.trips[0].departure_at, self.trips[-1].arrival_at)
+        self.assertIsNotNone(fleet.conflict(bus.id, self.trips[0].departure_at, self.trips[0].arrival_at))
+
+    def test_fleet_schedule(self):
+        fleet = FleetSchedule.load([self.bus], self.trips[0].departure_at, self.trips[-1].arrival_at)
+        start = self.trips[-1].arrival_at
+        self.assertIsNone(fleet.conflict(self.bus.id, start, start + timedelta(hours=2)))
+        fleet.assign(self.bus.id, start, start + timedelta(hours=2), 'new')
+        self.assertEqual(fleet.conflict(self.bus.id, start + timedelta(hours=1), start + timedelta(hours=3)).trip_id, 'new')
+
+    def test_audit_command(self):
+        trip = self.trips[0]
+        Trip.objects.filter(pk=self.trips[1].pk).update(departure_at=trip.departure_at + timedelta(hours=2))
+        output = StringIO()
+        call_command('audit_bus_schedule', json=True, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['overlap_count'], 1)
+        self.assertEqual((report['overlaps'][0]['trip'], report['overlaps'][0]['overlaps']), (self.trips[1].pk, trip.pk))
+
+    def test_overlap_hidden_behind_later_trips(self):
+        # A trip saved before the checks existed spans the rest of the day.
+        first, last = self.trips[0], self.trips[-1]
+        Trip.objects.filter(pk=first.pk).update(arrival_at=last.arrival_at + timedelta(hours=2))
+        start = last.arrival_at + timedelta(minutes=30)
+        with self.assertRaises(ScheduleConflict) as raised:
+            validate_assignment(self.bus, start, start + timedelta(hours=1))
+        self.assertEqual(raised.exception.trip_id, first.id)
+        fleet = FleetSchedule.load([self.bus], start, start + timedelta(hours=1))
+        self.assertEqual(fleet.conflict(self.bus.id, start, start + timedelta(hours=1)).trip_id, first.id)
+
+
+class TripBulkTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(phone='+237699000001', first_name='Dispatch', last_name='Desk', password='secret'))
+
+    def batch(self, count, start):
+        return [
+            {'route': self.route.id, 'bus': self.bus.id, 'date': (start + timedelta(days=day)).isoformat(),
+             'departure_time': '06:00', 'arrival_time': '10:00', 'time_of_day': Trip.MORNING}
+            for day in range(count)
+        ]
+
+    def test_query_count_independent_of_batch_size(self):
+        counts = []
+        for count, start in ((1, date(2026, 2, 1)), (25, date(2026, 3, 1))):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post('/api/v1/trips/bulk/', self.batch(count, start), content_type='application/json')
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(len(response.json()), count)
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Trip.objects.get(pk=response.json()[-1]['id']).available_seats, 70)
+
+    def test_errors_per_item(self):
+        items = self.batch(3, date(2026, 2, 1))
+        items[1]['route'] = 999999
+        items[2].update(date='2026-01-15', departure_time='07:00', arrival_time='09:00')
+        response = self.client.post('/api/v1/trips/bulk/', items, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('route', errors[1])
+        self.assertIn('bus', errors[2])
+        self.assertEqual(Trip.objects.count(), len(self.trips))
+
+    def test_update(self):
+        trip = self.trips[0]
+        moved = [{'id': trip.id, 'departure_time': '05:00', 'arrival_time': '06:00'}]
+        response = self.client.patch('/api/v1/trips/bulk/', moved, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        trip.refresh_from_db()
+        self.assertEqual(trip.departure_at.astimezone(trip_time_zone()).hour, 5)
+
+        clash = [{'id': trip.id, 'departure_time': '11:00', 'arrival_time': '12:00'}]
+        response = self.client.patch('/api/v1/trips/bulk/', clash, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bus', response.json()['errors'][0])
+
+
+class TripMoveTests(BookingFixturesMixin, TestCase):
+    """
+    Saving a trip on another day or route refreshes what it left as well as
+    where it went.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def seats(self, day):
+        return DailyRouteStats.objects.filter(route=self.route, date=day).aggregate(seats=Sum('seats'))['seats']
+
+    def test_rollups_of_both_days(self):
+        rebuild(date(2026, 1, 15), date(2026, 1, 16))
+        self.assertEqual((self.seats(date(2026, 1, 15)), self.seats(date(2026, 1, 16))), (8, None))
+
+        trip = Trip.objects.get(pk=self.trips[0].pk)
+        trip.date = date(2026, 1, 16)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.save()
+        self.assertEqual((self.seats(date(2026, 1, 15)), self.seats(date(2026, 1, 16))), (6, 2))
+
+    def test_departure_boards_of_both_origins(self):
+        trip = Trip.objects.get(pk=self.trips[0].pk)
+        trip.date = local_today() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.save()
+        self.assertIn(trip.pk, [entry['trip'] for entry in next_departures(self.yaounde.id, 10)])
+        self.assertEqual(next_departures(self.douala.id, 10), [])
+
+        trip = Trip.objects.get(pk=trip.pk)
+        trip.route = Route.objects.get(origin=self.douala)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.save()
+        self.assertEqual(next_departures(self.yaounde.id, 10), [])
+        self.assertEqual([entry['trip'] for entry in next_departures(self.douala.id, 10)], [trip.pk])
+
+
+class StatsTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        rebuild(date(2026, 1, 15), date(2026, 1, 15))
+        self.client.force_login(User.objects.create_user(phone='+237699000006', first_name='Sta', last_name='Tistics', password='secret', is_staff=True))
+
+    def test_occupancy(self):
+        response = self.client.get('/api/v1/stats/occupancy/', {'start': '2026-01-15', 'end': '2026-01-15', 'route': self.route.id, 'limit': 2})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['trips'], 4)
+        self.assertEqual(len(response.json()['trips_by_load_factor']), 2)
+
+    def test_invalid_parameters(self):
+        for params in ({'limit': 'abc'}, {'limit': -1}, {'route': 'abc'}, {'start': '2024-02-30'}, {'end': '15/01/2026'}):
+            response = self.client.get('/api/v1/stats/occupancy/', params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get('/api/v1/stats/daily/', {'route': 'abc'}).status_code, 400)
+
+
+class TripDisruptionTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        booking = Booking.objects.filter(trip=self.trips[0]).first()
+        Payment.objects.create(booking=booking, amount=10000, provider=Payment.MTN, transaction_id='DISRUPT-1', payer_name='a', payer_phone='1')
+
+    def test_dry_run(self):
+        output = StringIO()
+        call_command('disrupt_trips', route=self.route.id, date=date(2026, 1, 15), cancel=True, dry_run=True, json=True, stdout=output)
+        totals = json.loads(output.getvalue())['totals']
+        self.assertEqual((totals['trips'], totals['bookings'], totals['seats'], totals['payments_to_refund']), (4, 4, 8, 1))
+        self.assertEqual(Trip.objects.filter(is_active=True).count(), 4)
+        self.assertFalse(Booking.objects.filter(status=Booking.CANCELLED).exists())
+
+    def test_cancel(self):
+        disrupt_trips(select_trips(self.route.id, date(2026, 1, 15)), CANCEL, reason="Route barree.")
+        self.assertFalse(Trip.objects.filter(is_active=True).exists())
+        self.assertEqual(Booking.objects.filter(status=Booking.CANCELLED).count(), 4)
+        self.assertTrue(Payment.objects.get(transaction_id='DISRUPT-1').refund_requested_at)
+
+    def test_move(self):
+        with self.assertRaises(DisruptionError):
+            disrupt_trips(select_trips(trip_ids=[self.trips[0].id]), MOVE, delay=timedelta(hours=2))
+        report = disrupt_trips(select_trips(self.route.id, date(2026, 1, 15)), MOVE, delay=timedelta(hours=1))
+        self.assertEqual(report['totals']['conflicts'], 0)
+        self.assertEqual(
+            [trip.departure_at for trip in Trip.objects.order_by('departure_at')],
+            [trip.departure_at + timedelta(hours=1) for trip in self.trips],
+        )
+
+
+@skipUnless(celery_app.conf.task_always_eager, "runs the tasks in-process, without CELERY_URL")
+@override_settings(CELERY_LOCAL_THREADS=0, SMS_ENABLED=False)
+class TaskTests(BookingFixturesMixin, TestCase):
+
+    def test_disruption_notifies_after_commit(self):
+        customer = CustomerInfo.objects.create(identification="ID-GONE", phone_number="+237611111111", username="gone")
+        Booking.objects.create(customer_info=customer, trip=self.trips[0], seats=1, slug="cancelled-before", status=Booking.CANCELLED)
+        with mock.patch('bookingApp.tasks.deliver_sms.delay') as deliver:
+            with self.captureOnCommitCallbacks() as callbacks:
+                disrupt_trips(select_trips(trip_ids=[self.trips[0].id]), CANCEL, reason="Route barree.")
+            deliver.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual([call.args[0] for call in deliver.call_args_list], ["+237600000000"])
+        self.assertIn("annule", deliver.call_args.args[1])
+
+    def test_disruption_enqueues_chunks_of_bookings(self):
+        customer = CustomerInfo.objects.create(identification="ID-MANY", phone_number="+237611111112", username="many")
+        for index in range(3):
+            Booking.objects.create(customer_info=customer, trip=self.trips[0], seats=1, slug=f"many-{index}")
+        trip_ids = [self.trips[0].id, self.trips[1].id]
+        with mock.patch('bookingApp.disruptions.NOTIFY_CHUNK_SIZE', 2), mock.patch('bookingApp.disruptions.notify_passengers') as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                disrupt_trips(select_trips(trip_ids=trip_ids), CANCEL)
+        chunks = [call.args[0][0] for call in notify.apply_async.call_args_list]
+        self.assertEqual(sorted(len(chunk) for chunk in chunks), [1, 2, 2])
+        self.assertEqual(sum(len(chunk) for chunk in chunks), Booking.objects.filter(trip_id__in=trip_ids).count())
+
+    def test_notify_passengers_in_chunks(self):
+        booking_ids = list(Booking.objects.values_list('pk', flat=True))
+        for index, booking_id in enumerate(booking_ids):
+            CustomerInfo.objects.filter(booking__pk=booking_id).update(phone_number=f"+2376000000{index:02}")
+        with mock.patch('bookingApp.tasks.NOTIFY_CHUNK_SIZE', 3), mock.patch('bookingApp.tasks.deliver_sms.delay') as deliver:
+            self.assertEqual(notify_passengers(booking_ids, "Test"), 2)
+        self.assertEqual(sorted(len(call.args[0].split(',')) for call in deliver.call_args_list), [1, 3])
+
+    def test_flag_overdue_refunds(self):
+        booking = Booking.objects.filter(trip=self.trips[0]).first()
+        payment = Payment.objects.create(booking=booking, amount=10000, provider=Payment.MTN, transaction_id='REFUND-1', payer_name='a', payer_phone='1')
+        self.assertEqual(flag_overdue_refunds(), {})
+        Payment.objects.filter(pk=payment.pk).update(refund_requested_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(flag_overdue_refunds(), {Payment.MTN: {'payments': 1, 'amount': '10000.00'}})
+
+
+TEST_TICKET_KEY = Ed25519PrivateKey.generate().private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+).decode()
+
+
+@override_settings(TICKET_SIGNING_KEY=TEST_TICKET_KEY)
+class TicketTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        signing_key.cache_clear()
+        self.addCleanup(signing_key.cache_clear)
+        self.customer = User.objects.create_user(phone='+237699000002', first_name='Cus', last_name='Tomer', password='secret')
+        self.booking = Booking.objects.get(slug='booking-0')
+        CustomerInfo.objects.filter(pk=self.booking.customer_info_id).update(user=self.customer)
+        Trip.objects.filter(pk=self.trips[0].pk).update(departure_at=timezone.now() + timedelta(days=1))
+
+    def pay(self, booking):
+        Payment.objects.create(booking=booking, amount=10000, provider=Payment.MTN, transaction_id=f'TICKET-{booking.id}', payer_name='a', payer_phone='1')
+
+    def test_ticket_verifies_offline(self):
+        self.pay(self.booking)
+        self.client.force_login(self.customer)
+        response = self.client.get('/api/v1/bookings/booking-0/ticket/')
+        self.assertEqual(response.status_code, 200)
+        token = response.json()['ticket']
+        claims = verify_ticket(token)
+        self.assertEqual((claims['t'], claims['n'], claims['c']), (self.trips[0].id, 2, 's'))
+
+        key = jwt.algorithms.OKPAlgorithm.from_jwk(self.client.get('/api/v1/tickets/public-key/').json()['jwk'])
+        self.assertEqual(jwt.decode(token, key, algorithms=['EdDSA'])['b'], claims['b'])
+        header, payload, signature = token.split('.')
+        with self.assertRaises(jwt.InvalidTokenError):
+            verify_ticket(f"{header}.{payload}.{signature[::-1]}")
+
+    def test_ticket_is_refused(self):
+        self.assertEqual(self.client.get('/api/v1/bookings/booking-0/ticket/').status_code, 401)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get('/api/v1/bookings/booking-0/ticket/').status_code, 409)
+        self.pay(Booking.objects.get(slug='booking-1'))
+        self.assertEqual(self.client.get('/api/v1/bookings/booking-1/ticket/').status_code, 404)
+
+    def test_manifest_and_boarding_sync(self):
+        trip = self.trips[0]
+        self.pay(self.booking)
+        cancelled = Booking.objects.create(customer_info=self.booking.customer_info, trip=trip, seats=1, slug="cancelled", status=Booking.CANCELLED)
+        unpaid = Booking.objects.create(customer_info=self.booking.customer_info, trip=trip, seats=1, slug="unpaid")
+
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(f'/api/v1/trips/{trip.id}/boarding-manifest/').status_code, 403)
+        self.assertEqual(self.client.post(f'/api/v1/trips/{trip.id}/boardings/', [], content_type='application/json').status_code, 403)
+
+        self.client.force_login(User.objects.create_user(phone='+237699000004', first_name='Con', last_name='Ductor', password='secret', is_staff=True))
+        manifest = self.client.get(f'/api/v1/trips/{trip.id}/boarding-manifest/').json()
+        self.assertEqual(manifest['valid'], [[self.booking.id, 2, 's']])
+        self.assertEqual(manifest['revoked'], [cancelled.id, unpaid.id])
+
+        scans = [
+            {'booking': self.booking.id, 'seats': 2, 'scanned_at': '2026-01-15T05:50:00+01:00', 'device_id': 'bus-1'},
+            {'booking': cancelled.id, 'seats': 1, 'scanned_at': '2026-01-15T05:51:00+01:00', 'device_id': 'bus-1'},
+            {'booking': unpaid.id, 'seats': 1, 'scanned_at': '2026-01-15T05:52:00+01:00', 'device_id': 'bus-1'},
+        ]
+        for attempt in range(2):
+            response = self.client.post(f'/api/v1/trips/{trip.id}/boardings/', scans, content_type='application/json')
+            self.assertEqual(response.json(), {'accepted': 1, 'rejected': [cancelled.id, unpaid.id]})
+        self.assertEqual(BoardingEvent.objects.filter(trip=trip).count(), 1)
+        self.assertEqual(self.client.get(f'/api/v1/trips/{trip.id}/boarding-manifest/').json()['boarded'], [self.booking.id])
+
+
+class ManifestTests(BookingFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.booking = Booking.objects.get(trip=self.trips[0])
+        Booking.objects.filter(pk=self.booking.pk).update(status=Booking.CONFIRMED)
+        Payment.objects.create(booking=self.booking, amount=10000, provider=Payment.MTN, transaction_id='MANIFEST-1', payer_name='a', payer_phone='1')
+        self.client.force_login(User.objects.create_user(phone='+237699000003', first_name='Agent', last_name='Gare', password='secret', is_staff=True))
+
+    def test_one_query_for_many_trips(self):
+        with self.assertNumQueries(1):
+            trip_manifests = list(manifests([trip.id for trip in self.trips]))
+        self.assertEqual([manifest['trip'] for manifest in trip_manifests], [trip.id for trip in self.trips])
+        self.assertEqual(
+            trip_manifests[0]['passengers'], [[self.booking.id, 'customer0', '+237600000000', 'ID0', 2, 'standard', 'paid']]
+        )
+        self.assertEqual(trip_manifests[1]['passengers'], [])
+
+    def test_outputs(self):
+        trips = ','.join(str(trip.id) for trip in self.trips)
+        response = self.client.get(f'/api/v1/trips/manifests/?trips={trips}&output=csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.trips[0].id},yde-dla,'))
+
+        response = self.client.get('/api/v1/trips/manifests/?date=2026-01-15&output=print')
+        self.assertContains(response, 'customer0')
+        self.assertEqual(len(self.client.get('/api/v1/trips/manifests/?date=2026-01-15').json()['trips']), 4)
+
+    def test_customers_cannot_export(self):
+        self.client.force_login(User.objects.create_user(phone='+237699000005', first_name='Cus', last_name='Tomer', password='secret'))
+        self.assertEqual(self.client.get('/api/v1/trips/manifests/?date=2026-01-15&output=csv').status_code, 403)
+
+
+@skipUnless(connection.vendor == 'postgresql', "query plans are checked on PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on the hot lookups against a scaled-down synthetic dataset
+    with sequential scans disabled, so any plan still scanning a table means
+    no index can serve the lookup.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', seed=7, routes=30, days=14, trips_per_day=2, buses=40,
+            customers=300, bookings=3000, batch_size=1000, stdout=StringIO(),
+        )
+        User.objects.create_user(phone='+237699000000', first_name='Plan', last_name='Check', password='secret')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cls.trip = Trip.objects.select_related('route').first()
+        cls.booking = Booking.objects.select_related('customer_info').first()
+
+    def assertNoSeqScan(self, queryset, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIsNone(re.search(rf'Seq Scan on "?{table}"?', plan), f"{table} is scanned sequentially:\n{plan}")
+
+    def test_trip_by_route_and_date(self):
+        self.assertNoSeqScan(Trip.objects.filter(route=self.trip.route, date=self.trip.date), 'bookingApp_trip')
+
+    def test_trip_by_origin_destination_and_date(self):
+        trips = Trip.objects.filter(
+            route__origin__id=self.trip.route.origin_id, route__destination__id=self.trip.route.destination_id, date=self.trip.date
+        )
+        self.assertNoSeqScan(trips, 'bookingApp_trip')
+        self.assertNoSeqScan(trips, 'bookingApp_route')
+
+    def test_trip_by_date_range(self):
+        self.assertNoSeqScan(Trip.objects.filter(date__gte=self.trip.date, date__lte=self.trip.date), 'bookingApp_trip')
+
+    def test_trip_departure_window(self):
+        start = self.trip.departure_at
+        trips = Trip.objects.filter(route=self.trip.route).departing_between(start, start + timedelta(hours=6))
+        self.assertNoSeqScan(trips, 'bookingApp_trip')
+        self.assertNoSeqScan(Trip.objects.departing_between(start, start + timedelta(hours=6)).order_by('departure_at'), 'bookingApp_trip')
+
+    def test_bus_assignment_check(self):
+        trips = Trip.objects.filter(bus=self.trip.bus, is_active=True, departure_at__lt=self.trip.arrival_at).order_by('-departure_at')[:1]
+        self.assertNoSeqScan(trips, 'bookingApp_trip')
+
+    def test_booked_seats_sum(self):
+        bookings = Booking.objects.filter(trip=self.trip, status=Booking.CONFIRMED, is_deleted=False).values('trip').annotate(Sum('seats'))
+        self.assertNoSeqScan(bookings, 'bookingApp_booking')
+
+    def test_customer_by_identification(self):
+        self.assertNoSeqScan(
+            CustomerInfo.objects.filter(identification=self.booking.customer_info.identification), 'bookingApp_customerinfo'
+        )
+
+    def test_payment_by_booking(self):
+        self.assertNoSeqScan(Payment.objects.filter(booking=self.booking), 'bookingApp_payment')
+
+    def test_user_by_phone_and_verification_code(self):
+        self.assertNoSeqScan(User.objects.filter(phone='+237699000000', phone_verification_code='123456'), 'core_user')
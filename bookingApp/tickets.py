@@ -0,0 +1,178 @@
+"""
+Signed boarding tickets.
+
+Each booking yields a compact JWT signed with Ed25519 (``EdDSA``) carrying
+the booking, trip, seats, service type and an expiry, small enough for a QR
+code. Conductor devices download the public key once (``tickets/public-key/``)
+and, before departure, the trip's boarding manifest: the bookings still
+valid, those cancelled since their ticket was issued and those already
+boarded. A scan is then checked entirely offline: the signature and expiry
+against the key, the booking against the manifest. Scans are synced back in
+batches as BoardingEvent rows whenever the device is online.
+
+Only paid bookings get a ticket: confirmed ones or those with a payment
+that has not been refunded (``TICKETED``). Any other booking of the trip is
+listed as revoked.
+
+The private key is ``TICKET_SIGNING_KEY`` (PEM); generate_ticket_key creates
+one. Its ``kid`` travels in every ticket so keys can be rotated.
+"""
+import base64
+import hashlib
+from datetime import timedelta
+from functools import lru_cache
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from .models import Booking, BoardingEvent
+
+
+ALGORITHM = 'EdDSA'
+
+# Service types as stored in tickets, to keep the QR code small.
+SERVICE_CODES = {'vip': 'v', 'standard': 's'}
+
+# Bookings that may board: live and paid.
+TICKETED = (
+    Q(is_deleted=False) & ~Q(status=Booking.CANCELLED)
+    & (Q(status=Booking.CONFIRMED) | Q(payment__isnull=False, payment__is_refunded=False))
+)
+
+
+class TicketRefused(Exception):
+    pass
+
+
+def is_ticketed(booking):
+    """
+    ``TICKETED`` for a loaded booking; its payment should be select_related.
+    """
+    if booking.is_deleted or booking.status == Booking.CANCELLED:
+        return False
+    if booking.status == Booking.CONFIRMED:
+        return True
+    payment = getattr(booking, 'payment', None)
+    return payment is not None and not payment.is_refunded
+
+
+@lru_cache(maxsize=None)
+def signing_key():
+    if not settings.TICKET_SIGNING_KEY:
+        raise ImproperlyConfigured("TICKET_SIGNING_KEY is not set, create one with the generate_ticket_key command.")
+    return serialization.load_pem_private_key(settings.TICKET_SIGNING_KEY.encode(), password=None)
+
+
+def public_key_bytes():
+    return signing_key().public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+
+def key_id():
+    return hashlib.sha256(public_key_bytes()).hexdigest()[:16]
+
+
+def public_key_info():
+    """
+    The verification key as PEM and as a JWK, for devices.
+    """
+    pem = signing_key().public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return {
+        'kid': key_id(),
+        'alg': ALGORITHM,
+        'pem': pem.decode(),
+        'jwk': {
+            'kty': 'OKP',
+            'crv': 'Ed25519',
+            'kid': key_id(),
+            'x': base64.urlsafe_b64encode(public_key_bytes()).rstrip(b'=').decode(),
+        },
+    }
+
+
+def ticket_expiry(trip):
+    departure_at = trip.departure_at or timezone.now()
+    return departure_at + timedelta(hours=settings.TICKET_VALID_HOURS_AFTER_DEPARTURE)
+
+
+def issue_ticket(booking):
+    """
+    The signed ticket of ``booking`` and when it expires. Raises
+    TicketRefused unless the booking is paid and live.
+    """
+    if not is_ticketed(booking):
+        raise TicketRefused("Only paid bookings get a boarding ticket.")
+    expires_at = ticket_expiry(booking.trip)
+    claims = {
+        'b': booking.pk,
+        't': booking.trip_id,
+        'n': booking.seats,
+        'c': SERVICE_CODES.get(booking.service_type, booking.service_type),
+        'exp': int(expires_at.timestamp()),
+    }
+    token = jwt.encode(claims, signing_key(), algorithm=ALGORITHM, headers={'kid': key_id()})
+    return token, expires_at
+
+
+def verify_ticket(token):
+    """
+    The claims of a valid ticket; raises ``jwt.InvalidTokenError`` otherwise.
+    Devices do the same with the public key.
+    """
+    return jwt.decode(token, signing_key().public_key(), algorithms=[ALGORITHM])
+
+
+def boarding_manifest(trip):
+    """
+    What a device needs to validate the scans of ``trip`` offline: valid
+    bookings as ``[booking, seats, service]``, revoked booking ids and the
+    ids of bookings already boarded.
+    """
+    valid, revoked = [], []
+    bookings = (
+        Booking.objects.filter(trip=trip)
+        .annotate(ticketed=ExpressionWrapper(TICKETED, output_field=BooleanField()))
+        .values_list('pk', 'seats', 'service_type', 'ticketed')
+        .order_by('pk')
+    )
+    for booking_id, seats, service_type, ticketed in bookings:
+        if ticketed:
+            valid.append([booking_id, seats, SERVICE_CODES.get(service_type, service_type)])
+        else:
+            revoked.append(booking_id)
+    boarded = BoardingEvent.objects.filter(trip=trip).values_list('booking_id', flat=True).distinct().order_by()
+    return {
+        'trip': trip.pk,
+        'departure_at': trip.departure_at,
+        'kid': key_id(),
+        'generated_at': timezone.now(),
+        'valid': valid,
+        'revoked': revoked,
+        'boarded': sorted(boarded),
+    }
+
+
+def record_boardings(trip, scans):
+    """
+    Store a device's batch of ``scans`` (dicts with ``booking``, ``seats``,
+    ``scanned_at`` and ``device_id``) for ``trip``. Scans of bookings that
+    are not paid, live bookings of the trip are returned as rejected.
+    """
+    live = set(
+        Booking.objects.filter(TICKETED, trip=trip, pk__in={scan['booking'] for scan in scans})
+        .values_list('pk', flat=True)
+    )
+    events, rejected = [], []
+    for scan in scans:
+        if scan['booking'] in live:
+            events.append(BoardingEvent(
+                booking_id=scan['booking'], trip=trip, device_id=scan['device_id'],
+                seats=scan['seats'], scanned_at=scan['scanned_at'],
+            ))
+        else:
+            rejected.append(scan['booking'])
+    BoardingEvent.objects.bulk_create(events, batch_size=500, ignore_conflicts=True)
+    return {'accepted': len(events), 'rejected': rejected}
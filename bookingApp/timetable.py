@@ -0,0 +1,141 @@
+"""
+Bulk timetable writes.
+
+``save_trips`` creates or updates a batch of trips with a fixed number of
+queries whatever the batch size: the trips being updated, the routes and the
+buses are each loaded with one ``in_bulk``, the buses' timetables with one
+more, and the rows are written with ``bulk_create`` or ``bulk_update``. The
+whole batch is checked before anything is written and runs in one
+transaction, so it is saved completely or not at all.
+
+Bulk writes skip the model signals, so the seat snapshots, rollups and
+departure boards of the saved trips are queued here.
+"""
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from .availability import seats_changed
+from .departures import trip_changed
+from .models import Trip, Route, Bus
+from .rollups import trips_changed
+from .scheduling import FleetSchedule
+
+
+# Fields that always change with the date or times.
+DERIVED_FIELDS = {'departure_at', 'arrival_at'}
+
+
+class TripBatchError(Exception):
+    """
+    Raised when any trip of a batch is invalid. ``errors`` has one dict per
+    item, empty for the valid ones.
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def save_trips(items, update=False):
+    """
+    Save ``items``, validated trip dicts with ``route`` and ``bus`` ids (and
+    ``id`` when ``update`` is set), and return the saved trips in order.
+    Raises TripBatchError without writing anything if any item is invalid.
+    """
+    errors = [{} for item in items]
+    with transaction.atomic():
+        existing = {}
+        if update:
+            seen = set()
+            for index, item in enumerate(items):
+                if item.get('id') is None:
+                    errors[index]['id'] = [_("This field is required.")]
+                elif item['id'] in seen:
+                    errors[index]['id'] = [_("Trip %(id)s appears more than once.") % {'id': item['id']}]
+                seen.add(item.get('id'))
+            existing = Trip.objects.select_for_update().in_bulk([item['id'] for item in items if item.get('id') is not None])
+
+        route_ids = {item['route'] for item in items if 'route' in item} | {trip.route_id for trip in existing.values()}
+        bus_ids = {item['bus'] for item in items if 'bus' in item} | {trip.bus_id for trip in existing.values()}
+        routes = Route.objects.in_bulk(route_ids)
+        # Locking the buses serializes concurrent batches that assign them.
+        buses = Bus.objects.select_related('bus_type').select_for_update(of=('self',)).in_bulk(bus_ids)
+
+        # Where the trips being updated were, before the changes below.
+        old_keys = {trip.pk: (trip.route_id, trip.date, routes[trip.route_id].origin_id) for trip in existing.values()}
+        old_buses = {trip.pk: trip.bus_id for trip in existing.values()}
+
+        trips = []
+        for index, item in enumerate(items):
+            trip = existing.get(item.get('id')) if update else Trip()
+            if update and trip is None:
+                errors[index].setdefault('id', [_("Trip %(id)s does not exist.") % {'id': item.get('id')}])
+                trips.append(None)
+                continue
+            fields = {key: value for key, value in item.items() if key not in ('id', 'route', 'bus')}
+            if 'route' in item:
+                if item['route'] in routes:
+                    trip.route_id = item['route']
+                else:
+                    errors[index]['route'] = [_("Route %(id)s does not exist.") % {'id': item['route']}]
+            if 'bus' in item:
+                if item['bus'] in buses:
+                    trip.bus_id = item['bus']
+                else:
+                    errors[index]['bus'] = [_("Bus %(id)s does not exist.") % {'id': item['bus']}]
+            for field, value in fields.items():
+                setattr(trip, field, value)
+            if trip.available_seats is None and trip.bus_id in buses:
+                trip.available_seats = buses[trip.bus_id].bus_type.capacity
+            trip.set_datetimes()
+            trips.append(trip)
+
+        check_schedule(trips, buses, old_buses, errors)
+        if any(errors):
+            raise TripBatchError(errors)
+
+        if update:
+            fields = {key for item in items for key in item if key != 'id'} | DERIVED_FIELDS
+            if 'bus' in fields:
+                fields.add('available_seats')
+            Trip.objects.bulk_update(trips, fields, batch_size=500)
+        else:
+            Trip.objects.bulk_create(trips, batch_size=500)
+
+        trip_ids = [trip.pk for trip in trips]
+        seats_changed(*trip_ids)
+        trips_changed(*trip_ids, keys=[(route_id, date) for route_id, date, origin_id in old_keys.values()])
+        for trip in trips:
+            if trip.pk in old_keys:
+                trip_changed(trip.pk, old_keys[trip.pk][2])
+            trip_changed(trip.pk, routes[trip.route_id].origin_id)
+    return trips
+
+
+def check_schedule(trips, buses, old_buses, errors):
+    """
+    Check the bus assignments of ``trips`` against the stored timetables and
+    against each other, recording conflicts in ``errors``. ``old_buses`` maps
+    the ids of updated trips to the bus they had.
+    """
+    placed = {
+        index for index, trip in enumerate(trips)
+        if trip is not None and trip.is_active and trip.departure_at is not None and 'bus' not in errors[index]
+    }
+    if not placed:
+        return
+    start = min(trips[index].departure_at for index in placed)
+    end = max(trips[index].arrival_at or trips[index].departure_at for index in placed)
+    fleet = FleetSchedule.load(buses.values(), start, end)
+
+    # Trips being updated no longer hold their old slots.
+    for trip_id, bus_id in old_buses.items():
+        fleet.schedules[bus_id].remove(trip_id)
+
+    for index in sorted(placed):
+        trip = trips[index]
+        conflict = fleet.conflict(trip.bus_id, trip.departure_at, trip.arrival_at, exclude=trip.pk)
+        if conflict is not None:
+            errors[index]['bus'] = [conflict.message]
+        else:
+            fleet.assign(trip.bus_id, trip.departure_at, trip.arrival_at, trip.pk or ('new', index))
@@ -2,6 +2,7 @@
 from django.urls import path
 
 from .views import *
+from .async_views import *
 
 
 urlpatterns = [
@@ -9,32 +10,41 @@ urlpatterns = [
     # Trips 
     path('trips/', TripsListCreateView.as_view(), name='trip-list-create'),
     path('trips/<int:pk>/', TripRetrieveUpdateDestroyView.as_view(), name='trip-detail'),
+    path('trips/bulk/', TripBulkView.as_view(), name='trip-bulk'),
+    path('trips/disruptions/', TripDisruptionView.as_view(), name='trip-disruptions'),
+    path('trips/manifests/', TripManifestView.as_view(), name='trip-manifests'),
+    path('trips/<int:pk>/boarding-manifest/', BoardingManifestView.as_view(), name='trip-boarding-manifest'),
+    path('trips/<int:pk>/boardings/', BoardingSyncView.as_view(), name='trip-boardings'),
 
     #trip filter
-    path('trips/filter/', TripFilterView.as_view(), name='trip-filter'),
+    path('trips/filter/', AsyncTripFilterView.as_view(), name='trip-filter'),
     path('trips/filter/partial/', TripPartialFilterView.as_view(), name='trip-filter-partial'),
 
     #Available seats
-    path('available-seats/', AvailableSeatsView.as_view(), name="available-seats"),
+    path('available-seats/', AsyncAvailableSeatsView.as_view(), name="available-seats"),
+    path('trips/<int:pk>/seats/stream/', AsyncSeatStreamView.as_view(), name='trip-seat-stream'),
 
     # Routes
-    path('routes/', RouteListCreateView.as_view(), name='route-list-create'),
+    path('routes/', AsyncRouteListView.as_view(), name='route-list-create'),
     path('routes/<int:pk>/', RouteRetrieveUpdateDestroyView.as_view(), name='route-detail'),
 
     # Booking
     path('bookings/', BookingCreationView.as_view(), name='booking-list-create'),
     path('bookings/<int:pk>/', BookingItemAPIVIEW.as_view(), name='booking-detail'),
+    path('bookings/<slug:slug>/ticket/', BookingTicketView.as_view(), name='booking-ticket'),
+    path('tickets/public-key/', TicketPublicKeyView.as_view(), name='ticket-public-key'),
 
     # Cities
-    path('towns/', CityListCreateView.as_view(), name='town-list-create'),
+    path('towns/', AsyncCityListView.as_view(), name='town-list-create'),
     path('towns/<int:pk>/', CityRetrieveUpdateDestroyView.as_view(), name='town-detail'),
+    path('towns/<int:pk>/departures/', AsyncDeparturesView.as_view(), name='town-departures'),
 
     #Buses
     path('buses/', BusListCreateView.as_view(), name='bus-list-create'),
     path('buses/<int:pk>/', BusRetrieveUpdateDestroyView.as_view(), name='bus-detail'),
 
     #Bus Types
-    path('bus-types/', BusTypeListCreateView.as_view(), name='bus-type-list-create'),
+    path('bus-types/', AsyncBusTypeListView.as_view(), name='bus-type-list-create'),
 
     #Customer Info
     path('customers/', CustomerInfoListCreateView.as_view(), name='customer-info-list-create'),
@@ -45,7 +55,12 @@ urlpatterns = [
     path('payments/initiate/', InitiatePaymentView.as_view(), name='initiate-payment'),
     path('payments/confirm/', ConfirmPaymentView.as_view(), name='confirm-payment'),
     path('payments/<str:transaction_id>/', PaymentDetailView.as_view(), name='payment-detail'),
-    path('payment-methods/', PaymentMethodListView.as_view(), name='payment-method-list'),
+    path('payment-methods/', AsyncPaymentMethodListView.as_view(), name='payment-method-list'),
+
+    # Dashboard statistics
+    path('stats/daily/', DailyStatsView.as_view(), name='stats-daily'),
+    path('stats/routes/', RouteRevenueStatsView.as_view(), name='stats-routes'),
+    path('stats/occupancy/', OccupancyStatsView.as_view(), name='stats-occupancy'),
 
 ] 
 
@@ -0,0 +1,94 @@
+"""
+Per-table version counters for the reference data tables (regions, cities,
+routes, bus types and payment methods).
+
+The counters live in the shared Django cache so every worker agrees on them.
+They are bumped after each committed write and are what the ETags and the
+in-process caches are built from, so nobody has to serialize a table to find
+out whether it changed.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'refdata:version:{}'
+MODIFIED_KEY = 'refdata:modified:{}'
+
+# Sent after a reference table changed, with the ``surrogate_keys`` that
+# should be purged from any CDN or local cache sitting in front of the API.
+purge_requested = Signal()
+
+
+def table_label(model):
+    return model._meta.label_lower
+
+
+def surrogate_key(model):
+    return model._meta.model_name
+
+
+def _initial_version():
+    # Seeded from the clock so an evicted or flushed counter never hands out
+    # an ETag that was already issued for different data.
+    return int(time.time() * 1000)
+
+
+def _seed(label):
+    cache.add(VERSION_KEY.format(label), _initial_version(), timeout=None)
+    cache.add(MODIFIED_KEY.format(label), int(time.time()), timeout=None)
+    version = cache.get(VERSION_KEY.format(label)) or _initial_version()
+    modified = cache.get(MODIFIED_KEY.format(label)) or int(time.time())
+    return version, modified
+
+
+def get_versions(models):
+    """
+    Return ``{label: (version, last_modified_timestamp)}`` for the given models
+    using a single cache round trip.
+    """
+    labels = [table_label(model) for model in models]
+    keys = [VERSION_KEY.format(label) for label in labels] + [MODIFIED_KEY.format(label) for label in labels]
+    found = cache.get_many(keys)
+
+    versions = {}
+    for label in labels:
+        version = found.get(VERSION_KEY.format(label))
+        modified = found.get(MODIFIED_KEY.format(label))
+        if version is None or modified is None:
+            version, modified = _seed(label)
+        versions[label] = (version, modified)
+    return versions
+
+
+def bump_version(model):
+    """
+    Move the table of ``model`` to a new version and ask for its cached
+    representations to be purged.
+    """
+    label = table_label(model)
+    key = VERSION_KEY.format(label)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.incr(key)
+    cache.set(MODIFIED_KEY.format(label), int(time.time()), timeout=None)
+
+    keys = [surrogate_key(model)]
+    logger.info(f"Reference table {label} is now at version {version}, purging {keys}")
+    purge_requested.send(sender=model, surrogate_keys=keys, version=version)
+    return version
+
+
+def mark_changed(model):
+    """
+    Bump the version of ``model`` once the current transaction commits, so
+    readers never pair a new ETag with the old rows.
+    """
+    transaction.on_commit(lambda: bump_version(model))
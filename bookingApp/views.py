@@ -17,9 +17,28 @@ from rest_framework.filters import OrderingFilter
 from django.db.models import Sum
 from django.utils.crypto import get_random_string
 from django_filters.rest_framework import DjangoFilterBackend
+from .mixins import ConditionalListMixin
+from .reference_cache import reference_cache
+from django.http import Http404
+from utils.metrics import track_outbound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import ParseError
+from django.db.models import Avg, Count, F
+from .models import DailyRouteStats, TripOccupancy
+from django.utils.dateparse import parse_date
+from core.utils import Util
+from django.conf import settings
+from .timetable import TripBatchError, save_trips
+from .disruptions import DisruptionError, disrupt_trips, select_trips
+from datetime import timedelta
+from .tickets import TicketRefused, boarding_manifest, issue_ticket, public_key_info, record_boardings
+from .manifests import manifest_trips, manifests, render_csv, render_json, render_print
+from django.http import HttpResponse, StreamingHttpResponse
 
 class TripsListCreateView(generics.ListCreateAPIView):
-    queryset = Trip.objects.all()
+    queryset = Trip.objects.with_details()
+    replica_reads = True
+    query_budget = 2
     # serializer_class = TripsSerializer
 
     def get_serializer_class(self):
@@ -43,33 +62,197 @@ class TripsListCreateView(generics.ListCreateAPIView):
     
 
 class TripRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Trip.objects.all()
-    serializer_class = TripsSerializer
+    queryset = Trip.objects.with_details()
+    query_budget = 1
+
+    def get_serializer_class(self):
+        if self.request.method in ('PUT', 'PATCH'):
+            return TripWriteSerializer
+        return TripsSerializer
+
+
+class TripBulkView(APIView):
+    """
+    Create (POST) or update (PATCH, each item with its ``id``) a list of
+    trips in one transaction. Nothing is saved unless every item is valid;
+    otherwise ``errors`` lists one dict per item, empty for the valid ones.
+    """
+    permission_classes = [IsAuthenticated]
 
+    @swagger_auto_schema(
+        operation_description="Create a list of trips at once",
+        request_body=TripBatchItemSerializer(many=True),
+        responses={201: TripWriteSerializer(many=True)}
+    )
+    def post(self, request):
+        return self.save(request, update=False)
 
-class TripFilterView(APIView):  
     @swagger_auto_schema(
-        operation_description="Get filtered trips based on origin, destination, and date",
+        operation_description="Update a list of trips at once, each identified by its id",
+        request_body=TripBatchItemSerializer(many=True),
+        responses={200: TripWriteSerializer(many=True)}
+    )
+    def patch(self, request):
+        return self.save(request, update=True)
+
+    def save(self, request, update):
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"error": "Send a non-empty list of trips."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.TRIP_BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"Send at most {settings.TRIP_BULK_MAX_ITEMS} trips at once."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = TripBatchItemSerializer(data=request.data, many=True, partial=update)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            trips = save_trips(serializer.validated_data, update=update)
+        except TripBatchError as error:
+            return Response({"errors": error.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            TripWriteSerializer(trips, many=True).data, status=status.HTTP_200_OK if update else status.HTTP_201_CREATED
+        )
+
+
+class TripDisruptionView(APIView):
+    """
+    Cancel or move every trip of a route on a day (or the listed trips) at
+    once. With ``dry_run`` only the trips, bookings and payments that would
+    be affected are reported.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Cancel or move trips in bulk, updating their bookings and notifying passengers",
+        request_body=TripDisruptionSerializer,
+    )
+    def post(self, request):
+        serializer = TripDisruptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        trips = select_trips(data.get('route'), data.get('date'), data.get('trips'))
+        try:
+            report = disrupt_trips(
+                trips, data['action'], day=data.get('move_to_date'), delay=timedelta(minutes=data['delay_minutes']),
+                reason=data['reason'], dry_run=data['dry_run'],
+            )
+        except DisruptionError as error:
+            return Response({"errors": error.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+
+class TicketPublicKeyView(APIView):
+    """
+    The key boarding devices verify ticket signatures with.
+    """
+
+    def get(self, request):
+        response = Response(public_key_info())
+        response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+
+class BookingTicketView(APIView):
+    """
+    The signed ticket of a paid booking, to be shown as a QR code. Only the
+    customer who made the booking and staff may get it.
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request, slug):
+        booking = get_object_or_404(
+            Booking.objects.select_related('trip', 'customer_info', 'payment').filter(is_deleted=False).exclude(status=Booking.CANCELLED),
+            slug=slug,
+        )
+        customer = booking.customer_info
+        if not request.user.is_staff and (customer is None or customer.user_id != request.user.id):
+            raise Http404
+        try:
+            token, expires_at = issue_ticket(booking)
+        except TicketRefused as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response({"booking": booking.id, "ticket": token, "expires_at": expires_at})
+
+
+class BoardingManifestView(APIView):
+    """
+    Everything a conductor's device needs to check a trip's tickets offline.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        trip = get_object_or_404(Trip, pk=pk)
+        return Response(boarding_manifest(trip))
+
+
+class BoardingSyncView(APIView):
+    """
+    Batches of boarding scans from a device; scans synced twice count once.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Sync the tickets scanned on a device for a trip",
+        request_body=BoardingScanSerializer(many=True),
+    )
+    def post(self, request, pk):
+        trip = get_object_or_404(Trip, pk=pk)
+        serializer = BoardingScanSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        return Response(record_boardings(trip, serializer.validated_data))
+
+
+class TripManifestView(APIView):
+    """
+    Confirmed passengers of the listed trips, or of every trip leaving on a
+    date (optionally only mornings or evenings, or from one town), as JSON,
+    CSV or a printable page.
+    """
+    permission_classes = [IsAdminUser]
+    replica_reads = True
+
+    @swagger_auto_schema(
+        operation_description="Passenger manifests of one or many trips",
         manual_parameters=[
-            openapi.Parameter('origin', openapi.IN_QUERY, description="Origin ID", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('destination', openapi.IN_QUERY, description="Destination ID", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('date', openapi.IN_QUERY, description="Trip date (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
-        ],
-        responses={200: TripsSerializer(many=True)}
+            openapi.Parameter('trips', openapi.IN_QUERY, description="Comma-separated trip IDs", type=openapi.TYPE_STRING),
+            openapi.Parameter('date', openapi.IN_QUERY, description="Local departure date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+            openapi.Parameter('time_of_day', openapi.IN_QUERY, description="Only morning or evening trips", type=openapi.TYPE_STRING),
+            openapi.Parameter('origin', openapi.IN_QUERY, description="Only trips leaving from this town ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('output', openapi.IN_QUERY, description="json (default), csv or print", type=openapi.TYPE_STRING),
+        ]
     )
     def get(self, request):
-        origin = request.query_params.get('origin', None)
-        destination = request.query_params.get('destination', None)
-        trip_date = request.query_params.get('date', None)
+        try:
+            trip_ids = [int(trip_id) for trip_id in request.query_params.get('trips', '').split(',') if trip_id]
+            day = parse_date(request.query_params.get('date') or '')
+            origin = request.query_params.get('origin')
+            origin = int(origin) if origin else None
+        except ValueError:
+            return Response({"error": "trips and origin must be IDs and date YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if not trip_ids and day is None:
+            return Response({"error": "Give trips or a date."}, status=status.HTTP_400_BAD_REQUEST)
+
+        output = request.query_params.get('output', 'json')
+        trip_manifests = manifests(manifest_trips(day, request.query_params.get('time_of_day'), origin, trip_ids))
+        if output == 'csv':
+            response = StreamingHttpResponse(render_csv(trip_manifests), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="manifests-{day or "trips"}.csv"'
+            return response
+        if output == 'print':
+            return HttpResponse(render_print(trip_manifests))
+        return Response(render_json(trip_manifests))
 
-        trips = Trip.objects.filter(route__origin__id=origin, route__destination__id=destination, date=trip_date)
-        serializer = TripsSerializer(trips, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
 
 class TripPartialFilterView(generics.ListAPIView):  
-    queryset = Trip.objects.all()
+    queryset = Trip.objects.with_details()
+    replica_reads = True
     serializer_class = TripsSerializer
+    # The route and bus filters look up the id they are given.
+    query_budget = 3
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = {
         'route': ['exact'],
@@ -78,10 +261,12 @@ class TripPartialFilterView(generics.ListAPIView):
         'arrival_time': ['exact', 'gte', 'lte'],
         'time_of_day': ['exact'],
         'date': ['exact', 'gte', 'lte'],
+        'departure_at': ['gte', 'lt'],
+        'arrival_at': ['gte', 'lt'],
         'available_seats': ['exact', 'gte', 'lte'],
         'is_active': ['exact'],
     }
-    ordering_fields = ['departure_time', 'arrival_time', 'date', 'available_seats']
+    ordering_fields = ['departure_at', 'arrival_at', 'departure_time', 'arrival_time', 'date', 'available_seats']
 
     @swagger_auto_schema(
         operation_description="Get a filtered list of trips based on various parameters",
@@ -98,6 +283,10 @@ class TripPartialFilterView(generics.ListAPIView):
             openapi.Parameter('date', openapi.IN_QUERY, description="Filter by exact date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
             openapi.Parameter('date__gte', openapi.IN_QUERY, description="Filter by date greater than or equal to (YYYY-MM-DD)", type=openapi.TYPE_STRING),
             openapi.Parameter('date__lte', openapi.IN_QUERY, description="Filter by date less than or equal to (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+            openapi.Parameter('departure_at__gte', openapi.IN_QUERY, description="Filter by departures at or after an ISO 8601 datetime", type=openapi.TYPE_STRING),
+            openapi.Parameter('departure_at__lt', openapi.IN_QUERY, description="Filter by departures before an ISO 8601 datetime", type=openapi.TYPE_STRING),
+            openapi.Parameter('arrival_at__gte', openapi.IN_QUERY, description="Filter by arrivals at or after an ISO 8601 datetime", type=openapi.TYPE_STRING),
+            openapi.Parameter('arrival_at__lt', openapi.IN_QUERY, description="Filter by arrivals before an ISO 8601 datetime", type=openapi.TYPE_STRING),
             openapi.Parameter('available_seats', openapi.IN_QUERY, description="Filter by exact number of available seats", type=openapi.TYPE_INTEGER),
             openapi.Parameter('available_seats__gte', openapi.IN_QUERY, description="Filter by available seats greater than or equal to", type=openapi.TYPE_INTEGER),
             openapi.Parameter('available_seats__lte', openapi.IN_QUERY, description="Filter by available seats less than or equal to", type=openapi.TYPE_INTEGER),
@@ -110,46 +299,10 @@ class TripPartialFilterView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class AvailableSeatsView(APIView):
-    def get(self, request):
-        bus_id = request.query_params.get('bus_id')
-        trip_id = request.query_params.get('trip_id')
-
-        if not bus_id or not trip_id:
-            return Response({"error": "Both bus_id and trip_id are required."}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            bus = get_object_or_404(Bus, id=bus_id)
-            trip = get_object_or_404(Trip.objects.select_related('bus__bus_type'), id=trip_id, bus=bus)
-        except (Bus.DoesNotExist, Trip.DoesNotExist):
-            return Response({"error": "Invalid bus_id or trip_id."}, status=status.HTTP_404_NOT_FOUND)
-
-        booked_seats = trip.booking_set.aggregate(Sum('seats'))['seats__sum'] or 0
-        total_seats = trip.available_seats if trip.available_seats is not None else trip.bus.bus_type.capacity
-        available_seats = max(0, total_seats - booked_seats)
-
-        return Response({
-            "bus": {
-                "id": bus.id,
-                "registration_number": bus.registration_number,
-                "bus_type": bus.bus_type.name,
-                "capacity": bus.bus_type.capacity
-            },
-            "trip": {
-                "id": trip.id,
-                "route": str(trip.route),
-                "departure_time": trip.departure_time.strftime('%H:%M'),
-                "arrival_time": trip.arrival_time.strftime('%H:%M'),
-                "time_of_day": trip.time_of_day
-            },
-            "total_seats": total_seats,
-            "booked_seats": booked_seats,
-            "available_seats": available_seats
-        })
-
-
-class RouteListCreateView(generics.ListCreateAPIView):
-    queryset = Route.objects.all()
+class RouteListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
+    queryset = Route.objects.select_related('origin', 'destination')
+    cache_models = (Route, City)
+    query_budget = 2
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -240,8 +393,10 @@ class BookingItemAPIVIEW(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)  
       
     
-class CityListCreateView(generics.ListCreateAPIView):
+class CityListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = City.objects.all()
+    cache_models = (City,)
+    query_budget = 2
     serializer_class = CitySerializer
 
 
@@ -262,10 +417,13 @@ class BusRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class BusTypeListCreateView(generics.ListCreateAPIView):
+class BusTypeListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
     queryset = BusType.objects.all()
     serializer_class = BusTypeSerializer
     permission_classes = [IsAuthenticated]
+    cache_models = (BusType,)
+    cache_public = False
+    query_budget = 2
 
 
 class CustomerInfoListCreateView(generics.ListCreateAPIView):
@@ -374,7 +532,9 @@ class InitiatePaymentView(GenericAPIView):
 
         booking = get_object_or_404(Booking, id=booking_id)
         
-        payment_method = get_object_or_404(PaymentMethod, name=provider, is_active=True)
+        payment_method = reference_cache.payment_method(provider)
+        if payment_method is None:
+            raise Http404("No active payment method matches the given provider.")
 
         payment = Payment.objects.create(
             booking=booking,
@@ -385,7 +545,9 @@ class InitiatePaymentView(GenericAPIView):
             payer_phone=payer_phone
         )
 
-        success = self.simulate_payment_processing()
+        with track_outbound(provider, 'initiate') as call:
+            success = self.simulate_payment_processing()
+            call.failed = not success
 
         if success:
             return Response({
@@ -433,6 +595,91 @@ class PaymentDetailView(generics.RetrieveAPIView):
     serializer_class = PaymentSerializer
     lookup_field = 'transaction_id'
 
-class PaymentMethodListView(generics.ListAPIView):
+class PaymentMethodListView(ConditionalListMixin, generics.ListAPIView):
     queryset = PaymentMethod.objects.filter(is_active=True)
-    serializer_class = PaymentMethodSerializer
\ No newline at end of file
+    serializer_class = PaymentMethodSerializer
+    cache_models = (PaymentMethod,)
+    query_budget = 2
+
+
+class StatsView(APIView):
+    """
+    Base of the read-only dashboard endpoints. They only read the rollup
+    tables, filtered by travel date (``start``/``end``, the last 30 days by
+    default) and optionally by ``route``.
+    """
+    permission_classes = [IsAdminUser]
+
+    def query_date(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ParseError(f"{name} must be a date (YYYY-MM-DD).")
+        return day
+
+    def query_number(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise ParseError(f"{name} must be a positive whole number.")
+        return number
+
+    def filter_rollups(self, queryset):
+        start = self.query_date('start', Util.get_last_30_days().date())
+        end = self.query_date('end', timezone.now().date())
+        queryset = queryset.filter(date__range=(start, end))
+        route = self.query_number('route')
+        if route:
+            queryset = queryset.filter(route_id=route)
+        return queryset
+
+
+class DailyStatsView(StatsView):
+    query_budget = 2
+
+    def get(self, request):
+        rows = self.filter_rollups(DailyRouteStats.objects.all())
+        service_type = request.query_params.get('service_type')
+        if service_type:
+            rows = rows.filter(service_type=service_type)
+        return Response(list(
+            rows.values('date')
+            .annotate(bookings=Sum('bookings'), cancelled_bookings=Sum('cancelled_bookings'), seats=Sum('seats'), revenue=Sum('revenue'), refunded=Sum('refunded'))
+            .order_by('date')
+        ))
+
+
+class RouteRevenueStatsView(StatsView):
+    query_budget = 2
+
+    def get(self, request):
+        return Response(list(
+            self.filter_rollups(DailyRouteStats.objects.all())
+            .values('route_id', origin=F('route__origin__name'), destination=F('route__destination__name'))
+            .annotate(bookings=Sum('bookings'), seats=Sum('seats'), revenue=Sum('revenue'), refunded=Sum('refunded'))
+            .order_by('-revenue')
+        ))
+
+
+class OccupancyStatsView(StatsView):
+    query_budget = 3
+
+    def get(self, request):
+        trips = self.filter_rollups(TripOccupancy.objects.all())
+        limit = min(self.query_number('limit', 100), 1000)
+        summary = trips.aggregate(trips=Count('trip'), capacity=Sum('capacity'), booked_seats=Sum('booked_seats'), average_load_factor=Avg('load_factor'))
+        ordering = 'load_factor' if request.query_params.get('ordering') == 'load_factor' else '-load_factor'
+        summary['trips_by_load_factor'] = list(
+            trips.values('trip_id', 'route_id', 'date', 'capacity', 'booked_seats', 'load_factor', 'revenue').order_by(ordering)[:limit]
+        )
+        return Response(summary)
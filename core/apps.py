@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from utils.queries import install_query_wrapper
+        from utils.slow_queries import install_slow_query_wrapper
+
+        connection_created.connect(install_query_wrapper, dispatch_uid='query-wrapper')
+        connection_created.connect(install_slow_query_wrapper, dispatch_uid='slow-query-wrapper')
@@ -0,0 +1,140 @@
+"""
+Avatar processing.
+
+An uploaded avatar is only checked from its header during the request and
+stored as the user's original; ``avatar_variants`` is set to ``processing``
+and the process_avatar task is queued on the ``images`` queue once the
+transaction commits. It decodes and resizes the image with ``utils.images``.
+A Celery worker does so in its own process; without one the task runs in
+the web process (utils.tasks.enqueue) and the resizing goes to a process
+pool (``AVATAR_PROCESSES``; 0 resizes in place), so large uploads never
+hold the GIL of the web worker. Each WebP and JPEG variant is stored under
+the SHA-256 of its bytes, which makes the files immutable and lets
+``AvatarVariantView`` serve them with a one-year cache lifetime.
+
+``avatar_variants`` ends up as
+``{'status': 'ready', 'source': ..., 'variants': {'256': {'webp': name, 'jpg': name}, ...}}``
+or ``{'status': 'failed', 'error': ...}``.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from celery import shared_task
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from utils.images import InvalidImage, square_variants
+from utils.tasks import enqueue
+from .models import User
+
+
+logger = logging.getLogger(__name__)
+
+PROCESSING = 'processing'
+
+READY = 'ready'
+
+FAILED = 'failed'
+
+VARIANT_DIRECTORY = 'avatars/v'
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+VARIANT_NAME = re.compile(r'^[0-9a-f]{64}\.(webp|jpg)$')
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def process_pool():
+    """
+    The process-wide resizing pool, recreated after a fork.
+    """
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Spawned, not forked: the web worker runs threads.
+            _pool = ProcessPoolExecutor(max_workers=settings.AVATAR_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def variant_path(name):
+    return f'{VARIANT_DIRECTORY}/{name[:2]}/{name}'
+
+
+def store_variant(content, extension):
+    name = f'{hashlib.sha256(content).hexdigest()}.{extension}'
+    path = variant_path(name)
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(content))
+    return name
+
+
+def avatar_uploaded(user):
+    """
+    Mark the new avatar of ``user`` as processing and queue its processing
+    for when the current transaction commits.
+    """
+    user.avatar_variants = {'status': PROCESSING, 'source': user.avatar.name}
+    User.objects.filter(pk=user.pk).update(avatar_variants=user.avatar_variants)
+    enqueue(process_avatar, user.pk, user.avatar.name)
+
+
+@shared_task(bind=True)
+def process_avatar(self, user_id, name):
+    """
+    Build and store the variants of the avatar file ``name`` of a user.
+    Nothing is recorded if the user uploaded another avatar meanwhile.
+    """
+    # Worker processes are daemonic and may not start a pool of their own.
+    in_worker = not (self.request.called_directly or self.request.is_eager)
+    try:
+        with default_storage.open(name, 'rb') as file:
+            data = file.read()
+        arguments = (data, settings.AVATAR_SIZES, settings.AVATAR_MAX_PIXELS)
+        if settings.AVATAR_PROCESSES and not in_worker:
+            variants = process_pool().submit(square_variants, *arguments).result(timeout=60)
+        else:
+            variants = square_variants(*arguments)
+        result = {
+            'status': READY,
+            'source': name,
+            'variants': {
+                str(size): {extension: store_variant(content, extension) for extension, content in formats.items()}
+                for size, formats in variants.items()
+            },
+        }
+    except InvalidImage as error:
+        result = {'status': FAILED, 'source': name, 'error': str(error)}
+    except Exception:
+        logger.exception(f"Could not process avatar {name} of user {user_id}")
+        result = {'status': FAILED, 'source': name, 'error': "The image could not be processed."}
+
+    User.objects.filter(pk=user_id, avatar=name).update(avatar_variants=result)
+    return result
+
+
+def variant_urls(user, request=None):
+    """
+    ``{size: {format: url}}`` of the user's avatar once processed, else None.
+    """
+    variants = user.avatar_variants or {}
+    if variants.get('status') != READY:
+        return None
+    urls = {}
+    for size, formats in variants['variants'].items():
+        urls[size] = {}
+        for extension, name in formats.items():
+            url = reverse('avatar-variant', args=[name])
+            urls[size][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
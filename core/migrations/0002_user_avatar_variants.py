@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-19 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, editable=False, help_text='Processing status and resized copies of the avatar, see core.avatars', null=True, verbose_name='avatar variants'),
+        ),
+    ]
@@ -144,6 +144,9 @@ class User(AbstractBaseUser, PermissionsMixin, TrackingModel):
     
     avatar = models.ImageField(upload_to='avatars', null=True, blank=True,
                                help_text=_("User's profile picture"))
+
+    avatar_variants = models.JSONField(_("avatar variants"), null=True, blank=True, editable=False,
+                                       help_text=_("Processing status and resized copies of the avatar, see core.avatars"))
     
     phone = models.CharField(_("Mobile contact number"), max_length=20, unique=True, blank=False, null=False,
                              help_text=_("User's primary phone number"))
@@ -18,6 +18,10 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 from django.db.models import Q
+from django.db import transaction
+from django.conf import settings
+from utils.images import InvalidImage, inspect
+from . import avatars
 
 
 User = get_user_model()
@@ -85,10 +89,45 @@ class RegisterSerializer(serializers.ModelSerializer):
     
 
 class UserUpdateSerializer(serializers.ModelSerializer):
+    avatar = serializers.ImageField(write_only=True, required=False, allow_null=True)
+    avatar_status = serializers.SerializerMethodField()
+    avatar_urls = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['first_name', 'last_name', 'phone', 'address', 'bio']  
-        read_only_fields = ['phone', 'username']    
+        fields = ['first_name', 'last_name', 'phone', 'address', 'bio', 'avatar', 'avatar_status', 'avatar_urls']
+        read_only_fields = ['phone', 'username']
+
+    def validate_avatar(self, value):
+        # Only the header is read here; decoding happens in core.avatars.
+        if value is None:
+            return value
+        if value.size > settings.AVATAR_MAX_UPLOAD_BYTES:
+            raise serializers.ValidationError(_("The image may not be larger than {} MB.").format(settings.AVATAR_MAX_UPLOAD_BYTES // (1024 * 1024)))
+        try:
+            inspect(value, settings.AVATAR_MAX_PIXELS)
+        except InvalidImage as error:
+            raise serializers.ValidationError(str(error))
+        return value
+
+    def get_avatar_status(self, obj):
+        if not obj.avatar:
+            return None
+        return (obj.avatar_variants or {}).get('status', avatars.PROCESSING)
+
+    def get_avatar_urls(self, obj):
+        return avatars.variant_urls(obj, self.context.get('request'))
+
+    def update(self, instance, validated_data):
+        new_avatar = 'avatar' in validated_data
+        with transaction.atomic():
+            user = super().update(instance, validated_data)
+            if new_avatar and user.avatar:
+                avatars.avatar_uploaded(user)
+            elif new_avatar:
+                user.avatar_variants = None
+                User.objects.filter(pk=user.pk).update(avatar_variants=None)
+        return user
 
 
 class ResetPasswordSerializer(serializers.Serializer):
@@ -0,0 +1,4 @@
+"""
+Background tasks of the core app, imported here for Celery's autodiscovery.
+"""
+from .avatars import process_avatar  # noqa: F401
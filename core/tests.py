@@ -1,3 +1,214 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from bookingApp.models import City
+from bookingApp.reference_cache import reference_cache
+from utils.images import InvalidImage, inspect, square_variants
+from utils.profiling import list_profiles, profile_requested
+from utils.routers import ReplicaRouter, pin_to_primary, primary, replica, reset_pin
+from utils.traffic import REDACTED
+from .avatars import process_avatar
+from .models import User
+
+
+def image_bytes(size=(640, 480), image_format='PNG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'orange').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImageTests(TestCase):
+    def test_inspect_reads_the_header(self):
+        self.assertEqual(inspect(io.BytesIO(image_bytes()), 10_000_000), ('PNG', 640, 480))
+
+    def test_inspect_rejects_bad_uploads(self):
+        with self.assertRaises(InvalidImage):
+            inspect(io.BytesIO(b'not an image'), 10_000_000)
+        with self.assertRaises(InvalidImage):
+            inspect(io.BytesIO(image_bytes()), 100_000)
+
+    def test_square_variants(self):
+        variants = square_variants(image_bytes(mode='RGBA'), [96, 256], 10_000_000)
+        self.assertEqual(set(variants), {96, 256})
+        for size, formats in variants.items():
+            for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with Image.open(io.BytesIO(formats[extension])) as image:
+                    self.assertEqual((image.format, image.size), (image_format, (size, size)))
+                    self.assertNotIn('exif', image.info)
+
+
+@override_settings(AVATAR_PROCESSES=0, AVATAR_SIZES=[96, 256])
+class AvatarTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(phone='+237699000100', first_name='Ava', last_name='Tar', password='secret')
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        url = f'/api/v1/auth/me/profile/{self.user.pk}/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            body = encode_multipart(BOUNDARY, {'avatar': SimpleUploadedFile('me.png', content)})
+            response = self.client.patch(url, body, content_type=MULTIPART_CONTENT)
+        return response, callbacks
+
+    def test_upload_is_processed_in_the_background(self):
+        response, callbacks = self.upload(image_bytes())
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['avatar_status'], 'processing')
+        self.assertIsNone(response.json()['avatar_urls'])
+        self.assertEqual(len(callbacks), 1)
+
+        self.user.refresh_from_db()
+        result = process_avatar(self.user.pk, self.user.avatar.name)
+        self.assertEqual(result['status'], 'ready')
+
+        response = self.client.get(f'/api/v1/auth/me/profile/{self.user.pk}/')
+        urls = response.json()['avatar_urls']
+        self.assertEqual(set(urls), {'96', '256'})
+        variant = self.client.get(urls['96']['webp'])
+        self.assertEqual(variant['Content-Type'], 'image/webp')
+        self.assertIn('immutable', variant['Cache-Control'])
+
+    def test_invalid_upload_is_rejected(self):
+        response, callbacks = self.upload(b'not an image')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(callbacks, [])
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(phone='+237699100001', first_name='Ops', last_name='Desk', password='secret', is_staff=True)
+        self.customer = User.objects.create_user(phone='+237699100002', first_name='Cus', last_name='Tomer', password='secret')
+
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_only_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE', response.content)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(PROFILING_DIR=directory, PROFILING_SAMPLE_RATE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = User.objects.create_user(phone='+237699200001', first_name='Ops', last_name='Desk', password='secret', is_staff=True)
+        self.staff_token = str(RefreshToken.for_user(self.staff).access_token)
+
+    def test_staff_flag(self):
+        self.client.force_login(self.staff)
+        for flag in ('0', 'false', ''):
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/v1/trips/', {'profile': flag}))
+        response = self.client.get('/api/v1/trips/', {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([profile['name'] for profile in list_profiles()], [response['X-Profile-Id']])
+
+    def test_customers_are_not_profiled(self):
+        self.client.force_login(User.objects.create_user(phone='+237699200002', first_name='Cus', last_name='Tomer', password='secret'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/v1/trips/', HTTP_X_PROFILE='1'))
+
+    def test_token_of_deleted_user(self):
+        user = User.objects.create_user(phone='+237699200003', first_name='Gone', last_name='Staff', password='secret', is_staff=True)
+        token = str(RefreshToken.for_user(user).access_token)
+        user.delete()
+        request = RequestFactory().get('/api/v1/trips/', {'profile': '1'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertFalse(profile_requested(request))
+
+    async def test_async_view(self):
+        response = await self.async_client.get(
+            '/api/v1/payment-methods/', {'profile': '1'}, headers={'Authorization': f'Bearer {self.staff_token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('X-Profile-Id'))
+
+
+@override_settings(TRAFFIC_SAMPLE_RATE=1)
+class TrafficRecorderTests(TestCase):
+
+    def test_query_credentials_are_redacted(self):
+        with mock.patch('utils.middleware.record') as record:
+            self.client.get('/api/v1/trips/', {'token': 'eyJ.secret', 'uid': 'MQ', 'page': '2'})
+        query = record.call_args.args[0]['query']
+        self.assertEqual(query, {'token': REDACTED, 'uid': REDACTED, 'page': ['2']})
+
+
+@mock.patch('utils.routers.replica_aliases', return_value=['replica1'])
+class ReplicaRouterTests(TransactionTestCase):
+
+    def setUp(self):
+        reset_pin()
+        self.addCleanup(reset_pin)
+        self.router = ReplicaRouter()
+
+    def read(self):
+        return self.router.db_for_read(User)
+
+    def test_replicas_only_where_allowed(self, aliases):
+        self.assertEqual(self.read(), 'default')
+        with replica():
+            self.assertEqual(self.read(), 'replica1')
+            with primary():
+                self.assertEqual(self.read(), 'default')
+            self.assertEqual(self.read(), 'replica1')
+        self.assertEqual(self.read(), 'default')
+
+    def test_writes_and_transactions_pin_to_primary(self, aliases):
+        with replica():
+            with transaction.atomic():
+                self.assertEqual(self.read(), 'default')
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertEqual(self.read(), 'default')
+            reset_pin()
+            pin_to_primary()
+            self.assertEqual(self.read(), 'default')
+
+    def test_views_opt_in(self, aliases):
+        # Only the alias choice is observed; the queries still run on default.
+        with mock.patch('utils.routers.random.choice', return_value='default') as choice:
+            self.client.get('/api/v1/trips/')
+            self.assertTrue(choice.called)
+            choice.reset_mock()
+            self.client.get('/api/v1/towns/')
+            self.client.post('/api/v1/trips/', {}, content_type='application/json')
+            self.assertFalse(choice.called)
+
+    def test_reference_cache_loads_from_primary(self, aliases):
+        reference_cache.invalidate()
+        self.addCleanup(reference_cache.invalidate)
+        with replica(), mock.patch('utils.routers.random.choice') as choice:
+            reference_cache.all(City)
+        self.assertFalse(choice.called)
+
+    async def test_async_views_opt_in(self, aliases):
+        with mock.patch('utils.routers.random.choice', return_value='default') as choice:
+            await self.async_client.get('/api/v1/trips/filter/', {'origin': 1, 'destination': 2, 'date': '2026-01-15'})
+        self.assertTrue(choice.called)
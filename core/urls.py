@@ -20,6 +20,7 @@ urlpatterns = [
 
     path('verify-email/', VerifyEmail.as_view(), name='verify-email'),
     path('users/', ListUsers.as_view(), name='list_users'),
+    path('avatars/<str:name>', AvatarVariantView.as_view(), name='avatar-variant'),
    
     # RESET PASSWORD
     path('reset-password', ChangePassword.as_view(), name='password_reset_confirm'),
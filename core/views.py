@@ -30,6 +30,10 @@ from utils.helpers import send_sms
 from utils.workers import send_sms_with_template
 from django.db import IntegrityError
 import logging
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.views import View
+from . import avatars
 
 logger = logging.getLogger(__name__)
 
@@ -256,7 +260,7 @@ class UpdateUserInformation(GenericAPIView):
         user = self.get_object(user_id)
         if not user:
             return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = self.serializer_class(user)
+        serializer = self.serializer_class(user, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
@@ -267,7 +271,7 @@ class UpdateUserInformation(GenericAPIView):
         if not user:
             return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        serializer = self.serializer_class(user, data=request.data, partial=True)
+        serializer = self.serializer_class(user, data=request.data, partial=True, context={'request': request})
 
         if serializer.is_valid():
             serializer.save()
@@ -297,3 +301,22 @@ class VerifyPhoneAPIView(APIView):
             return Response({'error': 'Invalid phone number or verification code.'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+
+
+class AvatarVariantView(View):
+    """
+    Serve a resized avatar. Names are content hashes, so a response never
+    changes and may be cached for good.
+    """
+
+    def get(self, request, name):
+        match = avatars.VARIANT_NAME.match(name)
+        if not match:
+            raise Http404
+        try:
+            file = default_storage.open(avatars.variant_path(name), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(file, content_type=avatars.CONTENT_TYPES[match.group(1)])
+        response['Cache-Control'] = f'public, max-age={settings.AVATAR_CACHE_SECONDS}, immutable'
+        return response
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings, read automatically from the working directory.
+
+Workers share Prometheus samples through memory-mapped files, so the
+multiprocess directory has to exist before any worker imports the app.
+"""
+import glob
+import os
+import tempfile
+
+
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'favourexpress-metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be merged into the new one.
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,194 @@
+"""
+PostgreSQL backend with an in-process connection pool.
+
+Django 4.2 can only keep one persistent connection per thread. Threaded
+gunicorn workers and the thread pools serving async views start and stop
+threads, so their connections are opened and closed far more often than
+requests need. With ``ENGINE = 'utils.db_pool'`` closing a connection hands it
+back to a pool shared by every thread of the process and opening one takes an
+idle connection from it.
+
+Pool settings live under the ``POOL`` key of the database settings:
+
+``MAX_SIZE``
+    Connections the process may hold at once (default 10).
+``TIMEOUT``
+    Seconds to wait for a free connection before failing (default 10).
+``LEAK_SECONDS``
+    Connections checked out for longer than this are logged and counted as
+    leaked (default 60).
+``CHECK_AFTER``
+    Idle connections older than this are pinged before being handed out when
+    ``CONN_HEALTH_CHECKS`` is on (default 30).
+
+Use it with ``CONN_MAX_AGE = 0`` so connections go back to the pool at the end
+of every request.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from utils.metrics import DB_CONNECTIONS_OPENED, DB_POOL_IDLE, DB_POOL_IN_USE, DB_POOL_LEAKS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+
+    def __init__(self, alias, max_size=10, timeout=10, leak_seconds=60, check_after=30, health_checks=False):
+        self.alias = alias
+        self.timeout = timeout
+        self.leak_seconds = leak_seconds
+        self.check_after = check_after
+        self.health_checks = health_checks
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._checked_out = {}
+        self._lock = threading.Lock()
+
+    def checkout(self, connect):
+        self.report_leaks()
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_TIMEOUTS.labels(self.alias).inc()
+            raise OperationalError(f"No database connection for {self.alias!r} became free within {self.timeout}s")
+        DB_POOL_WAIT.labels(self.alias).observe(time.monotonic() - started)
+
+        try:
+            connection = self._take_idle() or self._open(connect)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checked_out[id(connection)] = [time.monotonic(), threading.current_thread().name, False]
+        DB_POOL_IN_USE.labels(self.alias).inc()
+        return connection
+
+    def checkin(self, connection):
+        with self._lock:
+            if self._checked_out.pop(id(connection), None) is None:
+                # Not ours (checked out before a fork, or already returned).
+                connection.close()
+                return
+        DB_POOL_IN_USE.labels(self.alias).dec()
+
+        try:
+            if not connection.closed and connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            connection.close()
+
+        if connection.closed:
+            self._slots.release()
+            return
+        self._idle.put((connection, time.monotonic()))
+        DB_POOL_IDLE.labels(self.alias).set(self._idle.qsize())
+        self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            try:
+                connection, since = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            DB_POOL_IDLE.labels(self.alias).set(self._idle.qsize())
+            if self.usable(connection, time.monotonic() - since):
+                return connection
+            connection.close()
+
+    def _open(self, connect):
+        connection = connect()
+        DB_CONNECTIONS_OPENED.labels(self.alias).inc()
+        return connection
+
+    def usable(self, connection, idle_for):
+        if connection.closed:
+            return False
+        if not self.health_checks or idle_for < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def report_leaks(self):
+        now = time.monotonic()
+        with self._lock:
+            leaked = [entry for entry in self._checked_out.values() if not entry[2] and now - entry[0] > self.leak_seconds]
+            for entry in leaked:
+                entry[2] = True
+        for since, thread_name, _ in leaked:
+            DB_POOL_LEAKS.labels(self.alias).inc()
+            logger.warning(f"Connection to {self.alias} held by thread {thread_name} for {now - since:.0f}s")
+
+    def close_idle(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+        DB_POOL_IDLE.labels(self.alias).set(0)
+
+
+def get_pool(alias, settings_dict):
+    key = (alias, settings_dict['NAME'], settings_dict['HOST'], settings_dict['PORT'], settings_dict['USER'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            # Pools are per process; never reuse sockets inherited over a fork.
+            options = settings_dict.get('POOL', {})
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                leak_seconds=options.get('LEAK_SECONDS', 60),
+                check_after=options.get('CHECK_AFTER', 30),
+                health_checks=settings_dict.get('CONN_HEALTH_CHECKS', False),
+            )
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_idle()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database open.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        return self.pool.checkout(lambda: connect(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
@@ -1,6 +1,8 @@
 from decouple import config
+from django.conf import settings
 import requests
 import logging
+from utils.metrics import track_outbound
 
 
 logger = logging.getLogger(__name__)
@@ -16,6 +18,10 @@ def send_sms(phone_number, message):
     Returns:
         bool: True if the SMS was sent successfully, False otherwise.
     """
+    if not settings.SMS_ENABLED:
+        logger.info(f"SMS disabled, not sending to {phone_number}")
+        return True
+
     url = "https://smsvas.com/bulk/public/index.php/api/v1/sendsms"
     
     payload = {
@@ -26,11 +32,14 @@ def send_sms(phone_number, message):
         "mobiles": phone_number
     }
 
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        logger.info(f"SMS sent successfully to {phone_number}")
-        return True
-    except requests.RequestException as e:
-        logger.error(f"Error sending SMS to {phone_number}: {e}")
-        return False
\ No newline at end of file
+    with track_outbound('sms', 'send') as call:
+        try:
+            response = requests.post(url, json=payload)
+            response.raise_for_status()
+            logger.info(f"SMS sent successfully to {phone_number}")
+            return True
+        except requests.RequestException as e:
+            call.failed = True
+            logger.error(f"Error sending SMS to {phone_number}: {e}")
+            return False
+
@@ -0,0 +1,75 @@
+"""
+Image checks and resizing with Pillow.
+
+Nothing here imports Django, so ``square_variants`` can run in a spawned
+worker process: it takes and returns bytes.
+"""
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+ACCEPTED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def inspect(file, max_pixels):
+    """
+    Read only the header of ``file`` and return ``(format, width, height)``.
+    Raises InvalidImage for anything that is not an accepted image or is
+    larger than ``max_pixels``, before any pixel is decoded.
+    """
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise InvalidImage(f"Not a valid image: {error}")
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+    if image_format not in ACCEPTED_FORMATS:
+        raise InvalidImage(f"Unsupported image format {image_format}.")
+    if width * height > max_pixels:
+        raise InvalidImage(f"Image is too large ({width}x{height}).")
+    return image_format, width, height
+
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    # No exif or icc_profile is passed, so no metadata is written.
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def square_variants(data, sizes, max_pixels, quality=82):
+    """
+    Decode ``data`` and return ``{size: {'webp': bytes, 'jpg': bytes}}``
+    with square crops of each size, upright and without metadata.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise InvalidImage(f"Could not decode the image: {error}")
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    flat = image
+    if has_alpha:
+        flat = Image.new('RGB', image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel('A'))
+
+    variants = {}
+    for size in sizes:
+        box = (size, size)
+        variants[size] = {
+            'webp': encode(ImageOps.fit(image, box, Image.LANCZOS), 'WEBP', quality=quality, method=4),
+            'jpg': encode(ImageOps.fit(flat, box, Image.LANCZOS), 'JPEG', quality=quality, optimize=True, progressive=True),
+        }
+    return variants
@@ -0,0 +1,139 @@
+"""
+Prometheus metrics for requests, the database, outbound providers and
+booking throughput.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (gunicorn.conf.py does this) every
+worker writes its samples to memory-mapped files in that directory and the
+/metrics view merges them, so the numbers hold across gunicorn workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+from django.db.backends.signals import connection_created
+
+from utils.queries import queries_recorded
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by view and method',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    'http_responses_total', 'Responses by view, method and status code',
+    ['view', 'method', 'status'],
+)
+EXCEPTIONS = Counter(
+    'http_exceptions_total', 'Unhandled exceptions by view and exception type',
+    ['view', 'exception'],
+)
+
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'SQL statements run per request',
+    ['view'], buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+)
+DB_TIME = Histogram(
+    'db_time_per_request_seconds', 'Time spent in the database per request',
+    ['view'], buckets=LATENCY_BUCKETS,
+)
+DB_DUPLICATE_QUERIES = Counter(
+    'db_duplicate_queries_total', 'Statements repeating a shape already run in the same request',
+    ['view'],
+)
+
+DB_CONNECTIONS_OPENED = Counter(
+    'db_connections_opened_total', 'New database connections opened', ['alias'],
+)
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Pooled connections currently checked out', ['alias'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_IDLE = Gauge(
+    'db_pool_connections_idle', 'Pooled connections waiting to be reused', ['alias'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+    ['alias'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting for a free connection', ['alias'],
+)
+DB_POOL_LEAKS = Counter(
+    'db_pool_leaked_connections_total', 'Connections held longer than DB_POOL_LEAK_SECONDS', ['alias'],
+)
+
+OUTBOUND_LATENCY = Histogram(
+    'outbound_request_duration_seconds', 'Latency of calls to external providers',
+    ['provider', 'operation'], buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_FAILURES = Counter(
+    'outbound_request_failures_total', 'Failed calls to external providers',
+    ['provider', 'operation'],
+)
+
+BOOKINGS = Counter('bookings_created_total', 'Bookings created', ['service_type'])
+BOOKED_SEATS = Counter('booked_seats_total', 'Seats booked', ['service_type'])
+PAYMENTS = Counter('payments_created_total', 'Payments recorded', ['provider'])
+
+
+class OutboundCall:
+    failed = False
+
+
+@contextmanager
+def track_outbound(provider, operation):
+    """
+    Time a call to an external provider. Set ``call.failed`` for failures that
+    do not raise; exceptions are counted as failures automatically.
+    """
+    call = OutboundCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.failed = True
+        raise
+    finally:
+        OUTBOUND_LATENCY.labels(provider, operation).observe(time.perf_counter() - start)
+        if call.failed:
+            OUTBOUND_FAILURES.labels(provider, operation).inc()
+
+
+def observe_queries(sender, view, stats, **kwargs):
+    DB_QUERIES.labels(view).observe(stats.count)
+    DB_TIME.labels(view).observe(stats.duration)
+    repeated = sum(count - 1 for _, count in stats.duplicates())
+    if repeated:
+        DB_DUPLICATE_QUERIES.labels(view).inc(repeated)
+
+
+queries_recorded.connect(observe_queries, dispatch_uid='metrics-queries')
+
+
+def count_connection(sender, connection, **kwargs):
+    # The pooled backend counts real opens itself; connection_created also
+    # fires when it hands out an idle connection.
+    if not hasattr(connection, 'pool'):
+        DB_CONNECTIONS_OPENED.labels(connection.alias).inc()
+
+
+connection_created.connect(count_connection, dispatch_uid='metrics-connections')
+
+
+def render():
+    """
+    Return the exposition text and its content type.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,207 @@
+import cProfile
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.deprecation import MiddlewareMixin
+
+from utils.metrics import EXCEPTIONS, REQUEST_LATENCY, RESPONSES
+from utils.profiling import profile_requested, store_profile
+from utils.queries import queries_recorded, start_recording, stop_recording
+from utils.routers import allow_replica_reads, pin_to_primary, reset_pin
+from utils.traffic import read_body, read_query, record, should_record
+
+
+logger = logging.getLogger(__name__)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def view_class(view_func):
+    return getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    Starts every request on the primary. Safe requests to views declaring
+    ``replica_reads = True`` may read from a replica; requests with unsafe
+    methods are pinned to the primary up front, which keeps the validation
+    reads of booking and payment flows on the database they write to.
+    """
+
+    def process_request(self, request):
+        reset_pin()
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            pin_to_primary()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and getattr(view_class(view_func), 'replica_reads', False):
+            allow_replica_reads()
+
+    def process_response(self, request, response):
+        reset_pin()
+        return response
+
+
+class QueryCountMiddleware(MiddlewareMixin):
+    """
+    Records the number of queries, the time spent in the database and the
+    repeated statement shapes of every request.
+
+    Views may declare a ``query_budget``; going over it is logged as a warning.
+    With ``QUERY_STATS_HEADERS`` on, the numbers are also returned as
+    ``X-DB-*`` response headers.
+    """
+
+    def process_request(self, request):
+        request.query_stats = start_recording()
+        request.query_budget = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_class(view_func), 'query_budget', None)
+        request.query_stats.view = view_label(request)
+
+    def process_response(self, request, response):
+        stats = getattr(request, 'query_stats', None)
+        if stats is None:
+            return response
+        stop_recording()
+
+        view = view_label(request)
+        duplicates = stats.duplicates()
+        budget = request.query_budget
+
+        if budget is not None and stats.count > budget:
+            logger.warning(f"{view} ran {stats.count} queries, over its budget of {budget}")
+
+        logger.info(
+            f"db view={view} queries={stats.count} db_ms={stats.duration * 1000:.1f} duplicates={len(duplicates)}"
+        )
+        queries_recorded.send(sender=self.__class__, request=request, view=view, stats=stats)
+
+        if settings.QUERY_STATS_HEADERS:
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Time-Ms'] = f"{stats.duration * 1000:.1f}"
+            response['X-DB-Duplicate-Queries'] = ', '.join(f"{key}x{count}" for key, count in duplicates[:10])
+            if budget is not None:
+                response['X-DB-Query-Budget'] = str(budget)
+        return response
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Feeds the request latency, status code and exception metrics.
+    """
+
+    def process_request(self, request):
+        request.metrics_start = time.perf_counter()
+
+    def process_exception(self, request, exception):
+        EXCEPTIONS.labels(view_label(request), type(exception).__name__).inc()
+
+    def process_response(self, request, response):
+        start = getattr(request, 'metrics_start', None)
+        if start is None:
+            return response
+
+        view = view_label(request)
+        REQUEST_LATENCY.labels(view, request.method).observe(time.perf_counter() - start)
+        RESPONSES.labels(view, request.method, str(response.status_code)).inc()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Runs the view of a single request under cProfile when a staff user asks
+    for it (or the request is sampled) and returns the stored profile name in
+    the ``X-Profile-Id`` header.
+
+    Sync views are profiled with ``runcall`` in the thread they run in.
+    Under ASGI, coroutine views are profiled by enabling the profiler on the
+    event loop thread around the awaited response. Whatever else the loop
+    runs meanwhile shows up in that profile too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.profile_requested = profile_requested(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.profile_requested = await sync_to_async(profile_requested)(request)
+        if not (request.profile_requested and self.resolves_to_coroutine(request)):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        response['X-Profile-Id'] = await sync_to_async(store_profile)(profiler, view_label(request))
+        return response
+
+    def resolves_to_coroutine(self, request):
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func) or not getattr(request, 'profile_requested', False):
+            return None
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = profiler.runcall(response.render)
+
+        response['X-Profile-Id'] = store_profile(profiler, view_label(request))
+        return response
+
+
+class TrafficRecorderMiddleware(MiddlewareMixin):
+    """
+    Appends a sample of API requests to the traffic log for later replay.
+    """
+
+    def process_request(self, request):
+        request.traffic_sample = None
+        if should_record(request):
+            request.traffic_sample = {
+                'time': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'query': read_query(request),
+                'body': read_body(request),
+                'start': time.perf_counter(),
+            }
+
+    def process_response(self, request, response):
+        sample = getattr(request, 'traffic_sample', None)
+        if sample is None:
+            return response
+
+        sample['duration_ms'] = round((time.perf_counter() - sample.pop('start')) * 1000, 2)
+        sample['status'] = response.status_code
+        sample['view'] = view_label(request)
+        record(sample)
+        return response
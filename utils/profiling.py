@@ -0,0 +1,98 @@
+"""
+On-demand profiling of single requests.
+
+Profiles are written as pstats files into ``PROFILING_DIR``, which is kept as
+a ring buffer of at most ``PROFILING_MAX_FILES`` files, oldest removed first.
+"""
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.utils.crypto import get_random_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+OFF_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+
+    # API clients authenticate with JWT inside the view, after middleware ran.
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def _flag(value):
+    return value is not None and value.strip().lower() not in OFF_VALUES
+
+
+def profile_requested(request):
+    """
+    Profile when a staff user asks for it through the ``X-Profile`` header or
+    the ``profile`` query flag (``?profile=0`` does not count), or when the
+    request is randomly sampled.
+    """
+    if _flag(request.META.get(PROFILE_HEADER)) or _flag(request.GET.get(PROFILE_PARAM)):
+        return _is_staff(request)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def store_profile(profiler, label):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    safe_label = re.sub(r'[^\w-]+', '_', label)[:60]
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_label}-{get_random_string(6)}.prof"
+    profiler.dump_stats(os.path.join(directory, name))
+    _prune(directory, settings.PROFILING_MAX_FILES)
+    return name
+
+
+def _prune(directory, keep):
+    profiles = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if PROFILE_NAME.match(name)),
+        key=os.path.getmtime,
+    )
+    for path in profiles[:max(0, len(profiles) - keep)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for name in os.listdir(directory):
+        if PROFILE_NAME.match(name):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({'name': name, 'size': stat.st_size, 'created': stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile['created'], reverse=True)
+
+
+def profile_path(name):
+    """
+    Absolute path of a stored profile, or None for unknown or unsafe names.
+    """
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, name)
+    return path if os.path.isfile(path) else None
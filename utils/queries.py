@@ -0,0 +1,109 @@
+"""
+Per-request SQL accounting.
+
+One execute wrapper is installed on every database connection. It records
+into whichever ``QueryStats`` is active in the current context, so the same
+code covers sync and async requests as well as management commands.
+"""
+import contextvars
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+
+# Sent by QueryCountMiddleware once per request with the finished ``stats``
+# and the ``view`` label.
+queries_recorded = Signal()
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """
+    Reduce a statement to its shape: literals and placeholders become ``?``
+    and ``IN (...)`` lists collapse to a single item.
+    """
+    sql = _LITERALS.sub('?', sql.replace('%s', '?'))
+    sql = _IN_LISTS.sub('(?)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+class QueryStats:
+    """
+    Counts, total time and fingerprints of the statements run in one unit of
+    work (usually a request).
+    """
+
+    def __init__(self):
+        self.view = None
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def add(self, sql, duration):
+        key = fingerprint(sql)
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[key] += 1
+        self.statements.setdefault(key, normalize(sql))
+
+    def duplicates(self):
+        """
+        Fingerprints seen more than once, most repeated first. These are the
+        N+1 candidates.
+        """
+        return [(key, count) for key, count in self.fingerprints.most_common() if count > 1]
+
+
+def current_stats():
+    return _current_stats.get()
+
+
+def start_recording():
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def stop_recording():
+    _current_stats.set(None)
+
+
+@contextmanager
+def recording():
+    stats = start_recording()
+    try:
+        yield stats
+    finally:
+        stop_recording()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.add(sql, time.perf_counter() - start)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver adding ``query_wrapper`` to new connections.
+    """
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
@@ -0,0 +1,88 @@
+"""
+Read replica routing.
+
+Reads go to ``default`` unless the current context opted in to the
+``replica*`` aliases in ``DATABASES``: views declaring ``replica_reads = True``
+(trip search, trip listings and manifest exports), or code inside
+``replica()``. Everything else, in particular detail views read right after a
+write and the reference tables cached under their version counters, reads the
+primary and never sees replication lag. Writes always go to ``default``. Once
+the current context has written, or while a transaction is open on
+``default``, reads stay on the primary even where replicas are allowed, so a
+request never reads behind its own writes and seat checks inside booking
+transactions see committed and locked rows.
+
+The pin and the opt-in live in context variables. ``ReplicaPinningMiddleware``
+resets them for every request; ``primary()`` forces the primary for a block
+of code.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def allow_replica_reads():
+    _replica_reads.set(True)
+
+
+def reset_pin():
+    _pinned.set(False)
+    _replica_reads.set(False)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def replica():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or not _replica_reads.get() or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
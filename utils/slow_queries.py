@@ -0,0 +1,112 @@
+"""
+Slow-query log.
+
+Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are appended as NDJSON to
+``SLOW_QUERY_LOG`` (rotated by size) with their fingerprint, redacted
+parameters, duration, the view that issued them and the first call site in
+project code. ``manage.py slow_query_report`` summarizes the file.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+
+from utils.queries import current_stats, fingerprint, normalize
+
+
+IGNORED_FILES = (os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries.py'))
+
+_log = logging.getLogger('slow_queries')
+
+
+def _get_log():
+    if not _log.handlers:
+        path = settings.SLOW_QUERY_LOG
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES, backupCount=settings.SLOW_QUERY_LOG_BACKUPS
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+        _log.propagate = False
+    return _log
+
+
+def _redact_value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f"<{type(value).__name__}>"
+
+
+def redact(params, many=False):
+    """
+    Keep the shape of the parameters and numbers, hide every other value.
+    """
+    if params is None:
+        return None
+    if many:
+        return f"<{len(params)} rows>" if hasattr(params, '__len__') else '<rows>'
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    return [_redact_value(value) for value in params]
+
+
+def call_site():
+    """
+    Return ``(location, function)`` for the innermost frame in project code,
+    e.g. ``('bookingApp/models.py:551', 'Trip.remaining_seats')``.
+    """
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and 'site-packages' not in filename and filename not in IGNORED_FILES:
+            function = frame.f_code.co_name
+            owner = frame.f_locals.get('self', frame.f_locals.get('cls'))
+            if owner is not None:
+                owner_name = owner.__name__ if isinstance(owner, type) else type(owner).__name__
+                function = f"{owner_name}.{function}"
+            return f"{os.path.relpath(filename, base)}:{frame.f_lineno}", function
+        frame = frame.f_back
+    return None, None
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold > 0 and duration_ms >= threshold:
+            log_slow_query(sql, params, many, duration_ms)
+
+
+def log_slow_query(sql, params, many, duration_ms):
+    stats = current_stats()
+    location, function = call_site()
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'fingerprint': fingerprint(sql),
+        'sql': normalize(sql),
+        'params': redact(params, many),
+        'duration_ms': round(duration_ms, 2),
+        'view': stats.view if stats is not None else None,
+        'call_site': location,
+        'function': function,
+    }
+    _get_log().info(json.dumps(entry, default=str))
+
+
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver adding ``slow_query_wrapper`` to new connections.
+    """
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
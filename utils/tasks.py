@@ -0,0 +1,76 @@
+"""
+Task helpers and the SMS delivery task.
+
+``enqueue`` is how request code hands work to Celery: the task is sent once
+the current transaction commits, so a worker never sees rows that were
+rolled back. With a broker the task goes to its queue (CELERY_TASK_ROUTES).
+In local mode (CELERY_TASK_ALWAYS_EAGER) it runs in-process, on a small
+thread pool (CELERY_LOCAL_THREADS) so the request still does not wait for
+it, or inline when that is 0, as in tests.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from celery import shared_task
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .helpers import send_sms
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+class SMSNotSent(Exception):
+    pass
+
+
+def local_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=settings.CELERY_LOCAL_THREADS, thread_name_prefix='tasks')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def run_locally(task, args, kwargs):
+    try:
+        task.apply(args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def send(task, args, kwargs):
+    if task.app.conf.task_always_eager and settings.CELERY_LOCAL_THREADS:
+        local_executor().submit(run_locally, task, args, kwargs)
+    else:
+        task.apply_async(args, kwargs)
+
+
+def enqueue(task, *args, **kwargs):
+    """
+    Run ``task`` with these arguments once the current transaction commits.
+    """
+    transaction.on_commit(partial(send, task, args, kwargs))
+
+
+@shared_task(
+    autoretry_for=(SMSNotSent,), max_retries=5,
+    retry_backoff=30, retry_backoff_max=15 * 60, retry_jitter=True,
+)
+def deliver_sms(phone_numbers, message):
+    """
+    Send ``message`` to ``phone_numbers`` (comma separated), retrying with
+    backoff while the gateway fails.
+    """
+    if not send_sms(phone_numbers, message):
+        raise SMSNotSent(f"SMS gateway refused the message to {phone_numbers}")
+    return True
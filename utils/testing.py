@@ -0,0 +1,32 @@
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from utils.middleware import view_class
+from utils.queries import fingerprint
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin failing a test when an endpoint runs more queries than the
+    ``query_budget`` declared on its view.
+    """
+
+    def assertWithinQueryBudget(self, method, path, budget=None, **kwargs):
+        if budget is None:
+            budget = getattr(view_class(resolve(urlsplit(path).path).func), 'query_budget', None)
+        if budget is None:
+            self.fail(f"{path} does not declare a query_budget")
+
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method.lower())(path, **kwargs)
+
+        if len(captured) > budget:
+            shapes = {}
+            for query in captured.captured_queries:
+                shapes.setdefault(fingerprint(query['sql']), []).append(query['sql'])
+            details = '\n'.join(f"  {len(sqls)}x {sqls[0]}" for sqls in shapes.values())
+            self.fail(f"{method.upper()} {path} ran {len(captured)} queries, budget is {budget}:\n{details}")
+        return response
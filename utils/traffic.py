@@ -0,0 +1,87 @@
+"""
+Sampled recording of API traffic for replay.
+
+Each sampled request is appended as one JSON line to ``TRAFFIC_LOG`` (rotated
+by size) with its method, path, sanitized query and JSON body, status and
+timing. Credentials and personal data are replaced by ``REDACTED`` and
+authorization headers are never stored. ``benchmarks/replay.py`` re-issues the
+file against a local instance.
+"""
+import json
+import logging
+import os
+import random
+
+from django.conf import settings
+from logging.handlers import RotatingFileHandler
+
+
+REDACTED = '<redacted>'
+
+SENSITIVE_KEYS = {
+    'password', 'client_secret', 'code', 'token', 'refresh', 'access', 'identification', 'id_number',
+    'phone', 'phone_number', 'payer_phone', 'payer_name', 'username', 'first_name', 'last_name', 'email',
+    'uid', 'uidb64',
+}
+
+MAX_BODY_BYTES = 64 * 1024
+
+_log = logging.getLogger('traffic')
+
+
+def _get_log():
+    if not _log.handlers:
+        path = settings.TRAFFIC_LOG
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=settings.TRAFFIC_LOG_MAX_BYTES, backupCount=settings.TRAFFIC_LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+        _log.propagate = False
+    return _log
+
+
+def sanitize(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if key.lower() in SENSITIVE_KEYS else sanitize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def should_record(request):
+    rate = settings.TRAFFIC_SAMPLE_RATE
+    if rate <= 0 or not request.path.startswith(settings.TRAFFIC_PATH_PREFIX):
+        return False
+    return random.random() < rate
+
+
+def read_query(request):
+    """
+    Sanitized query parameters of the request, each as a list of values.
+    Email verification and password reset links carry their tokens here.
+    """
+    return sanitize({key: request.GET.getlist(key) for key in request.GET})
+
+
+def read_body(request):
+    """
+    Sanitized JSON body of the request, or None for empty, large or non-JSON
+    bodies. Must run before the view consumes the stream.
+    """
+    if not request.content_type == 'application/json':
+        return None
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+    if not length or length > MAX_BODY_BYTES:
+        return None
+    try:
+        return sanitize(json.loads(request.body))
+    except ValueError:
+        return None
+
+
+def record(entry):
+    _get_log().info(json.dumps(entry, default=str))
@@ -1,9 +1,11 @@
+from .tasks import deliver_sms, enqueue
 
 
-
-def send_sms_with_template(data, to):
+def send_sms_with_template(data, to, template='{msg}'):
     """
-    Send SMS with template
+    Queue an SMS built from ``template`` and ``data`` to each phone number
+    in ``to``.
     """
-    # Do something
-    print("Sending SMS with template", to)
\ No newline at end of file
+    message = template.format(**data)
+    for phone_number in to:
+        enqueue(deliver_sms, phone_number, message)